@@ -0,0 +1,74 @@
+"""
+Throughput benchmark for core.dns.DNSSinkhole.
+
+Runs the resolver on an unprivileged port in front of a local stub
+upstream and measures queries/second for blocked names, cache hits and
+cache misses (forwarded to the stub), keeping a window of queries in
+flight from a single UDP client.
+
+    python benchmarks/bench_dns.py [seconds]
+"""
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "src"))
+from core.dns import DNSSinkhole
+from core.matcher import DomainMatcher
+
+from dns_stub import StubUpstream, build_query
+
+def blast(address, names, seconds, window=64):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    sent = received = 0
+    end = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < end:
+        for _ in range(window):
+            sock.sendto(build_query(names[sent % len(names)], msg_id=sent & 0xFFFF), address)
+            sent += 1
+        for _ in range(window):
+            try:
+                sock.recv(4096)
+                received += 1
+            except socket.timeout:
+                break
+    elapsed = time.perf_counter() - start
+    sock.close()
+    return received / elapsed, received, sent
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    matcher = DomainMatcher()
+    for i in range(10000):
+        matcher.add(f"api{i}.example-ai.com", "bench")
+    matcher.add("*.wild.example-ai.com", "bench")
+
+    upstream = StubUpstream()
+    server = DNSSinkhole(matcher, upstream=upstream.address, listen=("127.0.0.1", _free_port()))
+    server.start()
+    try:
+        cases = [
+            ("blocked (exact)", [f"api{i}.example-ai.com" for i in range(1000)]),
+            ("blocked (wildcard)", [f"r{i}.wild.example-ai.com" for i in range(1000)]),
+            ("cache hit", [f"site{i}.example.org" for i in range(100)]),
+            ("cache miss (forwarded)", [f"miss{i}.example.net" for i in range(10 ** 7)]),
+        ]
+        blast(server.listen, cases[2][1], 0.2) # Warm the cache
+        for label, names in cases:
+            rate, received, sent = blast(server.listen, names, seconds)
+            print(f"  {label:<24} {rate:>10,.0f} queries/s   ({received}/{sent} answered)")
+        print(f"  server stats: {server.get_stats()}")
+    finally:
+        server.stop()
+        upstream.close()
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark for core.history.HistoryStore.
+
+Writes N synthetic hits (default 5 million, ~13 bytes each on disk) into a
+temporary store and times the report-style aggregations over the
+memory-mapped columns: total count, per-domain counts, top-10, protocol
+split and a per-minute/per-hour timeline, for the full range and a window.
+
+    python benchmarks/bench_history.py [rows]
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "src"))
+from core.history import HistoryStore
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"  {label:<32} {(time.perf_counter() - start) * 1000:>8.1f} ms")
+    return result
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    domains = [f"api{i}.example-ai.com" for i in range(2000)]
+    weights = [1 / (i + 1) for i in range(len(domains))] # Zipf-like popularity
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(tmp)
+        start_ts = time.time() - 14 * 86400
+        step = 14 * 86400 / rows
+        batch = 100_000
+        t0 = time.perf_counter()
+        for offset in range(0, rows, batch):
+            n = min(batch, rows - offset)
+            picks = random.choices(domains, weights, k=n)
+            store.append([(start_ts + (offset + i) * step, picks[i],
+                           "HTTPS" if i % 3 else "HTTP", "IPv6" if i % 5 == 0 else "IPv4")
+                          for i in range(n)])
+        print(f"Wrote {rows:,} rows in {time.perf_counter() - t0:.1f} s")
+
+        window = (start_ts + 7 * 86400, start_ts + 8 * 86400)
+        with timed("open reader (mmap)", store.reader) as reader:
+            print("Full range:")
+            timed("count", reader.count)
+            timed("domain_counts", reader.domain_counts)
+            timed("top_domains(10)", reader.top_domains)
+            timed("flag_counts", reader.flag_counts)
+            timed("timeline (hour)", lambda: reader.timeline(3600))
+            print("One-day window:")
+            timed("count", lambda: reader.count(*window))
+            timed("top_domains(10)", lambda: reader.top_domains(10, *window))
+            timed("timeline (minute)", lambda: reader.timeline(60, *window))
+
+if __name__ == "__main__":
+    main()
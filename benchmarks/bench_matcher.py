@@ -0,0 +1,61 @@
+"""
+Microbenchmark for core.matcher.DomainMatcher.
+
+Compares the matcher against plain set membership (what the exact-only
+domain list amounted to) at 10k and 1M rules. Half of the rules are
+wildcards; the set baseline can only answer exact hosts, so its hit rate on
+subdomain lookups is reported alongside to show what it misses.
+
+    python benchmarks/bench_matcher.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "src"))
+from core.matcher import DomainMatcher
+
+def build_rules(n):
+    exact = [f"api{i}.provider{i % 997}.com" for i in range(n // 2)]
+    wildcard = [f"*.svc{i}.cloud{i % 991}.net" for i in range(n - n // 2)]
+    return exact, wildcard
+
+def lookups(exact, wildcard, n=200_000):
+    hosts = []
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            hosts.append(random.choice(exact))
+        elif kind == 1:
+            hosts.append("eu-west." + random.choice(wildcard)[2:])
+        elif kind == 2:
+            hosts.append(f"miss{i}.example.org")
+        else:
+            hosts.append(f"a.b.c.d.miss{i}.example.org")
+    return hosts
+
+def bench(label, func, hosts):
+    start = time.perf_counter()
+    hits = sum(1 for h in hosts if func(h))
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {len(hosts) / elapsed:>12,.0f} lookups/s   {hits / len(hosts):>6.1%} matched")
+
+def main():
+    for n in (10_000, 1_000_000):
+        exact, wildcard = build_rules(n)
+        hosts = lookups(exact, wildcard)
+
+        start = time.perf_counter()
+        matcher = DomainMatcher()
+        for rule in exact + wildcard:
+            matcher.add(rule, "bench")
+        build = time.perf_counter() - start
+        flat = set(exact) | {w[2:] for w in wildcard}
+
+        print(f"{n:,} rules (matcher built in {build:.2f} s)")
+        bench("set membership (exact only)", flat.__contains__, hosts)
+        bench("DomainMatcher.match", matcher.match, hosts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Client retry benchmark for the sinkhole's reject modes.
+
+Runs a SinkholeServer on unprivileged ports in each reject mode and points
+a model API client at it. The client follows the policy common to AI SDKs:
+a transport failure (connection reset, EOF during the handshake, timeout)
+is treated as transient and retried with exponential backoff, while a
+definitive answer (a TLS alert, a 4xx response, x-should-retry: false, a
+Retry-After longer than the client is willing to wait) ends the call. Reports connection attempts
+per call and the time until the caller sees the failure.
+
+    python benchmarks/bench_reject_modes.py [calls] [max_retries]
+"""
+import socket
+import ssl
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "src"))
+from core.sinkhole import SinkholeServer
+
+BACKOFF = 0.005 # Scaled down from the usual 0.5 s so the run stays short
+MAX_RETRY_AFTER = 60
+
+CONTEXT = ssl.create_default_context()
+CONTEXT.check_hostname = False
+CONTEXT.verify_mode = ssl.CERT_NONE
+
+def https_attempt(port, host):
+    with socket.create_connection(("127.0.0.1", port), timeout=2.0) as raw:
+        try:
+            with CONTEXT.wrap_socket(raw, server_hostname=host):
+                return "connected"
+        except ssl.SSLError as e:
+            if "ALERT" in str(e).upper():
+                return "final" # The server answered: this will not get better
+            return "transient"
+        except (ConnectionError, socket.timeout):
+            return "transient"
+
+def http_attempt(port, host):
+    with socket.create_connection(("127.0.0.1", port), timeout=2.0) as sock:
+        try:
+            sock.sendall(f"POST /v1/chat/completions HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            response = b""
+            while b"\r\n\r\n" not in response:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+        except (ConnectionError, socket.timeout):
+            return "transient"
+    if not response.startswith(b"HTTP/"):
+        return "transient"
+    status = int(response.split()[1])
+    retry_after = None
+    for line in response.split(b"\r\n"):
+        if line.lower().startswith(b"retry-after:"):
+            retry_after = int(line.split(b":", 1)[1])
+        if line.lower().replace(b" ", b"") == b"x-should-retry:false":
+            return "final"
+    if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+        return "final"
+    return "transient" if status in (408, 409, 429) or status >= 500 else "final"
+
+def call(attempt, port, host, max_retries):
+    """One API call; returns the number of connection attempts it made."""
+    for n in range(max_retries + 1):
+        if attempt(port, host) != "transient":
+            return n + 1
+        time.sleep(BACKOFF * (2 ** n))
+    return max_retries + 1
+
+def run(mode, calls, max_retries):
+    http_port, https_port = _free_port(), _free_port()
+    server = SinkholeServer(ports={http_port: "HTTP", https_port: "HTTPS"}, reject_mode=mode)
+    server.start()
+    try:
+        for label, attempt, port in (("HTTPS", https_attempt, https_port), ("HTTP", http_attempt, http_port)):
+            attempts = 0
+            start = time.perf_counter()
+            for _ in range(calls):
+                attempts += call(attempt, port, "api.openai.com", max_retries)
+            elapsed = time.perf_counter() - start
+            print(f"  {mode:<6} {label:<6} {attempts / calls:>6.2f} attempts/call"
+                  f"   {elapsed / calls * 1000:>8.2f} ms until the caller sees the failure")
+        print(f"  {mode:<6} sinkhole recorded {server.get_stats()['total_blocked']} connections")
+    finally:
+        server.stop()
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    max_retries = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    for mode in ("close", "fast"):
+        run(mode, calls, max_retries)
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Load-generation benchmark for core.sinkhole.SinkholeServer.
+
+Runs the sinkhole in a child process on unprivileged high ports and drives
+it from many concurrent client threads with a configurable mix of:
+
+    http   plain HTTP request with a Host header
+    tls    raw ClientHello (Chrome/Firefox/curl layouts) with a varied SNI
+    slow   slowloris-style client sending half a request and then idling
+    ipv6   an http or tls connection over ::1
+
+Reports accepted connections/s, p50/p99 time-to-close per kind, attribution
+accuracy (hosts the sinkhole recorded vs hosts the clients sent), and the
+server's thread count and RSS (of the main sinkhole process; --workers
+adds processes of the same size). Results are written as JSON (with the git
+revision) so runs of different versions can be compared with --baseline.
+
+    python benchmarks/bench_sinkhole.py --seconds 5 --clients 32 --mix http=50,tls=40,slow=5,ipv6=5
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "src"))
+from core.sinkhole import SinkholeServer
+
+from clienthello_corpus import chrome, firefox, curl, SNI_SAMPLES
+
+HELLO_BUILDERS = [chrome, firefox, curl]
+RESULTS_DIR = Path(__file__).parent / "results"
+
+def _rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+def _serve(pipe, options):
+    """Child process: run the sinkhole and answer "stats"/"stop" requests."""
+    server = SinkholeServer(**options)
+    server.start()
+    pipe.send(server.running)
+    while True:
+        message = pipe.recv()
+        if message == "stats":
+            stats = server.get_stats()
+            pipe.send({
+                "domains": dict(stats["domains"]),
+                "total_blocked": stats["total_blocked"],
+                "threads": threading.active_count(),
+                "rss_kb": _rss_kb(),
+            })
+        elif message == "stop":
+            server.stop()
+            pipe.send(None)
+            return
+
+def _read_until_close(sock):
+    while True:
+        try:
+            if not sock.recv(65536):
+                return True
+        except socket.timeout:
+            return False
+        except OSError:
+            return True
+
+class Client(threading.Thread):
+    def __init__(self, ports, mix, deadline, ipv6, seed):
+        super().__init__(daemon=True)
+        self.ports = ports
+        self.kinds, self.weights = zip(*mix.items())
+        self.deadline = deadline
+        self.ipv6 = ipv6
+        self.random = random.Random(seed)
+        self.latencies = {kind: [] for kind in self.kinds}
+        self.errors = Counter()
+        self.sent = Counter() # host -> connections the sinkhole should attribute to it
+        # Slow connections are parked instead of blocking the thread until they close
+        self.parked = {}
+
+    def run(self):
+        n = 0
+        while time.perf_counter() < self.deadline:
+            self.poll_parked(0)
+            kind = self.random.choices(self.kinds, self.weights)[0]
+            family, protocol = socket.AF_INET, kind
+            if kind == "ipv6":
+                if not self.ipv6:
+                    continue
+                family, protocol = socket.AF_INET6, self.random.choice(["http", "tls"])
+            host = self.random.choice(SNI_SAMPLES) if n % 2 else f"r{self.random.randrange(1000)}.bench.example-ai.com"
+            n += 1
+            try:
+                if kind == "slow":
+                    self.park(host)
+                    continue
+                elapsed = self.connect(family, protocol, host)
+            except OSError:
+                self.errors[kind] += 1
+                continue
+            if elapsed is None:
+                self.errors[kind] += 1
+            else:
+                self.latencies[kind].append(elapsed)
+                self.sent[host] += 1
+        end = time.perf_counter() + 10.0
+        while self.parked and time.perf_counter() < end:
+            self.poll_parked(0.1)
+        self.errors["slow"] += len(self.parked)
+        for sock in self.parked:
+            sock.close()
+
+    def park(self, host):
+        """Half a request, then wait for the sinkhole to give up on us."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        start = time.perf_counter()
+        try:
+            sock.settimeout(10.0)
+            sock.connect(("127.0.0.1", self.ports["HTTP"]))
+            sock.sendall(f"GET / HTTP/1.1\r\nHost: {host}\r\n".encode())
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        self.parked[sock] = (start, host)
+
+    def poll_parked(self, timeout):
+        if not self.parked:
+            return
+        readable, _, _ = select.select(list(self.parked), [], [], timeout)
+        for sock in readable:
+            try:
+                if sock.recv(65536):
+                    continue
+            except BlockingIOError:
+                continue
+            except OSError:
+                pass
+            start, host = self.parked.pop(sock)
+            sock.close()
+            self.latencies["slow"].append(time.perf_counter() - start)
+            self.sent[host] += 1
+
+    def connect(self, family, protocol, host):
+        address = ("::1" if family == socket.AF_INET6 else "127.0.0.1",
+                   self.ports["HTTPS" if protocol == "tls" else "HTTP"])
+        start = time.perf_counter()
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(10.0)
+            sock.connect(address)
+            if protocol == "http":
+                sock.sendall(f"GET /v1/models HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+            else:
+                sock.sendall(self.random.choice(HELLO_BUILDERS)(host))
+            if not _read_until_close(sock):
+                return None
+        return time.perf_counter() - start
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("http", "tls", "slow", "ipv6"):
+            raise SystemExit(f"Unknown traffic kind: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _ipv6_available():
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as s:
+            s.bind(("::1", 0))
+        return True
+    except OSError:
+        return False
+
+def run(args):
+    mix = _parse_mix(args.mix)
+    ports = {"HTTP": _free_port(), "HTTPS": _free_port()}
+    options = {
+        "ports": {ports["HTTP"]: "HTTP", ports["HTTPS"]: "HTTPS"},
+        "workers": args.workers,
+        "read_timeout": args.read_timeout,
+        "reject_mode": args.reject_mode,
+        "max_connections": args.max_connections,
+        "metrics_port": _free_port() if args.metrics else None,
+        # Per-domain counts are a bounded top-K summary: keep every host the
+        # clients send (~1000) tracked so attribution can be checked exactly
+        "top_capacity": 4096,
+    }
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    # Not a daemon: the sinkhole may start worker processes of its own
+    server = ctx.Process(target=_serve, args=(child, options))
+    server.start()
+    if not parent.recv():
+        raise SystemExit("Sinkhole failed to start")
+
+    try:
+        parent.send("stats")
+        idle = parent.recv()
+        ipv6 = _ipv6_available()
+        start = time.perf_counter()
+        clients = [Client(ports, mix, start + args.seconds, ipv6, seed) for seed in range(args.clients)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+        time.sleep(1.2) # Workers report every 0.5 s and the event loop pulls as often
+        parent.send("stats")
+        loaded = parent.recv()
+    finally:
+        parent.send("stop")
+        parent.recv()
+        server.join(timeout=5)
+
+    sent = Counter()
+    errors = Counter()
+    latencies = {kind: [] for kind in mix}
+    for client in clients:
+        sent.update(client.sent)
+        errors.update(client.errors)
+        for kind, values in client.latencies.items():
+            latencies[kind].extend(values)
+
+    recorded = Counter({domain: count - idle["domains"].get(domain, 0)
+                        for domain, count in loaded["domains"].items()})
+    expected = sum(sent.values())
+    matched = sum(min(count, recorded.get(host, 0)) for host, count in sent.items())
+    completed = sum(len(values) for values in latencies.values())
+
+    by_kind = {}
+    for kind, values in latencies.items():
+        by_kind[kind] = {
+            "connections": len(values),
+            "errors": errors[kind],
+            "p50_ms": None if not values else round(_percentile(values, 0.5) * 1000, 3),
+            "p99_ms": None if not values else round(_percentile(values, 0.99) * 1000, 3),
+        }
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": sys.platform,
+        "python": sys.version.split()[0],
+        "config": {"seconds": args.seconds, "clients": args.clients, "mix": mix, "workers": args.workers,
+                   "read_timeout": args.read_timeout, "reject_mode": args.reject_mode,
+                   "max_connections": args.max_connections, "metrics": args.metrics, "ipv6": ipv6},
+        "results": {
+            "connections_per_sec": round(completed / elapsed, 1),
+            "connections": completed,
+            "errors": sum(errors.values()),
+            "by_kind": by_kind,
+            "attribution_accuracy": round(matched / expected, 4) if expected else None,
+            "recorded_hits": sum(recorded.values()),
+            "server_threads": loaded["threads"],
+            "server_rss_kb": loaded["rss_kb"],
+            "server_rss_idle_kb": idle["rss_kb"],
+        },
+    }
+
+def compare(report, baseline):
+    """Print the relative change of the headline metrics against an earlier run."""
+    print(f"\n  vs {baseline.get('revision')} ({baseline.get('timestamp')}):")
+    new, old = report["results"], baseline["results"]
+    for key in ("connections_per_sec", "attribution_accuracy", "server_threads", "server_rss_kb"):
+        if old.get(key):
+            print(f"  {key:<22} {old[key]:>12} -> {new[key]:<12} ({(new[key] - old[key]) / old[key]:+.1%})")
+    for kind, stats in new["by_kind"].items():
+        before = old.get("by_kind", {}).get(kind, {})
+        if before.get("p99_ms") and stats["p99_ms"]:
+            print(f"  {kind + ' p99_ms':<22} {before['p99_ms']:>12} -> {stats['p99_ms']:<12} "
+                  f"({(stats['p99_ms'] - before['p99_ms']) / before['p99_ms']:+.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinkhole load generator")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--mix", default="http=50,tls=40,slow=5,ipv6=5",
+                        help="Weighted traffic kinds: http, tls, slow, ipv6")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--read-timeout", type=float, default=1.0)
+    parser.add_argument("--reject-mode", choices=["fast", "close"], default="fast")
+    parser.add_argument("--max-connections", type=int, default=1024)
+    parser.add_argument("--metrics", action="store_true", help="Enable the metrics exporter (overhead check)")
+    parser.add_argument("--output", help="JSON result path (default: benchmarks/results/)")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    results = report["results"]
+    print(f"  {results['connections_per_sec']:,.0f} connections/s "
+          f"({results['connections']} closed, {results['errors']} errors)")
+    for kind, stats in results["by_kind"].items():
+        print(f"  {kind:<5} {stats['connections']:>8} conns   p50 {stats['p50_ms']} ms   p99 {stats['p99_ms']} ms")
+    print(f"  attribution accuracy {results['attribution_accuracy']}   "
+          f"server threads {results['server_threads']}   RSS {results['server_rss_kb']} kB")
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"sinkhole-{report['revision'] or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"  saved {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
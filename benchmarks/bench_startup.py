@@ -0,0 +1,158 @@
+"""
+Startup benchmark for the IfNoAI entry points.
+
+Runs each entry point in a fresh interpreter with `python -X importtime`
+and reports the median wall time and the time spent importing modules,
+plus the slowest top-level imports, so regressions in what an action pulls
+in at startup are easy to spot:
+
+    status        main.py status (answered from the cached status marker)
+    status-cold   main.py status after the marker was removed (parses hosts)
+    help          main.py --help (argparse, no action)
+    daemon        import of the daemon and sinkhole stack
+    gui           import of gui.main_window (skipped without PySide6)
+
+The hosts file and state directory are temporary, so no privileges are
+needed and the real ones are never touched. Results are written as JSON
+(with the git revision) so versions can be compared with --baseline.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).parents[1] / "src"
+MAIN = SRC / "main.py"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+ENTRY_POINTS = {
+    "status": [str(MAIN), "status"],
+    "status-cold": [str(MAIN), "status"],
+    "help": [str(MAIN), "--help"],
+    "daemon": ["-c", f"import sys; sys.path.insert(0, {str(SRC)!r}); import core.daemon, core.sinkhole"],
+    "gui": ["-c", f"import sys; sys.path.insert(0, {str(SRC)!r}); import gui.main_window"],
+}
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def _pyside_available():
+    return subprocess.run([sys.executable, "-c", "import PySide6"], capture_output=True).returncode == 0
+
+def measure(args, env, before=None):
+    """One run: (wall seconds, {top-level module: cumulative µs}). `before` runs first, untimed."""
+    if before:
+        before()
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+    imports = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Indentation is nesting depth: only modules imported directly count
+        if match and len(match.group(3)) == 1:
+            imports[match.group(4)] = int(match.group(2))
+    return wall, imports
+
+def run(runs):
+    workdir = Path(tempfile.mkdtemp(prefix="ifnoai-startup-"))
+    try:
+        hosts = workdir / "hosts"
+        hosts.write_text("127.0.0.1 localhost\n")
+        env = dict(os.environ, IFNOAI_HOSTS=str(hosts), XDG_STATE_HOME=str(workdir / "state"),
+                   LOCALAPPDATA=str(workdir / "state"))
+        marker = workdir / "state" / "IfNoAI" / "status"
+
+        def drop_marker():
+            if marker.exists():
+                marker.unlink()
+
+        results = {}
+        for name, args in ENTRY_POINTS.items():
+            if name == "gui" and not _pyside_available():
+                print(f"  {name:<12} skipped (PySide6 not installed)")
+                continue
+            before = drop_marker if name == "status-cold" else None
+            measure(args, env, before) # Warm-up: bytecode caches and the status marker
+            walls, totals, slowest = [], [], {}
+            for _ in range(runs):
+                wall, imports = measure(args, env, before)
+                walls.append(wall)
+                totals.append(sum(imports.values()))
+                for module, us in imports.items():
+                    slowest[module] = slowest.get(module, 0) + us / runs
+            top = sorted(slowest.items(), key=lambda item: item[1], reverse=True)[:5]
+            results[name] = {
+                "wall_ms": round(statistics.median(walls) * 1000, 2),
+                "import_ms": round(statistics.median(totals) / 1000, 2),
+                "modules": len(slowest),
+                "slowest": [[module, round(us / 1000, 2)] for module, us in top],
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": sys.platform,
+        "python": sys.version.split()[0],
+        "config": {"runs": runs},
+        "results": results,
+    }
+
+def compare(report, baseline):
+    """Print the relative change of each entry point against an earlier run."""
+    print(f"\n  vs {baseline.get('revision')} ({baseline.get('timestamp')}):")
+    for name, new in report["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        for key in ("wall_ms", "import_ms"):
+            if old[key]:
+                print(f"  {name + ' ' + key:<22} {old[key]:>10} -> {new[key]:<10} "
+                      f"({(new[key] - old[key]) / old[key]:+.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry point startup/import-time benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per entry point")
+    parser.add_argument("--output", help="JSON result path (default: benchmarks/results/)")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    report = run(args.runs)
+    for name, stats in report["results"].items():
+        slowest = ", ".join(f"{module} {ms}" for module, ms in stats["slowest"][:3])
+        print(f"  {name:<12} wall {stats['wall_ms']:>7} ms   imports {stats['import_ms']:>7} ms "
+              f"({stats['modules']} top-level)   slowest: {slowest}")
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"startup-{report['revision'] or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"  saved {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
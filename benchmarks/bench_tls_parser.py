@@ -0,0 +1,62 @@
+"""
+Benchmark for core.tls.ClientHelloParser.
+
+Measures parses/second and SNI attribution accuracy over the ClientHello
+corpus, delivered whole, in MSS-sized TCP segments, byte by byte and split
+across several TLS records.
+
+    python benchmarks/bench_tls_parser.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1] / "src"))
+from core.tls import ClientHelloParser, DONE, NEED_MORE
+
+from clienthello_corpus import build_corpus, split_records
+
+def parse_in_segments(data, size):
+    parser = ClientHelloParser()
+    for i in range(0, len(data), size):
+        if parser.feed(data[i:i + size]) != NEED_MORE:
+            break
+    return parser.sni
+
+def run(label, corpus, deliver, rounds):
+    correct = 0
+    for _, host, hello in corpus:
+        if deliver(hello) == host:
+            correct += 1
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for _, _, hello in corpus:
+            deliver(hello)
+    elapsed = time.perf_counter() - start
+
+    rate = rounds * len(corpus) / elapsed
+    print(f"{label:<28} {rate:>12,.0f} parses/s   accuracy {correct}/{len(corpus)}")
+
+def main():
+    corpus = build_corpus()
+    sizes = sorted({len(h) for _, _, h in corpus})
+    print(f"Corpus: {len(corpus)} ClientHellos, {sizes[0]}-{sizes[-1]} bytes")
+    for client in sorted({c for c, _, _ in corpus}):
+        size = max(len(h) for c, _, h in corpus if c == client)
+        print(f"  {client:<18} {size} bytes")
+    print()
+
+    def whole(hello):
+        parser = ClientHelloParser()
+        return parser.sni if parser.feed(hello) == DONE else None
+
+    run("whole buffer", corpus, whole, 2000)
+    run("1460-byte segments", corpus, lambda h: parse_in_segments(h, 1460), 2000)
+    run("536-byte segments", corpus, lambda h: parse_in_segments(h, 536), 1000)
+    run("1-byte segments", corpus, lambda h: parse_in_segments(h, 1), 5)
+    split = [(c, host, split_records(h, 512)) for c, host, h in corpus]
+    run("512-byte TLS records", split, whole, 1000)
+
+if __name__ == "__main__":
+    main()
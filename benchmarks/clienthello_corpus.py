@@ -0,0 +1,143 @@
+"""
+ClientHello corpus for the TLS parser benchmark.
+
+The Python ``ssl`` hello is captured live through a MemoryBIO handshake.
+The browser/CLI hellos are rebuilt from the extension layout each client
+sends (order, GREASE, key shares, padding) so the corpus can be generated
+offline; sizes match what those clients put on the wire, including the
+post-quantum X25519MLKEM768 key share that pushes Chrome/Firefox past 1.5 KB.
+"""
+import os
+import ssl
+import struct
+
+SNI_SAMPLES = [
+    "api.openai.com",
+    "api.anthropic.com",
+    "generativelanguage.googleapis.com",
+    "copilot-proxy.githubusercontent.com",
+    "us-central1-generativelanguage.googleapis.com",
+]
+
+def _u8(data):
+    return bytes([len(data)]) + data
+
+def _u16(data):
+    return struct.pack("!H", len(data)) + data
+
+def _ext(ext_type, body):
+    return struct.pack("!H", ext_type) + _u16(body)
+
+def _sni(host):
+    return _ext(0, _u16(b"\x00" + _u16(host.encode("ascii"))))
+
+def _alpn(protocols):
+    return _ext(16, _u16(b"".join(_u8(p.encode("ascii")) for p in protocols)))
+
+def _key_share(groups):
+    return _ext(51, _u16(b"".join(struct.pack("!H", g) + _u16(os.urandom(n)) for g, n in groups)))
+
+def _grease():
+    return _ext(0x0A0A, b"")
+
+def _build(extensions, ciphers=32, pad_to=None):
+    exts = b"".join(extensions)
+    if pad_to:
+        body_len = 2 + 32 + 33 + 2 + ciphers * 2 + 2 + 2 + len(exts)
+        if body_len < pad_to:
+            exts += _ext(21, b"\x00" * max(0, pad_to - body_len - 4))
+    body = (b"\x03\x03" + os.urandom(32) + _u8(os.urandom(32))
+            + _u16(os.urandom(ciphers * 2)) + _u8(b"\x00") + _u16(exts))
+    handshake = b"\x01" + len(body).to_bytes(3, "big") + body
+    return b"\x16\x03\x01" + _u16(handshake)
+
+def chrome(host):
+    return _build([
+        _grease(), _sni(host), _ext(23, b""), _ext(65281, b"\x00"),
+        _ext(10, _u16(b"\x0a\x0a\x11\xec\x00\x1d\x00\x17\x00\x18")), _ext(11, b"\x01\x00"),
+        _ext(35, b""), _alpn(["h2", "http/1.1"]), _ext(5, b"\x01\x00\x00\x00\x00"),
+        _ext(13, _u16(os.urandom(16))), _ext(18, b""),
+        _key_share([(0x0A0A, 1), (0x11EC, 1216), (0x001D, 32)]),
+        _ext(45, b"\x01\x01"), _ext(43, b"\x06\x0a\x0a\x03\x04\x03\x03"),
+        _ext(27, b"\x02\x00\x02"), _ext(17513, b"\x00\x03\x02h2"),
+        _ext(65037, os.urandom(250)), _grease(),
+    ], ciphers=16)
+
+def chrome_resumption(host):
+    """Chrome resuming a session: a large pre_shared_key ticket pushes the hello past 4 KB."""
+    psk = _ext(41, _u16(_u16(os.urandom(2900)) + os.urandom(4)) + _u16(_u8(os.urandom(32))))
+    return _rebuild_with_extension(chrome(host), psk)
+
+def _rebuild_with_extension(hello, extension):
+    """Append an extension to an existing single-record ClientHello."""
+    body = bytearray(hello[9:])
+    p = 2 + 32
+    p += 1 + body[p]
+    p += 2 + struct.unpack_from("!H", body, p)[0]
+    p += 1 + body[p]
+    ext_len = struct.unpack_from("!H", body, p)[0]
+    struct.pack_into("!H", body, p, ext_len + len(extension))
+    body += extension
+    handshake = b"\x01" + len(body).to_bytes(3, "big") + bytes(body)
+    return b"\x16\x03\x01" + _u16(handshake)
+
+def firefox(host):
+    return _build([
+        _sni(host), _ext(23, b""), _ext(65281, b"\x00"),
+        _ext(10, _u16(b"\x11\xec\x00\x1d\x00\x17\x00\x18\x00\x19\x01\x00\x01\x01")),
+        _ext(11, b"\x01\x00"), _alpn(["h2", "http/1.1"]), _ext(5, b"\x01\x00\x00\x00\x00"),
+        _ext(34, _u16(os.urandom(8))),
+        _key_share([(0x11EC, 1216), (0x001D, 32), (0x0017, 65)]),
+        _ext(43, b"\x04\x03\x04\x03\x03"), _ext(13, _u16(os.urandom(22))),
+        _ext(45, b"\x01\x01"), _ext(28, b"\x40\x01"), _ext(27, b"\x06\x00\x01\x00\x02\x00\x03"),
+        _ext(65037, os.urandom(280)),
+    ], ciphers=17)
+
+def curl(host):
+    return _build([
+        _sni(host), _ext(11, b"\x03\x00\x01\x02"), _ext(10, _u16(os.urandom(10))),
+        _ext(35, b""), _alpn(["h2", "http/1.1"]), _ext(22, b""), _ext(23, b""),
+        _ext(49, b""), _ext(13, _u16(os.urandom(36))), _ext(43, b"\x04\x03\x04\x03\x03"),
+        _ext(45, b"\x01\x01"), _key_share([(0x001D, 32)]),
+    ], ciphers=31, pad_to=508)
+
+def node(host):
+    return _build([
+        _sni(host), _ext(11, b"\x03\x00\x01\x02"), _ext(10, _u16(os.urandom(8))),
+        _ext(35, b""), _ext(22, b""), _ext(23, b""), _ext(13, _u16(os.urandom(30))),
+        _ext(43, b"\x04\x03\x04\x03\x03"), _ext(45, b"\x01\x01"),
+        _key_share([(0x001D, 32)]),
+    ], ciphers=31)
+
+def python_ssl(host):
+    """Capture the ClientHello the local ssl module really sends."""
+    ctx = ssl.create_default_context()
+    ctx.set_alpn_protocols(["http/1.1"])
+    incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    obj = ctx.wrap_bio(incoming, outgoing, server_hostname=host)
+    try:
+        obj.do_handshake()
+    except ssl.SSLWantReadError:
+        pass
+    return outgoing.read()
+
+CLIENTS = {
+    "chrome": chrome,
+    "chrome-resumption": chrome_resumption,
+    "firefox": firefox,
+    "curl": curl,
+    "python-ssl": python_ssl,
+    "node": node,
+}
+
+def build_corpus():
+    """Returns a list of (client, expected_sni, hello_bytes)."""
+    return [(name, host, build(host)) for name, build in CLIENTS.items() for host in SNI_SAMPLES]
+
+def split_records(hello, fragment_size):
+    """Re-frame a single-record ClientHello as several TLS records."""
+    body = hello[5:]
+    out = b""
+    for i in range(0, len(body), fragment_size):
+        out += b"\x16\x03\x01" + _u16(body[i:i + fragment_size])
+    return out
@@ -0,0 +1,34 @@
+"""Minimal upstream DNS stub for benchmarks: answers every A query with 203.0.113.7."""
+import socket
+import struct
+import threading
+
+def build_query(name, qtype=1, msg_id=0x1234):
+    qname = b"".join(bytes([len(l)]) + l.encode("ascii") for l in name.split(".")) + b"\0"
+    return struct.pack("!HHHHHH", msg_id, 0x0100, 1, 0, 0, 0) + qname + struct.pack("!HH", qtype, 1)
+
+class StubUpstream:
+    def __init__(self, host="127.0.0.1", ttl=300):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, 0))
+        self.address = self.sock.getsockname()
+        self.ttl = ttl
+        self.queries = 0
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            self.queries += 1
+            msg_id = data[:2]
+            question = data[12:]
+            p = question.index(b"\0") + 5
+            answer = b"\xc0\x0c" + struct.pack("!HHIH", 1, 1, self.ttl, 4) + socket.inet_aton("203.0.113.7")
+            self.sock.sendto(msg_id + struct.pack("!HHHHH", 0x8180, 1, 1, 0, 0) + question[:p] + answer, addr)
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,93 @@
+import os
+import sys
+
+class PlatformBackend:
+    """Where the hosts file lives, how to check privileges and how to flush DNS."""
+    name = "generic"
+    hosts_path = None
+
+    @property
+    def backup_path(self):
+        return f"{self.hosts_path}.backup.ifnoai"
+
+    def is_admin(self):
+        try:
+            return os.geteuid() == 0
+        except AttributeError:
+            return False
+
+    def flush_dns(self):
+        """Runs the platform's cache flush commands. Returns False if one failed."""
+        import subprocess
+        ok = True
+        for cmd in self.flush_commands():
+            try:
+                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except Exception as e:
+                print(f"Failed to run {' '.join(cmd)}: {e}")
+                ok = False
+        return ok
+
+    def flush_commands(self):
+        return []
+
+class WindowsBackend(PlatformBackend):
+    name = "windows"
+    hosts_path = r"C:\Windows\System32\drivers\etc\hosts"
+
+    @property
+    def backup_path(self):
+        return r"C:\Windows\System32\drivers\etc\hosts.backup.ifnoai"
+
+    def is_admin(self):
+        try:
+            import ctypes
+            return bool(ctypes.windll.shell32.IsUserAnAdmin())
+        except:
+            return False
+
+    def flush_commands(self):
+        return [["ipconfig", "/flushdns"]]
+
+class LinuxBackend(PlatformBackend):
+    name = "linux"
+    hosts_path = "/etc/hosts"
+
+    def flush_commands(self):
+        import shutil
+        # glibc reads /etc/hosts on every lookup; only caching daemons need a nudge
+        if shutil.which("resolvectl"):
+            return [["resolvectl", "flush-caches"]]
+        if shutil.which("systemd-resolve"):
+            return [["systemd-resolve", "--flush-caches"]]
+        if shutil.which("nscd"):
+            return [["nscd", "-i", "hosts"]]
+        return []
+
+class MacBackend(PlatformBackend):
+    name = "macos"
+    hosts_path = "/etc/hosts"
+
+    def flush_commands(self):
+        return [["dscacheutil", "-flushcache"], ["killall", "-HUP", "mDNSResponder"]]
+
+class FileBackend(PlatformBackend):
+    """Plain file at a given path: no privileges needed and nothing to flush (tests, benchmarks)."""
+    name = "file"
+
+    def __init__(self, hosts_path):
+        self.hosts_path = str(hosts_path)
+
+    def is_admin(self):
+        return os.access(os.path.dirname(os.path.abspath(self.hosts_path)), os.W_OK)
+
+def get_backend():
+    """Picks the backend for this machine; IFNOAI_HOSTS points the blocker at any file instead."""
+    override = os.environ.get("IFNOAI_HOSTS")
+    if override:
+        return FileBackend(override)
+    if sys.platform == "win32":
+        return WindowsBackend()
+    if sys.platform == "darwin":
+        return MacBackend()
+    return LinuxBackend()
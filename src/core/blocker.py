@@ -2,45 +2,111 @@ import os
 import sys
 import shutil
 import json
-import ctypes
-import subprocess
+import hashlib
 from datetime import datetime
 from pathlib import Path
 
+from core.backends import get_backend
+from core.hosts import HostsFile
+from core.matcher import DomainMatcher, is_pattern, load_categories
+from core.paths import state_dir
+from core.status import file_signature, read_marker, write_marker
+
 class AIBlocker:
-    def __init__(self):
-        self.hosts_path = r"C:\Windows\System32\drivers\etc\hosts"
-        self.backup_path = r"C:\Windows\System32\drivers\etc\hosts.backup.ifnoai"
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self.hosts_path = self.backend.hosts_path
+        self.backup_path = self.backend.backup_path
         self.domains_file = Path(__file__).parents[2] / "data" / "ai_domains.json"
         self.marker_start = "# === IfNoAI START ==="
         self.marker_end = "# === IfNoAI END ==="
+        self.hosts = HostsFile(self.hosts_path, self.marker_start, self.marker_end)
+        # Parsed domain list + rendered hosts entries, keyed on the list's stat/hash
+        self.cache_path = state_dir() / "domains.cache.json"
+        self._compiled = None
+        # (hosts stat signature, active, active since)
+        self._status = None
 
     def is_admin(self):
+        return self.backend.is_admin()
+
+    def _compile(self):
+        """
+        Returns the compiled domain list, re-parsing ai_domains.json only when
+        its stat signature changed and its content hash no longer matches.
+        """
+        signature = file_signature(self.domains_file)
+        if self._compiled and self._compiled["signature"] == signature:
+            return self._compiled
+
+        cached = None
         try:
-            return ctypes.windll.shell32.IsUserAnAdmin()
-        except:
-            return False
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except Exception:
+            pass
+        if cached and cached.get("signature") == signature:
+            self._compiled = cached
+            return cached
 
-    def load_domains(self):
+        with open(self.domains_file, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached and cached.get("sha256") == digest:
+            # Touched but unchanged (e.g. a fresh checkout): just refresh the signature
+            compiled = cached
+        else:
+            data = json.loads(raw)
+            categories = load_categories(data)
+            domains = set() # Use set to avoid duplicates
+            for rules in categories.values():
+                for rule in rules:
+                    if rule.startswith(".") and "*" not in rule:
+                        domains.add(rule[1:]) # The apex of a suffix rule is still a plain host
+                    elif not is_pattern(rule):
+                        domains.add(rule)
+            domains = sorted(domains)
+            compiled = {
+                "sha256": digest,
+                "categories": categories,
+                "priority": data.get("metadata", {}).get("blocking_priority", []),
+                "domains": domains,
+                "entries": self.hosts.render_entries(domains).decode("utf-8"),
+            }
+        compiled["signature"] = signature
+
+        try:
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump(compiled, f)
+        except Exception as e:
+            print(f"Failed to write domain cache: {e}")
+        self._compiled = compiled
+        return compiled
+
+    def load_categories(self):
+        """Returns {category: [rules]} from the domain list, or None if it can't be read."""
         if not self.domains_file.exists():
             print(f"Error: Domain list not found at {self.domains_file}")
-            return []
+            return None
         
         try:
-            with open(self.domains_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                domains = set() # Use set to avoid duplicates
-                for category in data.get("categories", {}).values():
-                    # Handle new structure where category is an object with "domains" list
-                    if isinstance(category, dict) and "domains" in category:
-                        domains.update(category["domains"])
-                    # Handle old structure where category was just a list
-                    elif isinstance(category, list):
-                        domains.update(category)
-                return list(domains)
+            return self._compile()["categories"]
         except Exception as e:
             print(f"Error loading domains: {e}")
+            return None
+
+    def load_domains(self):
+        """Exact hostnames for the hosts file; wildcard rules are left to the matcher."""
+        if self.load_categories() is None:
             return []
+        return self._compiled["domains"]
+
+    def load_matcher(self):
+        """Compiles every rule (including wildcards) into a DomainMatcher."""
+        categories = self.load_categories()
+        if categories is None:
+            return DomainMatcher()
+        return DomainMatcher.from_categories(categories, self._compiled["priority"])
 
     def backup_hosts(self):
         """Creates a backup of the hosts file if it doesn't exist."""
@@ -73,30 +139,13 @@ class AIBlocker:
             return False
 
         try:
-            # Read current content
-            with open(self.hosts_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
             # Check if already blocked
-            if self.marker_start in content:
+            if self.hosts.find_block(self.hosts.read()) is not None:
                 print("IfNoAI is already active.")
-                return True
+                return self.sync_block(domains)
 
-            # Prepare block block
-            block_lines = [f"\n{self.marker_start}\n"]
-            block_lines.append(f"# Active since: {datetime.now().isoformat()}\n")
-            for domain in domains:
-                # Redirect to localhost to capture stats via Sinkhole
-                # IPv4
-                block_lines.append(f"127.0.0.1 {domain}\n")
-                # IPv6
-                block_lines.append(f"::1 {domain}\n")
-            block_lines.append(f"{self.marker_end}\n")
-
-            # Write new content
-            with open(self.hosts_path, 'a', encoding='utf-8') as f:
-                f.writelines(block_lines)
-            
+            self.hosts.apply(domains, [f"# Active since: {datetime.now().isoformat()}"],
+                             self._compiled["entries"].encode("utf-8"))
             print(f"Blocked {len(domains)} AI domains.")
             self.flush_dns()
             return True
@@ -105,6 +154,24 @@ class AIBlocker:
             print(f"Failed to modify hosts file: {e}")
             return False
 
+    def sync_block(self, domains=None):
+        """Brings an active block in line with ai_domains.json, touching only changed domains."""
+        if domains is None:
+            domains = self.load_domains()
+            if not domains:
+                return False
+
+        try:
+            added, removed = self.hosts.apply(domains)
+        except Exception as e:
+            print(f"Failed to update hosts file: {e}")
+            return False
+
+        if added or removed:
+            print(f"Block updated: {len(added)} domains added, {len(removed)} removed.")
+            self.flush_dns()
+        return True
+
     def disable_block(self):
         """Removes AI domains from the hosts file."""
         if not self.is_admin():
@@ -115,25 +182,7 @@ class AIBlocker:
             return False
 
         try:
-            with open(self.hosts_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            new_lines = []
-            in_block = False
-            for line in lines:
-                if self.marker_start in line:
-                    in_block = True
-                    continue
-                if self.marker_end in line:
-                    in_block = False
-                    continue
-                
-                if not in_block:
-                    new_lines.append(line)
-
-            with open(self.hosts_path, 'w', encoding='utf-8') as f:
-                f.writelines(new_lines)
-
+            self.hosts.remove()
             print("AI block removed.")
             self.flush_dns()
             return True
@@ -143,21 +192,60 @@ class AIBlocker:
             return False
 
     def flush_dns(self):
-        """Flushes the Windows DNS cache."""
-        try:
-            subprocess.run(["ipconfig", "/flushdns"], check=True, stdout=subprocess.PIPE)
+        """Flushes the operating system's DNS cache."""
+        if self.backend.flush_dns():
             print("DNS cache flushed.")
-        except Exception as e:
-            print(f"Failed to flush DNS: {e}")
 
-    def status(self):
-        """Checks if blocking is currently active."""
+    def block_checksum(self):
+        """SHA-256 of the IfNoAI block as it is in the hosts file, or None if there is none."""
         try:
-            with open(self.hosts_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return self.marker_start in content
+            data = self.hosts.read()
+        except OSError:
+            return None
+        span = self.hosts.find_block(data)
+        if span is None:
+            return None
+        return hashlib.sha256(data[span[0]:span[1]]).hexdigest()
+
+    def _read_status(self):
+        """Returns (active, active_since), re-reading hosts only when its stat signature changes."""
+        try:
+            signature = file_signature(self.hosts_path)
+        except OSError:
+            return False, None
+        if self._status and self._status[0] == signature:
+            return self._status[1], self._status[2]
+
+        marker = read_marker(self.hosts_path, signature)
+        if marker is not None:
+            active, since = marker
+            self._status = (signature, active, datetime.fromisoformat(since) if since else None)
+            return self._status[1], self._status[2]
+
+        active, since = False, None
+        try:
+            data = self.hosts.read()
+            span = self.hosts.find_block(data)
+            if span is not None:
+                active = True
+                prefix = b"# Active since: "
+                p = data.find(prefix, span[0], span[1])
+                if p != -1:
+                    line = data[p + len(prefix):data.find(b"\n", p)]
+                    since = datetime.fromisoformat(line.decode("utf-8").strip())
         except:
-            return False
+            pass
+        self._status = (signature, active, since)
+        write_marker(self.hosts_path, signature, active, since.isoformat() if since else None)
+        return active, since
+
+    def active_since(self):
+        """Returns when the current block was injected, or None if not active."""
+        return self._read_status()[1]
+
+    def status(self):
+        """Checks if blocking is currently active."""
+        return self._read_status()[0]
 
 if __name__ == "__main__":
     # Simple test
@@ -0,0 +1,210 @@
+import os
+import re
+import ssl
+import datetime
+import threading
+from collections import OrderedDict, deque
+
+from core.paths import state_dir
+
+try:
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID, ExtendedKeyUsageOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+except ImportError:
+    x509 = None
+
+_UNSAFE = re.compile(r"[^a-z0-9.\-_]")
+
+# Leaves this close to expiry are minted again rather than served
+_RENEW_BEFORE = datetime.timedelta(days=7)
+
+class CertificateAuthority:
+    """
+    Local CA minting leaf certificates for the hostnames the sinkhole captures.
+
+    The CA key and certificate live under state_dir()/ca and are created on
+    first use; clients only accept the terminated connections once ca.pem is
+    trusted. Every leaf shares one EC key, so minting a certificate for a new
+    SNI costs a single signature, never a key generation. Leaves are written
+    to disk (a restart reuses them while they are valid and issued by the
+    current CA) and the SSLContexts built from them are kept in an LRU cache
+    keyed by hostname. The event loop only takes contexts from that cache
+    (ready_context); misses are prepared on a background thread.
+    """
+
+    def __init__(self, directory=None, cache_size=256):
+        if x509 is None:
+            raise RuntimeError("TLS termination requires cryptography. Please install it: pip install cryptography")
+        self.directory = directory or state_dir() / "ca"
+        self.leaf_directory = os.path.join(self.directory, "leaves")
+        os.makedirs(self.leaf_directory, exist_ok=True)
+        self.cache_size = cache_size
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+        # Hostnames waiting for the background preparer, bounded like the cache
+        self._queue = deque()
+        self._queued = set()
+        self._preparer = None
+        self.ca_path = os.path.join(self.directory, "ca.pem")
+        self.ca_key, self.ca_cert = self._load_or_create_ca()
+        self.leaf_key_path = os.path.join(self.directory, "leaf.key.pem")
+        self.leaf_key = self._load_or_create_key(self.leaf_key_path)
+        self._ca_key_id = x509.AuthorityKeyIdentifier.from_issuer_public_key(
+            self.ca_key.public_key()).key_identifier
+
+    def _load_or_create_key(self, path):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return serialization.load_pem_private_key(f.read(), password=None)
+        key = ec.generate_private_key(ec.SECP256R1())
+        pem = key.private_bytes(serialization.Encoding.PEM,
+                                serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        return key
+
+    def _load_or_create_ca(self):
+        key = self._load_or_create_key(os.path.join(self.directory, "ca.key.pem"))
+        if os.path.exists(self.ca_path):
+            with open(self.ca_path, "rb") as f:
+                return key, x509.load_pem_x509_certificate(f.read())
+
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "IfNoAI Local Sinkhole CA")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (x509.CertificateBuilder()
+                .subject_name(name)
+                .issuer_name(name)
+                .public_key(key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(days=1))
+                .not_valid_after(now + datetime.timedelta(days=3650))
+                .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+                .add_extension(x509.KeyUsage(digital_signature=False, content_commitment=False,
+                                             key_encipherment=False, data_encipherment=False,
+                                             key_agreement=False, key_cert_sign=True, crl_sign=True,
+                                             encipher_only=False, decipher_only=False), critical=True)
+                .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+                .sign(key, hashes.SHA256()))
+        with open(self.ca_path, "wb") as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        return key, cert
+
+    def _leaf_path(self, hostname):
+        return os.path.join(self.leaf_directory, _UNSAFE.sub("_", hostname) + ".pem")
+
+    def _mint(self, hostname):
+        """Sign a leaf for `hostname` and write it (followed by the CA) to disk."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (x509.CertificateBuilder()
+                .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)]))
+                .issuer_name(self.ca_cert.subject)
+                .public_key(self.leaf_key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(days=1))
+                .not_valid_after(now + datetime.timedelta(days=397))
+                .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+                .add_extension(x509.ExtendedKeyUsage([ExtendedKeyUsageOID.SERVER_AUTH]), critical=False)
+                .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(self.ca_key.public_key()),
+                               critical=False)
+                .sign(self.ca_key, hashes.SHA256()))
+        path = self._leaf_path(hostname)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+            f.write(self.ca_cert.public_bytes(serialization.Encoding.PEM))
+        os.replace(tmp_path, path)
+        return path
+
+    def _leaf_is_current(self, path):
+        """Whether the leaf at `path` is valid for a while yet and was issued by the current CA."""
+        try:
+            with open(path, "rb") as f:
+                cert = x509.load_pem_x509_certificate(f.read())
+            not_after = getattr(cert, "not_valid_after_utc", None)
+            if not_after is None: # cryptography < 42
+                not_after = cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+            if not_after - _RENEW_BEFORE <= datetime.datetime.now(datetime.timezone.utc):
+                return False
+            if cert.issuer != self.ca_cert.subject:
+                return False
+            key_id = cert.extensions.get_extension_for_class(x509.AuthorityKeyIdentifier).value.key_identifier
+            return key_id == self._ca_key_id
+        except (OSError, ValueError, x509.ExtensionNotFound):
+            return False
+
+    def context_for(self, hostname):
+        """Returns a server SSLContext presenting a certificate for `hostname` (may mint one)."""
+        hostname = hostname.lower().rstrip(".")
+        with self._lock:
+            context = self._contexts.get(hostname)
+            if context is not None:
+                self._contexts.move_to_end(hostname)
+                return context
+
+        path = self._leaf_path(hostname)
+        if not self._leaf_is_current(path):
+            # Missing, expiring, or signed by a CA that has since been regenerated
+            path = self._mint(hostname)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(path, self.leaf_key_path)
+        # Only HTTP/1.1 is spoken behind the termination
+        context.set_alpn_protocols(["http/1.1"])
+
+        with self._lock:
+            self._contexts[hostname] = context
+            while len(self._contexts) > self.cache_size:
+                self._contexts.popitem(last=False)
+        return context
+
+    def ready_context(self, hostname):
+        """
+        The cached context for `hostname`, or None after queueing it to be
+        loaded or minted on a background thread. Never touches the disk or
+        signs anything, so it is safe on the sinkhole's event loop.
+        """
+        hostname = hostname.lower().rstrip(".")
+        with self._lock:
+            context = self._contexts.get(hostname)
+            if context is not None:
+                self._contexts.move_to_end(hostname)
+                return context
+            if hostname not in self._queued and len(self._queued) < self.cache_size:
+                self._queued.add(hostname)
+                self._queue.append(hostname)
+                if self._preparer is None:
+                    self._preparer = threading.Thread(target=self._prepare_queued, daemon=True)
+                    self._preparer.start()
+        return None
+
+    def _prepare_queued(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._preparer = None
+                    return
+                hostname = self._queue.popleft()
+            try:
+                self.context_for(hostname)
+            except Exception as e:
+                print(f"Failed to prepare a certificate for {hostname}: {e}")
+            with self._lock:
+                self._queued.discard(hostname)
+
+    def prewarm(self, hostnames):
+        """Mint and load contexts for `hostnames` on a background thread."""
+        hostnames = list(hostnames)[:self.cache_size]
+
+        def warm():
+            for hostname in hostnames:
+                try:
+                    self.context_for(hostname)
+                except Exception as e:
+                    print(f"Failed to prepare a certificate for {hostname}: {e}")
+
+        thread = threading.Thread(target=warm, daemon=True)
+        thread.start()
+        return thread
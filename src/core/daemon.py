@@ -0,0 +1,550 @@
+import os
+import sys
+import json
+import math
+import time
+import struct
+import socket
+import threading
+
+from core.paths import control_path, find_control_path, state_path
+
+class DaemonError(Exception):
+    pass
+
+# Commands any local user may send to a root daemon's shared socket
+_READ_ONLY_COMMANDS = {"status", "stats", "recent", "timeline", "report", "subscribe"}
+
+# Longest blackout a "start" may ask for
+MAX_DURATION = 366 * 24 * 3600
+
+def _use_unix_socket():
+    # Otherwise (Windows) a loopback TCP daemon publishes its port and token in control_path()
+    return hasattr(socket, "AF_UNIX") and sys.platform != "win32"
+
+def sinkhole_options(blocker):
+    """SinkholeServer keyword arguments from the IFNOAI_* environment variables."""
+    from core.sinkhole import parse_ports
+    from core.redirect import get_redirect
+
+    # IFNOAI_TERMINATE_TLS=1 opts into TLS termination (requires trusting the local CA)
+    terminate_tls = os.environ.get("IFNOAI_TERMINATE_TLS") == "1"
+    # IFNOAI_PORTS="HTTP=18080,HTTPS=18443" moves the sinkhole off 80/443;
+    # IFNOAI_REDIRECT=nftables|iptables then forwards loopback 80/443 to them
+    ports = parse_ports(os.environ["IFNOAI_PORTS"]) if os.environ.get("IFNOAI_PORTS") else None
+    redirect = get_redirect(os.environ["IFNOAI_REDIRECT"]) if os.environ.get("IFNOAI_REDIRECT") else None
+    # IFNOAI_METRICS_PORT=9464 serves Prometheus metrics on 127.0.0.1:9464/metrics
+    metrics_port = int(os.environ["IFNOAI_METRICS_PORT"]) if os.environ.get("IFNOAI_METRICS_PORT") else None
+    options = {"ports": ports, "redirect": redirect, "terminate_tls": terminate_tls,
+               "prewarm": blocker.load_domains() if terminate_tls else (), "metrics_port": metrics_port}
+    # IFNOAI_DNS=127.0.0.1:53 runs the local DNS resolver, forwarding unblocked
+    # names to IFNOAI_DNS_UPSTREAM (default 1.1.1.1:53)
+    if os.environ.get("IFNOAI_DNS"):
+        from core.dns import parse_address
+        options["dns_listen"] = parse_address(os.environ["IFNOAI_DNS"])
+        if os.environ.get("IFNOAI_DNS_UPSTREAM"):
+            options["dns_upstream"] = parse_address(os.environ["IFNOAI_DNS_UPSTREAM"])
+    return options
+
+def _hit_list(hits):
+    return [[ts, domain, protocol] for ts, domain, protocol in hits]
+
+class SinkholeDaemon:
+    """
+    Headless owner of the sinkhole, its event log and the experiment timer.
+
+    Clients talk to it over a local control socket (a 0600 Unix socket in the
+    state directory, or a token-protected loopback TCP port where Unix
+    sockets are unavailable) using one JSON object per line. A daemon running
+    as root listens in a system-wide directory instead; where the kernel
+    reports peer credentials (Linux) that socket is open to every local user,
+    but only root and the daemon's own user may send more than the read-only
+    commands (status, stats, recent, timeline, report, subscribe):
+
+        {"cmd": "status"}                      daemon and blackout state
+        {"cmd": "stats"}                       counters snapshot
+        {"cmd": "recent", "cursor": n}         hits newer than a cursor
+        {"cmd": "timeline", "resolution": s, "since": ts}
+        {"cmd": "report", "since": ts, "resolution": s, "k": n}
+        {"cmd": "start", "duration": seconds}  enable the block and capture
+        {"cmd": "stop"}                        end the blackout
+        {"cmd": "subscribe"}                   stream {"event": "changed"} lines
+        {"cmd": "shutdown"}                    stop capturing and exit
+
+    Every reply is a JSON object with "ok" and, on failure, "error".
+    """
+
+    def __init__(self, blocker=None, options=None, windows=()):
+        # Imported here so clients of this module never load the capture stack
+        from core.blocker import AIBlocker
+        from core.sinkhole import SinkholeServer
+        from core.eventlog import EventLog
+        from core.history import HistoryStore
+        from core.journal import ExperimentJournal
+
+        self.blocker = blocker or AIBlocker()
+        if options is None:
+            options = sinkhole_options(self.blocker)
+        self.history = HistoryStore()
+        self.event_log = EventLog(history=self.history)
+        self.sinkhole = SinkholeServer(event_log=self.event_log, matcher=self.blocker.load_matcher(),
+                                       **options)
+        self.journal = ExperimentJournal()
+        # Optional recurring core.schedule.BlackoutWindow list, e.g. weekdays 9-12
+        self.windows = list(windows)
+        self._window_scheduler = None
+        self.capturing = False
+        self.started_at = None
+        self.ends_at = None
+        self.token = None
+        self._timer = None
+        self._listener = None
+        self._control_path = None
+        self._shared = False # Socket reachable by other users (see _privileged)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    # Lifecycle
+
+    def run(self):
+        """Serve until shutdown. Returns False if the control socket could not be opened."""
+        if not self._listen():
+            return False
+        try:
+            from core.journal import recover_experiment
+            experiment = recover_experiment(self.blocker, self.journal)
+            if experiment is not None:
+                self.resume(experiment)
+            elif self.blocker.status():
+                self.start_capture(resume=True) # Blocked without a journal, e.g. `on --no-daemon`
+            if self.windows:
+                from core.schedule import WindowScheduler
+                self._window_scheduler = WindowScheduler(self.windows, self._start_window)
+                self._window_scheduler.start()
+            threading.Thread(target=self._accept_loop, daemon=True).start()
+            while not self._done.wait(0.5):
+                pass
+        finally:
+            if self._window_scheduler is not None:
+                self._window_scheduler.stop()
+            self.stop_capture(disable=False)
+            self._close_listener()
+        return True
+
+    def shutdown(self):
+        self._done.set()
+
+    def start_capture(self, duration=None, resume=False):
+        with self._lock:
+            if not self.blocker.status():
+                if resume:
+                    return False
+                if not self.blocker.enable_block():
+                    return False
+            since = self.blocker.active_since()
+            if not self.capturing:
+                if not resume:
+                    self.sinkhole.reset() # A new experiment (or recurring window) counts from zero
+                elif since:
+                    # Restarted mid-experiment: carry on from the logged hits
+                    self.sinkhole.merge_counts(self.history.domain_counts(since.timestamp()))
+                self.event_log.start()
+                self.sinkhole.start()
+                self.capturing = True
+            self.started_at = since.timestamp() if since else time.time()
+            if duration:
+                self._schedule_end(duration)
+            self.journal.begin(self.started_at, self.ends_at, self.blocker.block_checksum())
+            self.journal.checkpoint(*self._snapshot())
+            self.journal.start_checkpoints(self._snapshot)
+            return True
+
+    def resume(self, experiment):
+        """Carry on with an experiment recovered from the journal: its counters and its end."""
+        with self._lock:
+            self.sinkhole.merge_counts(experiment.domains, experiment.total)
+            self.sinkhole.endpoints.update(experiment.endpoints)
+            self.event_log.start()
+            self.sinkhole.start()
+            self.capturing = True
+            self.started_at = experiment.started_at
+            if experiment.ends_at:
+                self._schedule_end(experiment.ends_at - time.time())
+            self.journal.start_checkpoints(self._snapshot)
+
+    def _snapshot(self):
+        stats = self.sinkhole.get_stats()
+        return stats["domains"], self.sinkhole.get_endpoints(), stats["total_blocked"]
+
+    def stop_capture(self, disable=True, reason="stopped"):
+        """Ends the experiment, or with disable=False only stops capturing (it resumes on restart)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.ends_at = None
+            if disable:
+                self.journal.end(reason)
+            else:
+                self.journal.stop_checkpoints()
+            if disable and self.blocker.status():
+                self.blocker.disable_block()
+            if self.capturing:
+                self.sinkhole.stop()
+                self.event_log.close()
+                self.capturing = False
+
+    def _start_window(self, ends_at):
+        if self.capturing and (self.ends_at is None or self.ends_at >= ends_at):
+            return # Already in a blackout that outlasts this window
+        self.start_capture(ends_at - time.time())
+
+    def _schedule_end(self, duration):
+        from core.schedule import Deadline
+        if self._timer is not None:
+            self._timer.cancel()
+        self.ends_at = time.time() + duration
+        # Wall-clock deadline: a suspended machine still ends the experiment on time
+        self._timer = Deadline(self.ends_at, lambda: self.stop_capture(reason="completed")).start()
+
+    # Control socket
+
+    def _listen(self):
+        try:
+            path = control_path()
+            if _use_unix_socket():
+                if os.path.exists(path):
+                    if DaemonClient().ping():
+                        print("Error: an IfNoAI daemon is already running.")
+                        return False
+                    os.unlink(path) # Stale socket from a crashed daemon
+                listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                old_umask = os.umask(0o177)
+                try:
+                    listener.bind(path)
+                finally:
+                    os.umask(old_umask)
+                # In the system-wide directory, let other users read the status
+                # when their identity can be checked per connection
+                if os.path.dirname(path) != state_path() and hasattr(socket, "SO_PEERCRED"):
+                    os.chmod(path, 0o666)
+                    self._shared = True
+            else:
+                if DaemonClient().ping():
+                    print("Error: an IfNoAI daemon is already running.")
+                    return False
+                listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                import secrets
+                listener.bind(("127.0.0.1", 0))
+                self.token = secrets.token_hex(16)
+                with open(path, "w") as f:
+                    json.dump({"port": listener.getsockname()[1], "token": self.token, "pid": os.getpid()}, f)
+            listener.listen(16)
+        except OSError as e:
+            print(f"Error opening the daemon control socket: {e}")
+            return False
+        self._listener = listener
+        self._control_path = path
+        return True
+
+    def _close_listener(self):
+        if self._listener is None:
+            return
+        self._listener.close()
+        self._listener = None
+        try:
+            os.unlink(self._control_path)
+        except OSError:
+            pass
+
+    def _accept_loop(self):
+        while not self._done.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def _privileged(self, conn):
+        """Whether a client may change state: always, unless the socket is shared and it is another user."""
+        if not self._shared:
+            return True # 0600 socket or token-protected TCP port
+        try:
+            creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+            _, uid, _ = struct.unpack("3i", creds)
+        except OSError:
+            return False
+        return uid in (0, os.geteuid())
+
+    def _serve_client(self, conn):
+        privileged = self._privileged(conn)
+        with conn, conn.makefile("rwb") as stream:
+            for line in stream:
+                try:
+                    request = json.loads(line)
+                    if self.token and request.get("token") != self.token:
+                        reply = {"ok": False, "error": "invalid token"}
+                    elif not privileged and request.get("cmd") not in _READ_ONLY_COMMANDS:
+                        reply = {"ok": False, "error": "permission denied (run as root)"}
+                    elif request.get("cmd") == "subscribe":
+                        self._stream_changes(stream)
+                        return
+                    else:
+                        reply = self.handle(request)
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                try:
+                    stream.write(json.dumps(reply).encode("utf-8") + b"\n")
+                    stream.flush()
+                except OSError:
+                    return
+
+    def _stream_changes(self, stream):
+        changed = threading.Event()
+        self.sinkhole.subscribe(changed.set)
+        try:
+            stream.write(b'{"ok": true}\n')
+            stream.flush()
+            while not self._done.is_set():
+                if changed.wait(1.0):
+                    changed.clear()
+                    stream.write(b'{"event": "changed"}\n')
+                    stream.flush()
+        except OSError:
+            pass
+        finally:
+            self.sinkhole.unsubscribe(changed.set)
+
+    def _next_window(self):
+        if self._window_scheduler is None:
+            return None
+        occurrence = self._window_scheduler.next_occurrence()
+        return [occurrence[0].timestamp(), occurrence[1].timestamp()] if occurrence else None
+
+    def handle(self, request):
+        cmd = request.get("cmd")
+        if cmd == "status":
+            return {"ok": True, "pid": os.getpid(), "blocking": self.blocker.status(),
+                    "capturing": self.capturing, "started_at": self.started_at, "ends_at": self.ends_at,
+                    "next_window": self._next_window(),
+                    "bind_failures": [f._asdict() for f in self.sinkhole.bind_failures]}
+        if cmd == "stats":
+            stats = self.sinkhole.get_stats()
+            return {"ok": True, "total_blocked": stats["total_blocked"],
+                    "domains": dict(stats["domains"]),
+                    "categories": dict(stats.get("categories", {})),
+                    "top_domains": self.sinkhole.top_domains(request.get("k", 10)),
+                    "endpoints": dict(self.sinkhole.get_endpoints())}
+        if cmd == "recent":
+            hits, cursor = self.sinkhole.recent_hits(request.get("cursor", 0))
+            return {"ok": True, "hits": _hit_list(hits), "cursor": cursor}
+        if cmd == "timeline":
+            timeline = self.event_log.timeline(request.get("resolution", 60), since=request.get("since"))
+            return {"ok": True, "timeline": timeline}
+        if cmd == "report":
+            report = self.history.report(request.get("since"), request.get("resolution", 60), request.get("k", 10))
+            return dict(report, ok=True)
+        if cmd == "start":
+            duration = request.get("duration")
+            if duration is not None and (isinstance(duration, bool) or not isinstance(duration, (int, float))
+                                         or not math.isfinite(duration) or not 0 < duration <= MAX_DURATION):
+                return {"ok": False, "error": f"duration must be a number of seconds in (0, {MAX_DURATION}]"}
+            if not self.start_capture(duration):
+                return {"ok": False, "error": "could not enable the block"}
+            return {"ok": True}
+        if cmd == "stop":
+            self.stop_capture()
+            return {"ok": True}
+        if cmd == "shutdown":
+            self.shutdown()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown command: {cmd}"}
+
+class DaemonClient:
+    """Talks to a running SinkholeDaemon; every call opens its own short connection."""
+
+    def __init__(self, timeout=2.0):
+        self.timeout = timeout
+
+    def _connect(self):
+        path = find_control_path()
+        if path is None:
+            raise FileNotFoundError("no daemon control socket")
+        if _use_unix_socket():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(path)
+            except OSError:
+                sock.close()
+                raise
+            return sock, None
+        with open(path) as f:
+            endpoint = json.load(f)
+        sock = socket.create_connection(("127.0.0.1", endpoint["port"]), timeout=self.timeout)
+        return sock, endpoint["token"]
+
+    def request(self, cmd, **args):
+        """Send one command; raises DaemonError if no daemon answers."""
+        try:
+            sock, token = self._connect()
+        except (OSError, ValueError) as e:
+            raise DaemonError(f"IfNoAI daemon not reachable: {e}")
+        request = dict(args, cmd=cmd)
+        if token:
+            request["token"] = token
+        with sock, sock.makefile("rwb") as stream:
+            try:
+                stream.write(json.dumps(request).encode("utf-8") + b"\n")
+                stream.flush()
+                line = stream.readline()
+            except OSError as e:
+                raise DaemonError(f"IfNoAI daemon did not answer: {e}")
+        if not line:
+            raise DaemonError("IfNoAI daemon closed the connection")
+        return json.loads(line)
+
+    def ping(self):
+        try:
+            return self.request("status").get("ok", False)
+        except DaemonError:
+            return False
+
+    def subscribe(self, callback, stop_event):
+        """Call `callback()` on every change notification until stop_event is set (blocking)."""
+        try:
+            sock, token = self._connect()
+        except (OSError, ValueError):
+            return
+        request = {"cmd": "subscribe"}
+        if token:
+            request["token"] = token
+        sock.settimeout(1.0)
+        with sock, sock.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            while not stop_event.is_set():
+                try:
+                    line = stream.readline()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+                if not line:
+                    return
+                if b'"changed"' in line:
+                    callback()
+
+class RemoteSinkhole:
+    """
+    The part of the SinkholeServer interface the GUI uses, backed by a daemon,
+    so a running daemon keeps capturing while the GUI is only a view of it.
+    """
+
+    def __init__(self, client=None):
+        self.client = client or DaemonClient()
+        self.bind_failures = []
+        # The daemon's experiment, as of the last refresh()
+        self.started_at = None
+        self.ends_at = None
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, duration=None):
+        """Have the daemon enable the block and capture for `duration` seconds (None: no end)."""
+        reply = self.client.request("start", duration=duration)
+        self.refresh()
+        return reply.get("ok", False)
+
+    def refresh(self):
+        """Read the daemon's status: its bind failures and the running experiment's start and end."""
+        status = self.client.request("status")
+        self.bind_failures = [_bind_failure(f) for f in status.get("bind_failures", [])]
+        self.started_at = status.get("started_at")
+        self.ends_at = status.get("ends_at")
+        return status
+
+    def stop(self):
+        """End the blackout in the daemon."""
+        self.client.request("stop")
+
+    def detach(self):
+        """Stop following the daemon; unlike stop() the blackout carries on."""
+        self._subscribers = []
+        self._stop.set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def merge_counts(self, domains, total=None):
+        pass # The daemon restores its own history
+
+    def get_stats(self):
+        reply = self.client.request("stats")
+        return {"total_blocked": reply["total_blocked"], "domains": reply["domains"],
+                "categories": reply["categories"]}
+
+    def top_domains(self, k=10):
+        return [tuple(item) for item in self.client.request("stats", k=k)["top_domains"]]
+
+    def get_endpoints(self):
+        return self.client.request("stats")["endpoints"]
+
+    def recent_hits(self, cursor=0):
+        reply = self.client.request("recent", cursor=cursor)
+        return [tuple(hit) for hit in reply["hits"]], reply["cursor"]
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.client.subscribe,
+                                            args=(self._notify, self._stop), daemon=True)
+            self._thread.start()
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+        if not self._subscribers:
+            self._stop.set()
+
+    def _notify(self):
+        for callback in list(self._subscribers):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in stats subscriber: {e}")
+
+class RemoteEventLog:
+    """EventLog stand-in for the GUI when the daemon owns the real log."""
+
+    def __init__(self, client=None):
+        self.client = client or DaemonClient()
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def timeline(self, resolution=60, since=None, until=None):
+        reply = self.client.request("timeline", resolution=resolution, since=since)
+        return [tuple(bucket) for bucket in reply.get("timeline", [])]
+
+class RemoteHistory:
+    """HistoryStore stand-in for the GUI: the daemon's store answers the report."""
+
+    def __init__(self, client=None):
+        self.client = client or DaemonClient()
+
+    def domain_counts(self, since=None):
+        return {} # The daemon restores its own history
+
+    def report(self, since=None, resolution=60, k=10):
+        reply = self.client.request("report", since=since, resolution=resolution, k=k)
+        return {"total_blocked": reply["total_blocked"],
+                "top_domains": [tuple(item) for item in reply["top_domains"]],
+                "timeline": [tuple(bucket) for bucket in reply["timeline"]]}
+
+def _bind_failure(data):
+    from core.sinkhole import BindFailure
+    return BindFailure(**data)
@@ -0,0 +1,475 @@
+import socket
+import secrets
+import selectors
+import struct
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+
+_HEADER = struct.Struct("!HHHHHH")
+_RR = struct.Struct("!HHIH") # type, class, ttl, rdlength
+
+TYPE_A = 1
+TYPE_AAAA = 28
+TYPE_OPT = 41
+
+RCODE_NXDOMAIN = 3
+RCODE_SERVFAIL = 2
+
+def parse_address(text, default_port=53):
+    """Parse "127.0.0.1:53", "[::1]:5353" or a bare address into (host, port)."""
+    text = text.strip()
+    if text.startswith("["):
+        host, _, port = text[1:].partition("]")
+        port = port.lstrip(":")
+    elif text.count(":") == 1:
+        host, _, port = text.partition(":")
+    else:
+        host, port = text, ""
+    try:
+        ipaddress.ip_address(host)
+        return host, int(port) if port else default_port
+    except ValueError:
+        raise ValueError(f"Invalid DNS address: {text} (expected e.g. 127.0.0.1:53)")
+
+class DNSQuery:
+    __slots__ = ("id", "flags", "name", "qtype", "qclass", "question")
+
+def parse_query(data):
+    """Parses the header and first question of a DNS message. Returns DNSQuery or None."""
+    if len(data) < 12:
+        return None
+    msg_id, flags, qdcount, _, _, _ = _HEADER.unpack_from(data, 0)
+    if qdcount < 1 or flags & 0x8000: # Must be a query with a question
+        return None
+    labels = []
+    p = 12
+    while True:
+        if p >= len(data):
+            return None
+        n = data[p]
+        if n == 0:
+            p += 1
+            break
+        if n & 0xC0: # Compression pointers never appear in a question
+            return None
+        labels.append(data[p + 1:p + 1 + n])
+        p += 1 + n
+    if p + 4 > len(data):
+        return None
+    query = DNSQuery()
+    query.id = msg_id
+    query.flags = flags
+    query.name = b".".join(labels).decode("ascii", errors="replace").lower()
+    query.qtype, query.qclass = struct.unpack_from("!HH", data, p)
+    query.question = data[12:p + 4]
+    return query
+
+def _skip_name(data, p):
+    while True:
+        n = data[p]
+        if n == 0:
+            return p + 1
+        if n & 0xC0 == 0xC0:
+            return p + 2
+        p += 1 + n
+
+def response_ttl(data, default=30):
+    """Smallest TTL among the answer/authority records of a response."""
+    try:
+        _, _, qdcount, ancount, nscount, _ = _HEADER.unpack_from(data, 0)
+        p = 12
+        for _ in range(qdcount):
+            p = _skip_name(data, p) + 4
+        ttl = None
+        for _ in range(ancount + nscount):
+            p = _skip_name(data, p)
+            _, _, record_ttl, rdlength = _RR.unpack_from(data, p)
+            p += _RR.size + rdlength
+            ttl = record_ttl if ttl is None else min(ttl, record_ttl)
+        return default if ttl is None else ttl
+    except (IndexError, struct.error):
+        return default
+
+def ttl_offsets(data):
+    """Offsets of the TTL fields of every record in a response (EDNS OPT pseudo-records excluded)."""
+    offsets = []
+    try:
+        _, _, qdcount, ancount, nscount, arcount = _HEADER.unpack_from(data, 0)
+        p = 12
+        for _ in range(qdcount):
+            p = _skip_name(data, p) + 4
+        for _ in range(ancount + nscount + arcount):
+            p = _skip_name(data, p)
+            record_type, _, _, rdlength = _RR.unpack_from(data, p)
+            if record_type != TYPE_OPT:
+                offsets.append(p + 4)
+            p += _RR.size + rdlength
+    except (IndexError, struct.error):
+        return []
+    return offsets
+
+def age_response(response, offsets, age):
+    """`response` with `age` seconds taken off the TTLs at `offsets`."""
+    if not offsets or age < 1:
+        return response
+    aged = bytearray(response)
+    for offset in offsets:
+        ttl = struct.unpack_from("!I", aged, offset)[0]
+        struct.pack_into("!I", aged, offset, max(0, ttl - int(age)))
+    return bytes(aged)
+
+class ResponseCache:
+    """
+    LRU cache of upstream responses, evicting entries when their TTL runs out.
+    Entries are served with their TTLs counted down by the time spent here.
+    """
+
+    def __init__(self, max_entries=10000, max_ttl=300):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, stored, response, offsets = entry
+        if expires <= now:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return age_response(response, offsets, now - stored)
+
+    def put(self, key, response, ttl, now):
+        ttl = min(ttl, self.max_ttl)
+        if ttl <= 0:
+            return
+        self.entries[key] = (now + ttl, now, response, ttl_offsets(response))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def purge(self, now):
+        expired = [key for key, entry in self.entries.items() if entry[0] <= now]
+        for key in expired:
+            del self.entries[key]
+
+class _TCPClient:
+    __slots__ = ("sock", "buffer", "family", "port", "deadline")
+
+    def __init__(self, sock, family, port, deadline):
+        self.sock = sock
+        self.buffer = b""
+        self.family = family
+        self.port = port
+        self.deadline = deadline
+
+class DNSSinkhole:
+    """
+    Local DNS resolver that sinkholes blocked names and forwards the rest.
+
+    Queries for names matched by the DomainMatcher are answered directly:
+    A/AAAA with 127.0.0.1/::1 (so the HTTP/HTTPS sinkhole receives the
+    traffic) or NXDOMAIN when block_mode is "nxdomain". Everything else is
+    forwarded to the upstream resolver over UDP, and its answers are cached
+    until their TTL expires. UDP and TCP listeners, the upstream socket and
+    all TCP clients share one selector thread, like SinkholeServer.
+
+    Forwarded queries get a random transaction id, and an upstream answer is
+    only accepted (and cached) when it comes from the upstream address with
+    the id and question of a pending query, so off-path spoofing has to
+    guess both the id and the upstream socket's port.
+    """
+
+    def __init__(self, matcher, upstream=("1.1.1.1", 53), listen=("127.0.0.1", 53),
+                 block_mode="loopback", sinkhole=None, block_ttl=60,
+                 cache_size=10000, upstream_timeout=2.0):
+        self.matcher = matcher
+        self.upstream = upstream
+        self.listen = listen
+        self.block_mode = block_mode
+        # Blocked queries are recorded through the HTTP/HTTPS sinkhole's counters
+        self.sinkhole = sinkhole
+        self.block_ttl = block_ttl
+        self.cache = ResponseCache(cache_size)
+        self.upstream_timeout = upstream_timeout
+        self.stats = {"queries": 0, "blocked": 0, "cache_hits": 0, "forwarded": 0, "failed": 0}
+        self.running = False
+        self.selector = None
+        self.sockets = []
+        self.tcp_clients = {}
+        self.pending = OrderedDict() # upstream id -> (reply, query, key, deadline)
+        self.upstream_sock = None
+        self.thread = None
+        self.bind_error = None # OSError of the last failed start()
+        self._upstream_peer = None
+        self._wakeup_r = None
+        self._wakeup_w = None
+
+    def start(self):
+        if self.running:
+            return True
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, "wakeup")
+
+        host, port = self.listen
+        family = socket.AF_INET6 if ":" in host else socket.AF_INET
+        self.bind_error = None
+        try:
+            udp = socket.socket(family, socket.SOCK_DGRAM)
+            udp.bind((host, port))
+            udp.setblocking(False)
+            self.sockets.append(udp)
+            self.selector.register(udp, selectors.EVENT_READ, "udp")
+
+            tcp = socket.socket(family, socket.SOCK_STREAM)
+            tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            tcp.bind((host, port))
+            tcp.listen(socket.SOMAXCONN)
+            tcp.setblocking(False)
+            self.sockets.append(tcp)
+            self.selector.register(tcp, selectors.EVENT_READ, "tcp")
+
+            up_family = socket.AF_INET6 if ":" in self.upstream[0] else socket.AF_INET
+            self.upstream_sock = socket.socket(up_family, socket.SOCK_DGRAM)
+            if ipaddress.ip_address(self.upstream[0]).is_loopback:
+                # A local upstream never needs the socket to be reachable from the network
+                self.upstream_sock.bind(("::1" if up_family == socket.AF_INET6 else "127.0.0.1", 0))
+            # Connected, so the kernel drops datagrams from any other source
+            self.upstream_sock.connect(self.upstream)
+            self._upstream_peer = self.upstream_sock.getpeername()[:2]
+            self.upstream_sock.setblocking(False)
+            self.selector.register(self.upstream_sock, selectors.EVENT_READ, "upstream")
+        except Exception as e:
+            print(f"Error binding DNS sinkhole to {host}:{port}: {e}")
+            self.bind_error = e
+            self._close_all()
+            return False
+
+        print(f"DNS sinkhole listening on {host}:{port} (upstream {self.upstream[0]}:{self.upstream[1]})")
+        self.running = True
+        self.thread = threading.Thread(target=self._event_loop, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self._wakeup_w.send(b"\0")
+        except (OSError, AttributeError):
+            pass
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+        self.thread = None
+
+    def _event_loop(self):
+        last_purge = time.monotonic()
+        try:
+            while self.running:
+                for key, _ in self.selector.select(0.5):
+                    kind = key.data
+                    if kind == "udp":
+                        self._read_udp(key.fileobj)
+                    elif kind == "upstream":
+                        self._read_upstream()
+                    elif kind == "tcp":
+                        self._accept_tcp(key.fileobj)
+                    elif kind == "wakeup":
+                        try:
+                            self._wakeup_r.recv(64)
+                        except OSError:
+                            pass
+                    else:
+                        self._read_tcp(kind)
+
+                now = time.monotonic()
+                self._expire(now)
+                if now - last_purge > 30:
+                    self.cache.purge(now)
+                    last_purge = now
+        except Exception as e:
+            print(f"Error in DNS sinkhole event loop: {e}")
+        finally:
+            self.running = False
+            self._close_all()
+
+    def _read_udp(self, sock):
+        # Drain everything queued on the socket in one wakeup
+        for _ in range(64):
+            try:
+                data, addr = sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            family = "IPv6" if sock.family == socket.AF_INET6 else "IPv4"
+            reply = lambda response, sock=sock, addr=addr: self._send_udp(sock, addr, response)
+            self._handle_query(data, reply, family, addr[1])
+
+    def _send_udp(self, sock, addr, response):
+        # A full socket buffer (a query flood) loses this answer, not the resolver
+        try:
+            sock.sendto(response, addr)
+        except OSError:
+            pass
+
+    def _accept_tcp(self, listener):
+        try:
+            client, addr = listener.accept()
+        except (BlockingIOError, InterruptedError, OSError):
+            return
+        client.setblocking(False)
+        family = "IPv6" if listener.family == socket.AF_INET6 else "IPv4"
+        conn = _TCPClient(client, family, addr[1], time.monotonic() + 10.0)
+        self.tcp_clients[client] = conn
+        self.selector.register(client, selectors.EVENT_READ, conn)
+
+    def _read_tcp(self, conn):
+        try:
+            data = conn.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close_tcp(conn)
+            return
+        conn.buffer += data
+        # TCP messages are prefixed with a two byte length
+        while len(conn.buffer) >= 2:
+            n = struct.unpack_from("!H", conn.buffer)[0]
+            if len(conn.buffer) < 2 + n:
+                break
+            message, conn.buffer = conn.buffer[2:2 + n], conn.buffer[2 + n:]
+            reply = lambda response, conn=conn: self._send_tcp(conn, response)
+            self._handle_query(message, reply, conn.family, conn.port)
+
+    def _send_tcp(self, conn, response):
+        try:
+            conn.sock.sendall(struct.pack("!H", len(response)) + response)
+        except OSError:
+            self._close_tcp(conn)
+
+    def _close_tcp(self, conn):
+        if self.tcp_clients.pop(conn.sock, None) is None:
+            return
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+
+    def _handle_query(self, data, reply, family, port):
+        query = parse_query(data)
+        if query is None:
+            return
+        self.stats["queries"] += 1
+
+        if self.matcher.match(query.name) is not None:
+            self.stats["blocked"] += 1
+            if self.sinkhole is not None:
+                self.sinkhole._record_hit(query.name, "DNS", family, port)
+            reply(self._blocked_response(query))
+            return
+
+        key = (query.name, query.qtype, query.qclass)
+        now = time.monotonic()
+        cached = self.cache.get(key, now)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            # Same answer, with the client's transaction id and question spelling
+            n = len(query.question)
+            reply(data[:2] + cached[2:12] + query.question + cached[12 + n:])
+            return
+
+        self._forward(data, query, key, reply, now)
+
+    def _blocked_response(self, query):
+        # QR, AA and RA set; opcode and RD copied from the query
+        flags = 0x8480 | (query.flags & 0x7900)
+        answers = b""
+        if self.block_mode == "nxdomain":
+            flags |= RCODE_NXDOMAIN
+        elif query.qtype == TYPE_A:
+            answers = b"\xc0\x0c" + _RR.pack(TYPE_A, query.qclass, self.block_ttl, 4) + socket.inet_aton("127.0.0.1")
+        elif query.qtype == TYPE_AAAA:
+            answers = b"\xc0\x0c" + _RR.pack(TYPE_AAAA, query.qclass, self.block_ttl, 16) + socket.inet_pton(socket.AF_INET6, "::1")
+        ancount = 1 if answers else 0
+        return _HEADER.pack(query.id, flags, 1, ancount, 0, 0) + query.question + answers
+
+    def _forward(self, data, query, key, reply, now):
+        if len(self.pending) > 0xFFFF:
+            # Every id is in flight: give up on the oldest query
+            _, (old_reply, old_query, _, _) = self.pending.popitem(last=False)
+            self._fail(old_reply, old_query)
+        upstream_id = secrets.randbits(16)
+        while upstream_id in self.pending:
+            upstream_id = secrets.randbits(16)
+        self.pending[upstream_id] = (reply, query, key, now + self.upstream_timeout)
+        try:
+            self.upstream_sock.send(struct.pack("!H", upstream_id) + data[2:])
+            self.stats["forwarded"] += 1
+        except OSError:
+            del self.pending[upstream_id]
+            self._fail(reply, query)
+
+    def _read_upstream(self):
+        for _ in range(64):
+            try:
+                data, addr = self.upstream_sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError, OSError):
+                return
+            if len(data) < 12 or addr[:2] != self._upstream_peer:
+                continue
+            upstream_id = struct.unpack_from("!H", data)[0]
+            entry = self.pending.get(upstream_id)
+            if entry is None:
+                continue # Late or spoofed answer
+            reply, query, key, _ = entry
+            if not data[2] & 0x80 or data[12:12 + len(query.question)] != query.question:
+                continue # Not an answer to the question we asked
+            del self.pending[upstream_id]
+            response = struct.pack("!H", query.id) + data[2:]
+            rcode = data[3] & 0x0F
+            if rcode in (0, RCODE_NXDOMAIN) and not data[2] & 0x02: # Skip truncated answers
+                self.cache.put(key, response, response_ttl(data), time.monotonic())
+            reply(response)
+
+    def _fail(self, reply, query):
+        self.stats["failed"] += 1
+        flags = 0x8080 | (query.flags & 0x7900) | RCODE_SERVFAIL
+        reply(_HEADER.pack(query.id, flags, 1, 0, 0, 0) + query.question)
+
+    def _expire(self, now):
+        # Pending upstream queries are kept in send order
+        while self.pending:
+            upstream_id, (reply, query, key, deadline) = next(iter(self.pending.items()))
+            if deadline > now:
+                break
+            del self.pending[upstream_id]
+            self._fail(reply, query)
+        for conn in [c for c in self.tcp_clients.values() if c.deadline <= now]:
+            self._close_tcp(conn)
+
+    def _close_all(self):
+        for conn in list(self.tcp_clients.values()):
+            self._close_tcp(conn)
+        for sock in self.sockets + [self.upstream_sock, self._wakeup_r, self._wakeup_w]:
+            if sock:
+                sock.close()
+        self.sockets = []
+        self.upstream_sock = None
+        self._wakeup_r = self._wakeup_w = None
+        self.pending.clear()
+        if self.selector:
+            self.selector.close()
+            self.selector = None
+
+    def get_stats(self):
+        return dict(self.stats)
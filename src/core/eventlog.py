@@ -0,0 +1,221 @@
+import os
+import struct
+import threading
+from collections import deque
+
+from core.paths import state_dir
+
+MAGIC = b"IFNOAI-EVENTS\x01"
+
+# Record layouts (little endian). Domains are interned: the first time a
+# domain is seen a definition record assigns it an id, hits then refer to it.
+_DOMAIN = struct.Struct("<BIH") # type, domain id, name length (+ name bytes)
+_HIT = struct.Struct("<BdBBHI") # type, timestamp, protocol, family, source port, domain id
+_TYPE_DOMAIN = 1
+_TYPE_HIT = 2
+
+PROTOCOLS = ["HTTP", "HTTPS", "DNS"]
+FAMILIES = ["IPv4", "IPv6"]
+
+MINUTE = 60
+HOUR = 3600
+
+# How many buckets of each resolution are kept in memory (2 days of minutes,
+# 90 days of hours); older buckets are dropped as new ones are added
+ROLLUP_LIMITS = {MINUTE: 2 * 24 * 60, HOUR: 90 * 24}
+
+class EventLog:
+    """
+    Append-only on-disk log of every intercepted request.
+
+    The capture path only appends a tuple to an in-memory deque; a background
+    thread encodes queued hits in batches, appends them to the log file and
+    keeps per-minute and per-hour rollups up to date so timelines can be
+    queried without touching the disk. An existing log is replayed the first
+    time it is needed (appending to it or querying it), not when the EventLog
+    is created, so an experiment that survives a crash or restart keeps its
+    history. Once the log outgrows max_size it is rotated to events.log.1,
+    replacing the previous one, and the rollups are capped by ROLLUP_LIMITS,
+    so neither startup nor memory grows with the length of history.
+    """
+
+    def __init__(self, path=None, flush_interval=0.5, history=None, max_size=4 * 1024 * 1024):
+        self.path = str(path or state_dir() / "events.log")
+        self.rotated_path = f"{self.path}.1"
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        # Optional core.history.HistoryStore mirroring each written batch
+        self.history = history
+        self.pending = deque()
+        # Domain table of the current log file (ids are per file)
+        self.domain_ids = {}
+        self.domain_names = []
+        self.rollups = {MINUTE: {}, HOUR: {}}
+        self.lock = threading.Lock() # Guards the rollups; never taken on the capture path
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._file = None
+
+    def start(self):
+        if self._running:
+            return
+        self._load() # New hits must continue the current file's domain table
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+        self._flush()
+        self._file.close()
+        self._file = None
+        if self.history is not None:
+            self.history.close()
+
+    def record(self, timestamp, domain, protocol, family="IPv4", port=0):
+        """Queue a hit. Safe to call from any thread; never blocks on I/O."""
+        self.pending.append((timestamp, domain, protocol, family, port))
+
+    def _writer_loop(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._flush()
+            except Exception as e:
+                print(f"Error writing event log: {e}")
+
+    def _flush(self):
+        if not self.pending or self._file is None:
+            return
+        chunks = []
+        hits = []
+        rows = []
+        while self.pending:
+            timestamp, domain, protocol, family, port = self.pending.popleft()
+            rows.append((timestamp, domain, protocol, family))
+            domain_id = self.domain_ids.get(domain)
+            if domain_id is None:
+                domain_id = self._intern(domain)
+                name = domain.encode("utf-8")[:0xFFFF]
+                chunks.append(_DOMAIN.pack(_TYPE_DOMAIN, domain_id, len(name)) + name)
+            chunks.append(_HIT.pack(_TYPE_HIT, timestamp, _code(PROTOCOLS, protocol),
+                                    _code(FAMILIES, family), port, domain_id))
+            hits.append((timestamp, domain_id))
+
+        self._file.write(b"".join(chunks))
+        self._file.flush()
+        self._add_to_rollups(hits)
+        if self.history is not None:
+            self.history.append(rows)
+        if self._file.tell() > self.max_size:
+            self._rotate()
+
+    def _rotate(self):
+        """Start a new log file; the full one becomes events.log.1."""
+        self._file.close()
+        os.replace(self.path, self.rotated_path)
+        self._file = open(self.path, "ab")
+        self._file.write(MAGIC)
+        self.domain_ids = {}
+        self.domain_names = []
+
+    def _intern(self, domain):
+        domain_id = len(self.domain_names)
+        self.domain_ids[domain] = domain_id
+        self.domain_names.append(domain)
+        return domain_id
+
+    def _add_to_rollups(self, hits):
+        with self.lock:
+            for resolution, buckets in self.rollups.items():
+                for timestamp, _ in hits:
+                    bucket = int(timestamp // resolution) * resolution
+                    buckets[bucket] = buckets.get(bucket, 0) + 1
+                excess = len(buckets) - ROLLUP_LIMITS[resolution]
+                if excess > 0:
+                    for bucket in sorted(buckets)[:excess]:
+                        del buckets[bucket]
+
+    def _load(self):
+        """Replay the rotated and current log files once: rollups and the current domain table."""
+        with self._load_lock:
+            if self._loaded:
+                return
+            for path in (self.rotated_path, self.path):
+                names = self.domain_names if path == self.path else []
+                hits = [(timestamp, domain_id) for timestamp, domain_id, _, _, _ in self._iter_records(path, names)]
+                self._add_to_rollups(hits)
+            self.domain_ids = {domain: domain_id for domain_id, domain in enumerate(self.domain_names)}
+            self._loaded = True
+
+    def _iter_records(self, path, names):
+        """
+        Yields (timestamp, domain id, protocol, family, port) from one log file,
+        filling `names` with its domain table; stops at a torn tail.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        if not data.startswith(MAGIC):
+            return
+        p = len(MAGIC)
+        while p < len(data):
+            record_type = data[p]
+            if record_type == _TYPE_DOMAIN:
+                if p + _DOMAIN.size > len(data):
+                    break
+                _, domain_id, n = _DOMAIN.unpack_from(data, p)
+                p += _DOMAIN.size
+                if p + n > len(data):
+                    break
+                if domain_id == len(names):
+                    names.append(data[p:p + n].decode("utf-8", errors="replace"))
+                p += n
+            elif record_type == _TYPE_HIT:
+                if p + _HIT.size > len(data):
+                    break
+                _, timestamp, protocol, family, port, domain_id = _HIT.unpack_from(data, p)
+                p += _HIT.size
+                if domain_id < len(names):
+                    yield timestamp, domain_id, protocol, family, port
+            else:
+                break
+
+    def events(self, since=None, until=None):
+        """Yields every logged hit as (timestamp, domain, protocol, family, port)."""
+        for path in (self.rotated_path, self.path):
+            names = []
+            for timestamp, domain_id, protocol, family, port in self._iter_records(path, names):
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp >= until:
+                    continue
+                yield (timestamp, names[domain_id], PROTOCOLS[protocol], FAMILIES[family], port)
+
+    def timeline(self, resolution=MINUTE, since=None, until=None):
+        """Returns [(bucket_start, count)] for the given resolution, oldest first."""
+        self._load()
+        with self.lock:
+            buckets = sorted(self.rollups[resolution].items())
+        return [(b, c) for b, c in buckets
+                if (since is None or b + resolution > since) and (until is None or b < until)]
+
+def _code(table, value):
+    try:
+        return table.index(value)
+    except ValueError:
+        return 0
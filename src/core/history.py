@@ -0,0 +1,225 @@
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from core.paths import state_dir
+
+# One fixed-width file per column; row i of every column describes the same hit
+_COLUMNS = {
+    "timestamps": ("d", "timestamps.f64"),
+    "domains": ("I", "domains.u32"),
+    "flags": ("B", "flags.u8"),
+}
+_DICTIONARY = "domains.txt"
+
+# flags: bit 0 = HTTPS, bit 1 = IPv6, bit 2 = DNS
+FLAG_HTTPS = 1
+FLAG_IPV6 = 2
+FLAG_DNS = 4
+
+class HistoryStore:
+    """
+    Columnar, append-only store for long-running interception history.
+
+    Each column is a flat file of fixed-width values (float64 timestamps,
+    uint32 interned domain ids, uint8 protocol flags) and the domain names
+    live in a line-per-id sidecar. Timestamps are kept non-decreasing so
+    time ranges resolve with a binary search, and readers memory-map the
+    columns instead of materialising per-row objects. The files stay open
+    for appending between batches until close(). Readers see the rows and
+    names of the last complete append, even while another thread appends.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or state_dir() / "history"
+        os.makedirs(self.directory, exist_ok=True)
+        self.domain_names = []
+        self.domain_ids = {}
+        self.last_timestamp = 0.0
+        self.rows = 0 # Complete rows on disk
+        self._files = {}
+        self._lock = threading.Lock()
+        self._load_dictionary()
+        self._repair()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_dictionary(self):
+        path = self._path(_DICTIONARY)
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break # Torn write, the id was never referenced
+                domain = line[:-1]
+                self.domain_ids[domain] = len(self.domain_names)
+                self.domain_names.append(domain)
+
+    def _repair(self):
+        """Truncate every column to the shortest one after an interrupted append."""
+        rows = None
+        for typecode, name in _COLUMNS.values():
+            path = self._path(name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            n = size // array(typecode).itemsize
+            rows = n if rows is None else min(rows, n)
+        for typecode, name in _COLUMNS.values():
+            with open(self._path(name), "ab") as f:
+                f.truncate(rows * array(typecode).itemsize)
+        self.rows = rows
+        if rows:
+            with open(self._path(_COLUMNS["timestamps"][1]), "rb") as f:
+                f.seek((rows - 1) * 8)
+                self.last_timestamp = array("d", f.read(8))[0]
+
+    def append(self, rows):
+        """Append (timestamp, domain, protocol, family) rows."""
+        with self._lock:
+            self._append(rows)
+
+    def _append(self, rows):
+        timestamps = array("d")
+        domains = array("I")
+        flags = array("B")
+        new_names = []
+        for timestamp, domain, protocol, family in sorted(rows):
+            domain_id = self.domain_ids.get(domain)
+            if domain_id is None:
+                domain_id = len(self.domain_names)
+                self.domain_ids[domain] = domain_id
+                self.domain_names.append(domain)
+                new_names.append(domain.replace("\n", " ") + "\n")
+            # Late arrivals (e.g. forwarded from worker processes) are clamped so
+            # the timestamp column stays sorted
+            self.last_timestamp = max(self.last_timestamp, timestamp)
+            timestamps.append(self.last_timestamp)
+            domains.append(domain_id)
+            flags.append((FLAG_HTTPS if protocol == "HTTPS" else 0) |
+                         (FLAG_DNS if protocol == "DNS" else 0) |
+                         (FLAG_IPV6 if family == "IPv6" else 0))
+
+        # Dictionary first, so a crash never leaves rows pointing at unknown ids
+        if new_names:
+            f = self._file(_DICTIONARY)
+            f.write("".join(new_names).encode("utf-8"))
+            f.flush()
+        for column, values in (("timestamps", timestamps), ("domains", domains), ("flags", flags)):
+            f = self._file(_COLUMNS[column][1])
+            values.tofile(f)
+            f.flush()
+        self.rows += len(timestamps)
+
+    def _file(self, name):
+        f = self._files.get(name)
+        if f is None:
+            f = self._files[name] = open(self._path(name), "ab")
+        return f
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def reader(self):
+        """Returns a HistoryReader over a memory-mapped snapshot of the store."""
+        # Rows and names of the same append, so every mapped row has a name
+        with self._lock:
+            rows, names = self.rows, list(self.domain_names)
+        return HistoryReader(self.directory, names, rows)
+
+    def domain_counts(self, since=None):
+        """Per-domain hits since a timestamp, used to restore stats after a restart."""
+        with self.reader() as reader:
+            return reader.domain_counts(since)
+
+    def report(self, since=None, resolution=60, k=10):
+        """Total, top domains and timeline of the hits since a timestamp, for the experiment report."""
+        with self.reader() as reader:
+            return {"total_blocked": reader.count(since), "top_domains": reader.top_domains(k, since),
+                    "timeline": reader.timeline(resolution, since)}
+
+class HistoryReader:
+    def __init__(self, directory, domain_names, rows=None):
+        self.domain_names = domain_names
+        self._maps = []
+        self.columns = {}
+        for column, (typecode, name) in _COLUMNS.items():
+            path = os.path.join(directory, name)
+            if not os.path.exists(path) or os.path.getsize(path) == 0:
+                self.columns[column] = memoryview(array(typecode))
+                continue
+            with open(path, "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(m)
+            self.columns[column] = memoryview(m).cast(typecode)
+        self.rows = min(len(c) for c in self.columns.values())
+        if rows is not None:
+            self.rows = min(self.rows, rows) # Ignore rows appended after the snapshot
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in self.columns.values():
+            view.release()
+        for m in self._maps:
+            m.close()
+        self._maps = []
+
+    def _range(self, since, until):
+        ts = self.columns["timestamps"]
+        lo = 0 if since is None else bisect_left(ts, since, 0, self.rows)
+        hi = self.rows if until is None else bisect_left(ts, until, lo, self.rows)
+        return lo, hi
+
+    def count(self, since=None, until=None):
+        lo, hi = self._range(since, until)
+        return hi - lo
+
+    def domain_counts(self, since=None, until=None):
+        """Returns {domain: hits}; counting runs in C over the mapped id column."""
+        lo, hi = self._range(since, until)
+        counts = Counter(self.columns["domains"][lo:hi])
+        return {self.domain_names[domain_id]: n for domain_id, n in counts.items()}
+
+    def top_domains(self, k=10, since=None, until=None):
+        lo, hi = self._range(since, until)
+        counts = Counter(self.columns["domains"][lo:hi])
+        return [(self.domain_names[domain_id], n) for domain_id, n in counts.most_common(k)]
+
+    def flag_counts(self, since=None, until=None):
+        """Returns {"HTTP"/"HTTPS"/"DNS": hits, "IPv4"/"IPv6": hits}."""
+        lo, hi = self._range(since, until)
+        # Only a handful of distinct flag values exist, so counting bytes beats a Counter
+        data = self.columns["flags"][lo:hi].tobytes()
+        result = {"HTTP": 0, "HTTPS": 0, "DNS": 0, "IPv4": 0, "IPv6": 0}
+        for flags in range(8):
+            n = data.count(flags)
+            if not n:
+                continue
+            protocol = "DNS" if flags & FLAG_DNS else "HTTPS" if flags & FLAG_HTTPS else "HTTP"
+            result[protocol] += n
+            result["IPv6" if flags & FLAG_IPV6 else "IPv4"] += n
+        return result
+
+    def timeline(self, resolution=60, since=None, until=None):
+        """Returns [(bucket_start, count)] using one binary search per bucket boundary."""
+        lo, hi = self._range(since, until)
+        if lo == hi:
+            return []
+        ts = self.columns["timestamps"]
+        result = []
+        while lo < hi:
+            bucket = int(ts[lo] // resolution) * resolution
+            nxt = bisect_left(ts, bucket + resolution, lo, hi)
+            result.append((bucket, nxt - lo))
+            lo = nxt
+        return result
@@ -0,0 +1,116 @@
+import os
+import shutil
+
+class HostsFile:
+    """
+    Byte-level editor for the IfNoAI section of a hosts file.
+
+    The marked block is located by offset, so the rest of the file (which may
+    carry tens of thousands of unrelated entries) is copied through as two
+    untouched slices instead of being split into lines. Changes to the block
+    are computed as a diff against the domains already present, nothing is
+    written when the diff is empty, and every write goes to a temporary file
+    that atomically replaces the original.
+    """
+
+    def __init__(self, path, marker_start, marker_end):
+        self.path = path
+        self.marker_start = marker_start.encode("utf-8")
+        self.marker_end = marker_end.encode("utf-8")
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def find_block(self, data):
+        """Returns (start, end) byte offsets of the marked block, or None."""
+        start = data.find(self.marker_start)
+        if start == -1:
+            return None
+        start = data.rfind(b"\n", 0, start) + 1 # Beginning of the marker line
+        end = data.find(self.marker_end, start)
+        if end == -1:
+            end = len(data) # Unterminated block: it runs to the end of the file
+        else:
+            nl = data.find(b"\n", end)
+            end = len(data) if nl == -1 else nl + 1
+        return start, end
+
+    def block_domains(self, data, span):
+        """Domains redirected inside the block, in file order."""
+        domains = {}
+        for line in data[span[0]:span[1]].splitlines():
+            parts = line.split()
+            if len(parts) == 2 and not line.startswith(b"#"):
+                domains[parts[1].decode("utf-8")] = None
+        return list(domains)
+
+    def render_entries(self, domains):
+        out = []
+        for domain in domains:
+            # Redirect to localhost to capture stats via Sinkhole
+            out.append(f"127.0.0.1 {domain}\n::1 {domain}\n")
+        return "".join(out).encode("utf-8")
+
+    def render_block(self, domains, header_lines=(), entries=None):
+        header = "".join(f"{line}\n" for line in header_lines).encode("utf-8")
+        if entries is None:
+            entries = self.render_entries(domains)
+        return self.marker_start + b"\n" + header + entries + self.marker_end + b"\n"
+
+    def apply(self, domains, header_lines=(), entries=None):
+        """
+        Make the block redirect exactly `domains`. Returns (added, removed).
+        `entries` may carry the pre-rendered lines for `domains` to skip rendering.
+        """
+        data = self.read()
+        span = self.find_block(data)
+        if span is None:
+            # Fresh block appended after the existing content
+            sep = b"" if not data or data.endswith(b"\n") else b"\n"
+            self._write(data + sep + self.render_block(domains, header_lines, entries))
+            return list(domains), []
+
+        current = self.block_domains(data, span)
+        wanted = set(domains)
+        present = set(current)
+        added = [d for d in domains if d not in present]
+        removed = [d for d in current if d not in wanted]
+        if not added and not removed:
+            return [], []
+
+        # Keep the existing lines (and their order), drop the removed domains
+        # and insert the new ones just before the end marker
+        removed_set = set(removed)
+        kept = []
+        for line in data[span[0]:span[1]].splitlines(keepends=True):
+            parts = line.split()
+            if line.startswith(self.marker_end):
+                continue
+            if len(parts) == 2 and not line.startswith(b"#") and parts[1].decode("utf-8") in removed_set:
+                continue
+            kept.append(line)
+        block = b"".join(kept) + self.render_entries(added) + self.marker_end + b"\n"
+        self._write(data[:span[0]] + block + data[span[1]:])
+        return added, removed
+
+    def remove(self):
+        """Cut the block out of the file. Returns False if there was none."""
+        data = self.read()
+        span = self.find_block(data)
+        if span is None:
+            return False
+        self._write(data[:span[0]] + data[span[1]:])
+        return True
+
+    def _write(self, data):
+        tmp_path = f"{self.path}.ifnoai.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            shutil.copymode(self.path, tmp_path)
+        except OSError:
+            pass
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,79 @@
+from collections import namedtuple
+
+Request = namedtuple("Request", ["method", "path", "host", "keep_alive"])
+
+class RequestParser:
+    """
+    Incremental HTTP/1.x request parser for the sinkhole.
+
+    Bytes are fed as they arrive; every complete request (headers plus any
+    Content-Length body, which is skipped) is returned once, so requests
+    pipelined in one read and requests split across reads are all seen.
+    Chunked bodies cannot be skipped without decoding them, so a chunked
+    request ends the connection after it is answered.
+    """
+
+    def __init__(self, max_header_size=65536):
+        self.max_header_size = max_header_size
+        self.buffer = bytearray()
+        self.body_remaining = 0
+        self.count = 0
+        self.closed = False # No further request can be framed on this connection
+        self.error = False
+
+    def feed(self, data):
+        """Returns the list of requests completed by `data`."""
+        if self.closed:
+            return []
+        self.buffer += data
+        requests = []
+        while True:
+            if self.body_remaining:
+                skip = min(self.body_remaining, len(self.buffer))
+                del self.buffer[:skip]
+                self.body_remaining -= skip
+                if self.body_remaining:
+                    break
+            end = self.buffer.find(b"\r\n\r\n")
+            if end == -1:
+                if len(self.buffer) > self.max_header_size:
+                    self.error = self.closed = True
+                break
+            request = self._parse(bytes(self.buffer[:end]))
+            if request is None:
+                # Leave the rejected head in the buffer so it is still attributed and answered
+                self.error = self.closed = True
+                break
+            del self.buffer[:end + 4]
+            self.count += 1
+            requests.append(request)
+            if not request.keep_alive:
+                self.closed = True
+                break
+        return requests
+
+    def _parse(self, head):
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            return None
+        method, target, version = parts
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = "keep-alive" in connection
+        else:
+            keep_alive = "close" not in connection
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            keep_alive = False
+        else:
+            try:
+                self.body_remaining = max(0, int(headers.get("content-length", 0)))
+            except ValueError:
+                return None
+        return Request(method, target.split("?", 1)[0], headers.get("host"), keep_alive)
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import zlib
+import threading
+from collections import namedtuple
+
+from core.paths import state_dir
+
+# What a journal says about an experiment that never recorded its end
+Experiment = namedtuple("Experiment", ["started_at", "ends_at", "block_checksum", "domains",
+                                       "endpoints", "checkpoint_at", "total"])
+
+class ExperimentJournal:
+    """
+    Crash-safe record of the running experiment.
+
+    One line per record, "<crc32> <json>", each fsync'd before it counts:
+
+        start       when it began, when it should end, checksum of the hosts block
+        block       the hosts block changed (e.g. ai_domains.json was re-synced)
+        checkpoint  cumulative counters of the sinkhole at a point in time
+        end         the experiment finished or was aborted
+
+    `begin` starts a fresh journal, so the start record is always the first
+    line, and checkpoints are cumulative, so only the last one matters:
+    recovery reads the first line and then scans backwards from the end
+    until it meets a checkpoint, never the whole file. The file is compacted
+    to start + block + latest checkpoint once it outgrows max_size. Torn or
+    corrupt lines fail their checksum and are skipped.
+    """
+
+    def __init__(self, path=None, max_size=256 * 1024):
+        self.path = str(path or state_dir() / "experiment.journal")
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._start = None
+        self._block = None
+        self._stop = None
+        self._thread = None
+
+    # Writing
+
+    def begin(self, started_at, ends_at=None, block_checksum=None):
+        """Start a new experiment, replacing any previous journal."""
+        self._start = {"t": "start", "started_at": started_at, "ends_at": ends_at,
+                       "block": block_checksum, "pid": os.getpid()}
+        self._block = None
+        with self._lock:
+            self._rewrite([self._start])
+
+    def block_changed(self, block_checksum):
+        self._block = {"t": "block", "block": block_checksum}
+        self._append(self._block)
+
+    def checkpoint(self, domains, endpoints=None, total=None):
+        # The current block checksum rides along, so recovery can stop at this record
+        current = self._block or self._start or {}
+        record = {"t": "checkpoint", "at": time.time(), "domains": dict(domains),
+                  "endpoints": dict(endpoints or {}), "block": current.get("block"),
+                  "total": sum(domains.values()) if total is None else total}
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size > self.max_size and self._start is not None:
+            with self._lock:
+                self._rewrite([r for r in (self._start, self._block) if r] + [record])
+        else:
+            self._append(record)
+
+    def end(self, reason="stopped"):
+        self.stop_checkpoints()
+        if os.path.exists(self.path):
+            self._append({"t": "end", "at": time.time(), "reason": reason})
+        self._start = self._block = None
+
+    def start_checkpoints(self, snapshot, interval=5.0):
+        """
+        Checkpoint `snapshot()` -> (domains, endpoints, total) every `interval` seconds
+        from a background thread, skipping intervals where nothing changed.
+        """
+        self.stop_checkpoints()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._checkpoint_loop, args=(snapshot, interval, self._stop),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop_checkpoints(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5.0)
+        self._thread = None
+        self._stop = None
+
+    def _checkpoint_loop(self, snapshot, interval, stop):
+        last = None
+        while True:
+            stopping = stop.wait(interval)
+            try:
+                domains, endpoints, total = snapshot()
+                state = (total, sum(endpoints.values()))
+                if state != last:
+                    self.checkpoint(domains, endpoints, total)
+                    last = state
+            except Exception as e:
+                print(f"Failed to checkpoint the experiment: {e}")
+            if stopping:
+                return
+
+    def _encode(self, record):
+        payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        return b"%08x " % zlib.crc32(payload) + payload + b"\n"
+
+    def _append(self, record):
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(self._encode(record))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _rewrite(self, records):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(self._encode(r) for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # Make the rename itself durable (not possible on Windows)
+        try:
+            fd = os.open(os.path.dirname(self.path), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    # Reading
+
+    def _decode(self, line):
+        try:
+            crc, payload = line.rstrip(b"\n").split(b" ", 1)
+            if int(crc, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def open_experiment(self):
+        """The experiment that was started but never ended, or None."""
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return None
+        with f:
+            start = self._decode(f.readline())
+            if not start or start.get("t") != "start":
+                return None
+            head_end = f.tell()
+            size = f.seek(0, os.SEEK_END)
+
+            block, checkpoint = start.get("block"), None
+            block_seen = False
+            # Walk backwards in growing chunks until a checkpoint (or the start) is reached
+            pos, chunk = size, 4096
+            tail = b""
+            while pos > head_end and checkpoint is None:
+                read_from = max(head_end, pos - chunk)
+                f.seek(read_from)
+                data = f.read(pos - read_from) + tail
+                lines = data.split(b"\n")
+                # The first piece may be the end of a line that started earlier
+                tail = lines.pop(0) if read_from > head_end else b""
+                for line in reversed(lines):
+                    record = self._decode(line) if line else None
+                    if record is None:
+                        continue
+                    kind = record.get("t")
+                    if kind == "end":
+                        return None
+                    if kind == "block" and not block_seen:
+                        block, block_seen = record.get("block"), True
+                    elif kind == "checkpoint":
+                        checkpoint = record
+                        break
+                pos = read_from
+                chunk *= 2
+
+        if not block_seen and checkpoint is not None:
+            block = checkpoint.get("block", block)
+        # Adopt it: compaction must carry these records over
+        self._start = start
+        self._block = {"t": "block", "block": block} if block != start.get("block") else None
+        return Experiment(start["started_at"], start.get("ends_at"), block,
+                          checkpoint["domains"] if checkpoint else {},
+                          checkpoint["endpoints"] if checkpoint else {},
+                          checkpoint["at"] if checkpoint else None,
+                          checkpoint.get("total") if checkpoint else None)
+
+def recover_experiment(blocker, journal):
+    """
+    Decide what to do with an experiment interrupted by a crash or kill.
+
+    Returns the Experiment to resume (remaining time and counters restored by
+    the caller), or None when there is nothing to resume: no open experiment,
+    the block was already removed, or the planned end passed while nothing
+    was running, in which case the block is rolled back here.
+    """
+    experiment = journal.open_experiment()
+    if experiment is None:
+        return None
+    if not blocker.status():
+        # Turned off from elsewhere (CLI, manual edit) while we were down
+        journal.end("aborted")
+        return None
+    if experiment.ends_at is not None and experiment.ends_at <= time.time():
+        print("The experiment ended while IfNoAI was not running, restoring connectivity.")
+        blocker.disable_block()
+        journal.end("expired")
+        return None
+    checksum = blocker.block_checksum()
+    if experiment.block_checksum and checksum != experiment.block_checksum:
+        # Half-written or edited by hand: bring the block back to the domain list
+        print("The IfNoAI hosts block changed while IfNoAI was not running, repairing it.")
+        blocker.sync_block()
+        journal.block_changed(blocker.block_checksum())
+    return experiment
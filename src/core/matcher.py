@@ -0,0 +1,128 @@
+import json
+import re
+from collections import namedtuple
+from fnmatch import translate
+
+Match = namedtuple("Match", ["rule", "category"])
+
+def is_pattern(rule):
+    """True for wildcard/suffix rules, which a hosts file cannot express."""
+    return "*" in rule or rule.startswith(".")
+
+class DomainMatcher:
+    """
+    Compiled domain rules answering "is this host blocked, and by which rule?".
+
+    Supported rules:
+        api.openai.com                       exact hostname
+        *.openai.azure.com                   any subdomain (at any depth), not the apex
+        .openai.com                          the apex and any subdomain
+        *-generativelanguage.googleapis.com  glob on the leftmost label only
+
+    Rules are indexed by their parent domain in hash tables, so a lookup is
+    one probe for the exact host, one for leftmost-label globs and then one
+    probe per label while walking the host's suffixes from longest to
+    shortest (the most specific wildcard wins): O(labels) regardless of how
+    many rules are loaded. Exact rules beat globs, which beat wildcards.
+    When several categories list the same rule, the first one added wins.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.suffixes = {}
+        self.globs = {}
+        self.rule_count = 0
+
+    def add(self, rule, category=None):
+        rule = rule.strip().lower().rstrip(".")
+        if not rule:
+            return
+        self.rule_count += 1
+        match = Match(rule, category)
+        if rule.startswith("*."):
+            self.suffixes.setdefault(rule[2:], match)
+        elif rule.startswith("."):
+            self.exact.setdefault(rule[1:], match)
+            self.suffixes.setdefault(rule[1:], match)
+        elif "*" in rule:
+            label, _, parent = rule.partition(".")
+            if "*" in parent:
+                raise ValueError(f"Wildcards are only supported in the leftmost label: {rule}")
+            pattern = re.compile(translate(label))
+            self.globs.setdefault(parent, []).append((pattern, match))
+        else:
+            self.exact.setdefault(rule, match)
+
+    def match(self, host):
+        """Returns a Match(rule, category) for a blocked host, or None."""
+        if not host:
+            return None
+        host = host.lower().rstrip(".")
+        # Strip a port from Host headers ("api.openai.com:443", "[::1]:80")
+        if ":" in host and not host.endswith("]"):
+            host = host.rsplit(":", 1)[0]
+
+        found = self.exact.get(host)
+        if found:
+            return found
+
+        dot = host.find(".")
+        if dot == -1:
+            return None
+        if self.globs:
+            candidates = self.globs.get(host[dot + 1:])
+            if candidates:
+                label = host[:dot]
+                for pattern, found in candidates:
+                    if pattern.match(label):
+                        return found
+
+        while dot != -1:
+            found = self.suffixes.get(host[dot + 1:])
+            if found:
+                return found
+            dot = host.find(".", dot + 1)
+        return None
+
+    def rules(self):
+        """Every distinct Match in the tables (a ".x" rule appears once)."""
+        seen = set()
+        for table in (self.exact.values(), self.suffixes.values(),
+                      (found for candidates in self.globs.values() for _, found in candidates)):
+            for found in table:
+                if found.rule not in seen:
+                    seen.add(found.rule)
+                    yield found
+
+    def __contains__(self, host):
+        return self.match(host) is not None
+
+    @classmethod
+    def from_categories(cls, categories, order=()):
+        """Build from {category: [rules]}; categories named in `order` take precedence."""
+        matcher = cls()
+        names = [c for c in order if c in categories]
+        names += [c for c in categories if c not in names]
+        for name in names:
+            for rule in categories[name]:
+                matcher.add(rule, name)
+        return matcher
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls.from_categories(load_categories(data),
+                                   data.get("metadata", {}).get("blocking_priority", ()))
+
+def load_categories(data):
+    """Normalise ai_domains.json categories into {category: [rules]}."""
+    categories = {}
+    for name, category in data.get("categories", {}).items():
+        # Handle new structure where category is an object with "domains" list
+        if isinstance(category, dict) and "domains" in category:
+            categories[name] = list(category["domains"])
+        # Handle old structure where category was just a list
+        elif isinstance(category, list):
+            categories[name] = list(category)
+    return categories
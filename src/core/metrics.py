@@ -0,0 +1,209 @@
+import sys
+import time
+import socket
+import struct
+import threading
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions."""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Returns [(upper_bound, cumulative_count)], ending with ("+Inf", count)."""
+        total = 0
+        buckets = []
+        for bound, count in zip(self.bounds + ("+Inf",), list(self.counts)):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+class SinkholeMetrics:
+    """
+    Hot-path measurements of a SinkholeServer. The event loop thread is the
+    only writer; scrapes read the plain counters without locking, so a
+    scrape may be off by the hits of the current loop iteration.
+
+    Only the process that owns the metrics is measured: with workers > 1,
+    per-domain counts include every worker but the protocol/family
+    counters, parse failures and histograms cover the main process.
+    """
+
+    def __init__(self):
+        self.hits = {} # (protocol, family) -> count
+        self.parse_failures = {} # (protocol, reason) -> count
+        self.accept_to_record = Histogram()
+        self.record_to_close = Histogram()
+
+    def recorded(self, conn):
+        """A hit was attributed on `conn`; returns the record timestamp."""
+        key = (conn.protocol, conn.family)
+        self.hits[key] = self.hits.get(key, 0) + 1
+        now = time.monotonic()
+        if conn.recorded is None:
+            self.accept_to_record.observe(now - conn.accepted)
+        return now
+
+    def closed(self, conn):
+        if conn.recorded is not None:
+            self.record_to_close.observe(time.monotonic() - conn.recorded)
+
+    def parse_failure(self, protocol, reason):
+        key = (protocol, reason)
+        self.parse_failures[key] = self.parse_failures.get(key, 0) + 1
+
+def accept_queue_depth(sock):
+    """
+    Connections waiting in a listening socket's accept queue, or None where
+    the kernel doesn't report it (Linux exposes it as tcpi_unacked).
+    """
+    if not sys.platform.startswith("linux") or not hasattr(socket, "TCP_INFO"):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+        # 8 single-byte fields, then rto, ato, snd_mss, rcv_mss, unacked
+        return struct.unpack_from("I", info, 24)[0]
+    except (OSError, struct.error):
+        return None
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def render(server, openmetrics=False):
+    """The text exposition of `server` (a SinkholeServer), Prometheus or OpenMetrics flavoured."""
+    lines = []
+
+    def family(name, kind, help_text):
+        # OpenMetrics names counter families without their _total suffix
+        if openmetrics and kind == "counter":
+            name = name[:-len("_total")]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    stats = server.get_stats()
+    # Only the bounded top-K set gets a series, so arbitrary Host/SNI values
+    # can't blow up the number of series
+    family("ifnoai_blocked_requests_total", "counter", "Blocked requests by destination domain (most blocked domains).")
+    for domain, count in sorted(server.top_domains(server.top_capacity)):
+        labels = {"domain": domain}
+        if server.matcher is not None:
+            labels["category"] = server.category_of(domain)
+        lines.append(f"ifnoai_blocked_requests_total{_labels(**labels)} {count}")
+    if "categories" in stats:
+        family("ifnoai_blocked_category_requests_total", "counter", "Blocked requests by ai_domains.json category.")
+        for category, count in sorted(stats["categories"].items()):
+            lines.append(f"ifnoai_blocked_category_requests_total{_labels(category=category)} {count}")
+
+    family("ifnoai_blocked_requests_all_total", "counter", "Blocked requests to any domain.")
+    lines.append(f"ifnoai_blocked_requests_all_total {stats['total_blocked']}")
+
+    metrics = server.metrics
+    family("ifnoai_hits_total", "counter", "Attributed hits by protocol and address family.")
+    for (protocol, address_family), count in sorted(metrics.hits.items()):
+        lines.append(f"ifnoai_hits_total{_labels(protocol=protocol, family=address_family)} {count}")
+    family("ifnoai_parse_failures_total", "counter", "Connections whose destination could not be parsed.")
+    for (protocol, reason), count in sorted(metrics.parse_failures.items()):
+        lines.append(f"ifnoai_parse_failures_total{_labels(protocol=protocol, reason=reason)} {count}")
+
+    family("ifnoai_active_connections", "gauge", "Client connections held by the sinkhole.")
+    lines.append(f'ifnoai_active_connections{{state="reading"}} {len(server.connections)}')
+    lines.append(f'ifnoai_active_connections{{state="idle"}} {len(server.idle)}')
+    depths = []
+    for sock in list(server.listeners):
+        depth = accept_queue_depth(sock)
+        if depth is not None:
+            try:
+                address, port = sock.getsockname()[:2]
+            except OSError:
+                continue
+            depths.append((address, port, depth))
+    if depths:
+        family("ifnoai_accept_queue_depth", "gauge", "Connections waiting to be accepted, per listener.")
+        for address, port, depth in depths:
+            lines.append(f"ifnoai_accept_queue_depth{_labels(address=address, port=port)} {depth}")
+
+    for name, histogram, help_text in (
+            ("ifnoai_accept_to_record_seconds", metrics.accept_to_record,
+             "Time from accepting a connection to attributing its first hit."),
+            ("ifnoai_record_to_close_seconds", metrics.record_to_close,
+             "Time from attributing a hit to closing its connection.")):
+        family(name, "histogram", help_text)
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(le=bound)} {count}")
+        lines.append(f"{name}_sum {histogram.sum}")
+        lines.append(f"{name}_count {histogram.count}")
+
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        try:
+            body = render(self.server.sinkhole, openmetrics).encode("utf-8")
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would flood the console
+
+class MetricsExporter:
+    """Serves GET /metrics for a SinkholeServer on a loopback port, from its own thread."""
+
+    def __init__(self, sinkhole, port=9464, address="127.0.0.1"):
+        self.sinkhole = sinkhole
+        self.port = port
+        self.address = address
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        """Raises OSError if the port cannot be bound."""
+        self.httpd = ThreadingHTTPServer((self.address, self.port), _MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.sinkhole = self.sinkhole
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Metrics exporter listening on http://{self.address}:{self.port}/metrics")
+
+    def stop(self):
+        if self.httpd is None:
+            return
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.httpd = None
+        self.thread = None
@@ -0,0 +1,64 @@
+import os
+import sys
+
+def _state_path():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+    else:
+        base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "IfNoAI")
+
+def state_path():
+    """state_dir() as a plain string, for startup paths that avoid importing pathlib."""
+    path = _state_path()
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def state_dir():
+    """Per-user directory for IfNoAI's logs, caches and experiment state."""
+    from pathlib import Path
+    return Path(state_path())
+
+def _system_runtime_path():
+    # Shared by every user; root-owned, so only a root process creates it
+    if sys.platform == "win32":
+        return None
+    return "/run/ifnoai" if os.path.isdir("/run") else "/var/run/ifnoai"
+
+def runtime_path():
+    """
+    Where this process publishes the daemon's control socket and the status
+    marker: a system-wide directory when running as root (hosts edits and
+    port 443 need it), so unprivileged clients such as `main.py status` see
+    them; the per-user state directory otherwise.
+    """
+    system = _system_runtime_path()
+    if system and os.geteuid() == 0:
+        try:
+            os.makedirs(system, mode=0o755, exist_ok=True)
+            return system
+        except OSError:
+            pass
+    return state_path()
+
+def runtime_paths():
+    """Directories clients look in for the socket and marker, system-wide first (never created)."""
+    system = _system_runtime_path()
+    return [system, _state_path()] if system else [_state_path()]
+
+_CONTROL_NAME = "daemon.json" if sys.platform == "win32" else "daemon.sock"
+
+def control_path():
+    """
+    Where a daemon started by this process listens: its Unix socket, or on
+    Windows the file holding its loopback port and token.
+    """
+    return os.path.join(runtime_path(), _CONTROL_NAME)
+
+def find_control_path():
+    """Where a running daemon (root's first, then this user's) can be reached, or None."""
+    for directory in runtime_paths():
+        path = os.path.join(directory, _CONTROL_NAME)
+        if os.path.exists(path):
+            return path
+    return None
@@ -0,0 +1,119 @@
+import shutil
+import subprocess
+
+class PortRedirect:
+    """
+    Redirects loopback traffic for privileged ports (80/443) to the high ports
+    the sinkhole actually listens on, so it can run without binding below 1024.
+    Only local traffic to 127.0.0.1/::1 (where the hosts file sends blocked
+    domains) is touched. Installing the rules needs root; the sinkhole doesn't.
+    """
+    name = "none"
+
+    def __init__(self):
+        self.installed = {}
+
+    def install(self, mapping):
+        """Redirect each {listen_port: target_port}. Returns False if a command failed."""
+        if self.installed:
+            self.remove()
+        ok = self._run(self.install_commands(mapping))
+        self.installed = dict(mapping)
+        return ok
+
+    def remove(self):
+        if not self.installed:
+            return True
+        ok = self._run(self.remove_commands(self.installed))
+        self.installed = {}
+        return ok
+
+    def install_commands(self, mapping):
+        return []
+
+    def remove_commands(self, mapping):
+        return []
+
+    def _run(self, commands):
+        ok = True
+        for cmd, stdin in commands:
+            try:
+                subprocess.run(cmd, input=stdin, check=True, text=True,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            except Exception as e:
+                detail = getattr(e, "stderr", None) or e
+                print(f"Failed to run {' '.join(cmd)}: {detail}")
+                ok = False
+        return ok
+
+class NftablesRedirect(PortRedirect):
+    """Rules live in a dedicated `inet ifnoai` table, removed in one command."""
+    name = "nftables"
+    table = "ifnoai"
+
+    def install_commands(self, mapping):
+        rules = []
+        for port, target in sorted(mapping.items()):
+            rules.append(f"    ip daddr 127.0.0.1 tcp dport {port} redirect to :{target}")
+            rules.append(f"    ip6 daddr ::1 tcp dport {port} redirect to :{target}")
+        # Declaring then deleting the table first makes the script idempotent
+        script = (f"table inet {self.table}\n"
+                  f"delete table inet {self.table}\n"
+                  f"table inet {self.table} {{\n"
+                  f"  chain output {{\n"
+                  f"    type nat hook output priority -100;\n"
+                  + "\n".join(rules) + "\n"
+                  f"  }}\n"
+                  f"}}\n")
+        return [(["nft", "-f", "-"], script)]
+
+    def remove_commands(self, mapping):
+        return [(["nft", "delete", "table", "inet", self.table], None)]
+
+class IptablesRedirect(PortRedirect):
+    """One tagged nat OUTPUT rule per port and address family."""
+    name = "iptables"
+
+    def _rules(self, action, mapping):
+        commands = []
+        for port, target in sorted(mapping.items()):
+            for tool, address in (("iptables", "127.0.0.1"), ("ip6tables", "::1")):
+                commands.append(([tool, "-t", "nat", action, "OUTPUT", "-p", "tcp", "-d", address,
+                                  "--dport", str(port), "-m", "comment", "--comment", "ifnoai",
+                                  "-j", "REDIRECT", "--to-ports", str(target)], None))
+        return commands
+
+    def install_commands(self, mapping):
+        return self._rules("-A", mapping)
+
+    def remove_commands(self, mapping):
+        return self._rules("-D", mapping)
+
+class FakeRedirect(PortRedirect):
+    """Records the commands it would run instead of running them (tests, benchmarks)."""
+    name = "fake"
+
+    def __init__(self, backend=None):
+        super().__init__()
+        self.backend = backend or NftablesRedirect()
+        self.commands = []
+
+    def install_commands(self, mapping):
+        return self.backend.install_commands(mapping)
+
+    def remove_commands(self, mapping):
+        return self.backend.remove_commands(mapping)
+
+    def _run(self, commands):
+        self.commands.extend(commands)
+        return True
+
+def get_redirect(kind="auto"):
+    """Picks "nftables" or "iptables" ("auto": whichever is installed), or "fake"."""
+    if kind == "fake":
+        return FakeRedirect()
+    if kind in ("auto", "nftables") and shutil.which("nft"):
+        return NftablesRedirect()
+    if kind in ("auto", "iptables") and shutil.which("iptables"):
+        return IptablesRedirect()
+    return None
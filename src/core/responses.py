@@ -0,0 +1,89 @@
+import json
+from http import HTTPStatus
+
+MESSAGE = "This request was blocked by IfNoAI: the AI blackout experiment is active."
+
+# Errors shaped like each provider's own "unavailable" answer, so SDKs surface
+# a readable message instead of failing to parse the response:
+# provider -> (status, reason, body)
+PROVIDER_ERRORS = {
+    "openai": (503, "Service Unavailable",
+               {"error": {"message": MESSAGE, "type": "server_error",
+                          "param": None, "code": "service_unavailable"}}),
+    "anthropic": (529, "Overloaded",
+                  {"type": "error", "error": {"type": "overloaded_error", "message": MESSAGE}}),
+    "google": (503, "Service Unavailable",
+               {"error": {"code": 503, "message": MESSAGE, "status": "UNAVAILABLE"}}),
+}
+
+# The OpenAI and Anthropic SDKs skip their retry loop when the server sends
+# x-should-retry: false; Retry-After keeps the other clients away for a while
+NO_RETRY_HEADERS = [("x-should-retry", "false")]
+
+# Host suffix -> provider; anything else gets the OpenAI shape, which most
+# third-party APIs and SDKs imitate
+PROVIDER_SUFFIXES = [
+    ("anthropic.com", "anthropic"),
+    ("claude.ai", "anthropic"),
+    ("googleapis.com", "google"),
+    ("gemini.google.com", "google"),
+]
+
+def provider_for(host):
+    host = (host or "").lower().rstrip(".").lstrip("*.")
+    for suffix, provider in PROVIDER_SUFFIXES:
+        if host == suffix or host.endswith("." + suffix):
+            return provider
+    return "openai"
+
+def json_response(status, body, reason="Forbidden", headers=(), keep_alive=False):
+    """Render a complete HTTP/1.1 response carrying `body` as JSON."""
+    payload = json.dumps(body).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {reason}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(payload)}",
+            "Connection: keep-alive" if keep_alive else "Connection: close"]
+    head.extend(f"{name}: {value}" for name, value in headers)
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload
+
+class ResponseTable:
+    """
+    Byte-ready error responses for blocked API calls.
+
+    Every provider's response is rendered once, up front, and each rule of
+    the matcher (hence each domain and category of ai_domains.json) is mapped
+    to one of them, so answering a connection is a dict lookup followed by a
+    single sendall of a cached buffer. Each response exists in a
+    Connection: close and a keep-alive flavour. `status` and `body` override
+    the provider defaults for every response.
+    """
+
+    def __init__(self, matcher=None, status=None, body=None, retry_after=3600, cache_size=4096):
+        self.matcher = matcher
+        self.cache_size = cache_size
+        headers = NO_RETRY_HEADERS + [("Retry-After", str(retry_after))]
+        self.responses = {}
+        for provider, (default_status, reason, default_body) in PROVIDER_ERRORS.items():
+            if status is not None:
+                default_status, reason = status, HTTPStatus(status).phrase
+            self.responses[provider] = tuple(
+                json_response(default_status, body or default_body, reason, headers, keep_alive)
+                for keep_alive in (False, True))
+        self.by_rule = {}
+        if matcher is not None:
+            for match in matcher.rules():
+                self.by_rule[match.rule] = self.responses[provider_for(match.rule)]
+        self._cache = {}
+
+    def lookup(self, host, keep_alive=False):
+        """The response for a request to `host`."""
+        response = self._cache.get(host)
+        if response is not None:
+            return response[keep_alive]
+        found = self.matcher.match(host) if self.matcher is not None and host else None
+        response = self.by_rule.get(found.rule) if found else None
+        if response is None:
+            response = self.responses[provider_for(host)]
+        if len(self._cache) < self.cache_size:
+            self._cache[host] = response
+        return response[keep_alive]
@@ -0,0 +1,164 @@
+import time
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+class Deadline:
+    """
+    Calls `callback()` once, from a background thread, when a wall-clock
+    deadline (a time.time() timestamp) is reached.
+
+    A plain timer sleeps on the monotonic clock, which stops while the
+    machine is suspended, so a 4 hour experiment started before a night of
+    sleep would end 4 hours after waking up. The thread here sleeps in slices
+    of at most `max_sleep` seconds and compares both clocks after each one:
+    the deadline fires when the wall clock reaches it (suspend, hibernate) or
+    when the monotonic time it was set for has elapsed (the wall clock was
+    turned back), whichever comes first. After a resume it fires within
+    `max_sleep` seconds. `on_suspend(seconds)` is told about detected gaps.
+    """
+
+    def __init__(self, when, callback, max_sleep=10.0, on_suspend=None):
+        self.when = when
+        self.callback = callback
+        self.max_sleep = max_sleep
+        self.on_suspend = on_suspend
+        self._monotonic_when = time.monotonic() + (when - time.time())
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def remaining(self):
+        """Seconds left by the wall clock (never negative)."""
+        return max(0.0, self.when - time.time())
+
+    def _run(self):
+        while True:
+            wall, mono = time.time(), time.monotonic()
+            left = min(self.when - wall, self._monotonic_when - mono)
+            if left <= 0:
+                break
+            if self._cancelled.wait(min(left, self.max_sleep)):
+                return
+            # More wall time than monotonic time passed: the machine was asleep
+            gap = (time.time() - wall) - (time.monotonic() - mono)
+            if gap > 1.0 and self.on_suspend is not None:
+                self.on_suspend(gap)
+        if not self._cancelled.is_set():
+            self.callback()
+
+class BlackoutWindow(namedtuple("BlackoutWindow", ["days", "start", "end"])):
+    """
+    A recurring blackout, e.g. weekdays 09:00-12:00: `days` are weekday
+    numbers (Monday = 0), `start`/`end` are minutes after local midnight.
+    A window whose end is before its start runs past midnight.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, text):
+        """Parses "mon-fri 09:00-12:00", "sat,sun 22:00-02:00" or "daily 13:00-14:00"."""
+        try:
+            days_text, hours_text = text.strip().lower().split()
+            if days_text in ("daily", "*"):
+                days = set(range(7))
+            else:
+                days = set()
+                for part in days_text.split(","):
+                    first, _, last = part.partition("-")
+                    a, b = DAYS.index(first[:3]), DAYS.index((last or first)[:3])
+                    days.update(range(a, b + 1) if a <= b else list(range(a, 7)) + list(range(0, b + 1)))
+            start, end = (_minutes(t) for t in hours_text.split("-"))
+        except ValueError:
+            raise ValueError(f"Invalid blackout window: {text!r} (expected e.g. 'mon-fri 09:00-12:00')")
+        if start == end:
+            raise ValueError(f"Empty blackout window: {text!r}")
+        return cls(frozenset(days), start, end)
+
+    def occurrence(self, now):
+        """The (start, end) datetimes of the occurrence in progress at `now` or the next one."""
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        length = (self.end - self.start) % (24 * 60)
+        # Yesterday's occurrence may still be running past midnight
+        for offset in range(-1, 8):
+            day = midnight + timedelta(days=offset)
+            if day.weekday() not in self.days:
+                continue
+            start = day + timedelta(minutes=self.start)
+            end = start + timedelta(minutes=length)
+            if end > now:
+                return start, end
+        return None
+
+def _minutes(text):
+    hours, _, minutes = text.partition(":")
+    hours, minutes = int(hours), int(minutes or 0)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(text)
+    return hours * 60 + minutes
+
+class WindowScheduler:
+    """
+    Starts an experiment at the beginning of each recurring BlackoutWindow.
+
+    `on_start(ends_at)` is called (from a background thread) when a window
+    opens, or right away if one is already open, with the wall-clock time the
+    window closes; ending the experiment is left to the caller's own deadline.
+    """
+
+    def __init__(self, windows, on_start, max_sleep=10.0):
+        self.windows = list(windows)
+        self.on_start = on_start
+        self.max_sleep = max_sleep
+        self._deadline = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        with self._lock:
+            self._running = True
+        self._arm()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            if self._deadline is not None:
+                self._deadline.cancel()
+                self._deadline = None
+
+    def next_occurrence(self, now=None):
+        """The earliest (start, end) across all windows, or None."""
+        now = now or datetime.now()
+        occurrences = [o for o in (w.occurrence(now) for w in self.windows) if o]
+        return min(occurrences) if occurrences else None
+
+    def _arm(self):
+        occurrence = self.next_occurrence()
+        if occurrence is None:
+            return
+        start, end = occurrence
+        with self._lock:
+            if not self._running:
+                return
+            self._deadline = Deadline(start.timestamp(), lambda: self._fire(end), self.max_sleep).start()
+
+    def _fire(self, end):
+        # Overslept the whole window (e.g. suspended through it): skip it
+        if end.timestamp() > time.time():
+            try:
+                self.on_start(end.timestamp())
+            except Exception as e:
+                print(f"Failed to start scheduled blackout: {e}")
+        # Wait for this occurrence to pass before looking for the next one
+        with self._lock:
+            if not self._running:
+                return
+            self._deadline = Deadline(end.timestamp(), self._arm, self.max_sleep).start()
@@ -1,180 +1,760 @@
+import sys
+import errno
 import socket
+import ssl
+import selectors
 import threading
-import struct
+import multiprocessing
+import queue
 import time
+from collections import deque, namedtuple
 from datetime import datetime
 
-class SinkholeServer:
+from types import MappingProxyType
+
+from core.stats import ShardedCounter, ShardedHeavyHitters, RecentHits
+from core.tls import ClientHelloParser, NEED_MORE, DONE, ALERTS, alert_record
+from core.responses import ResponseTable
+from core.http import RequestParser
+
+# "close": bare 403 over HTTP, HTTPS connections are dropped after the ClientHello
+_LEGACY_HTTP_RESPONSE = b"HTTP/1.1 403 Forbidden\r\nContent-Type: text/plain\r\n\r\nAccess Denied by IfNoAI Protocol."
+
+# Longest request path kept as an endpoint key
+_MAX_PATH = 256
+
+def _request_path(request):
+    """The path of an HTTP request line, without its query string (truncated to _MAX_PATH)."""
+    line = bytes(request[:request.find(b"\r\n")]).decode("latin-1", errors="replace")
+    parts = line.split(" ")
+    if len(parts) < 2:
+        return "/"
+    return (parts[1].split("?", 1)[0] or "/")[:_MAX_PATH]
+
+# A listener that could not be started; reason is "permission", "in_use",
+# "unavailable" (e.g. no IPv6) or "error"
+BindFailure = namedtuple("BindFailure", ["address", "port", "protocol", "reason", "message"])
+
+_BIND_REASONS = {
+    errno.EACCES: "permission",
+    errno.EPERM: "permission",
+    errno.EADDRINUSE: "in_use",
+    errno.EADDRNOTAVAIL: "unavailable",
+    errno.EAFNOSUPPORT: "unavailable",
+}
+
+# Standard port of each protocol, used when redirecting to the listen ports
+_STANDARD_PORTS = {"HTTP": 80, "HTTPS": 443}
+
+# Stand-in domains for connections whose destination could not be parsed
+_UNATTRIBUTED = {"HTTPS": "Encrypted AI Service", "HTTP": "Unencrypted AI Service"}
+
+def parse_ports(text):
+    """Parse "HTTP=18080,HTTPS=18443" (or "18080:HTTP,...") into {port: protocol}."""
+    ports = {}
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        left, sep, right = part.replace(":", "=").partition("=")
+        protocol, port = (left, right) if not left.isdigit() else (right, left)
+        protocol = protocol.strip().upper()
+        if not sep or protocol not in _STANDARD_PORTS or not port.strip().isdigit():
+            raise ValueError(f"Invalid port spec: {part}")
+        ports[int(port)] = protocol
+    return ports
+
+class _TLSSession:
+    """Server side of a terminated TLS connection, driven through memory BIOs."""
+    __slots__ = ("incoming", "outgoing", "obj", "host", "established", "request")
+
+    def __init__(self, context, host):
+        self.incoming = ssl.MemoryBIO()
+        self.outgoing = ssl.MemoryBIO()
+        self.obj = context.wrap_bio(self.incoming, self.outgoing, server_side=True)
+        self.host = host
+        self.established = False
+        self.request = bytearray()
+
+class _Connection:
+    """Per-socket state for a captured client while it sits in the event loop."""
+    __slots__ = ("sock", "protocol", "family", "port", "buffer", "deadline", "hello", "tls", "http",
+                 "accepted", "recorded", "outgoing")
+
+    def __init__(self, sock, protocol, family, port, deadline, keep_alive=False, accepted=0.0):
+        self.sock = sock
+        self.protocol = protocol
+        self.family = family
+        self.port = port
+        self.buffer = b""
+        self.deadline = deadline
+        # Monotonic accept time and first-hit time, for the latency histograms
+        self.accepted = accepted
+        self.recorded = None
+        # HTTPS clients get an incremental parser so split ClientHellos reassemble
+        self.hello = ClientHelloParser() if protocol == "HTTPS" else None
+        self.tls = None
+        # HTTP clients get a request parser when keep-alive/pipelining is served
+        self.http = RequestParser() if keep_alive and protocol == "HTTP" else None
+        # Responses the socket could not take yet; reading pauses until they are written
+        self.outgoing = None
+
+class _EventBuffer:
+    """Stands in for an EventLog inside worker processes; hits are shipped to the parent."""
+
     def __init__(self):
+        self.pending = deque()
+
+    def record(self, *event):
+        self.pending.append(event)
+
+    def drain(self):
+        events = []
+        while self.pending:
+            events.append(self.pending.popleft())
+        return events
+
+def _worker_main(worker_id, options, stats_queue, stop_event, interval):
+    """Entry point of an extra SO_REUSEPORT worker process."""
+    server = SinkholeServer(**options)
+    server._reuse_port = True
+    server._is_worker = True # Shares the parent's ports, never spawns workers of its own
+    server.event_log = _EventBuffer()
+    server.start()
+    try:
+        while not stop_event.wait(interval):
+            stats_queue.put((worker_id, server.heavy_hitters.summary(), server.endpoints.summary(),
+                             dict(server.categories.snapshot()["domains"]), server.event_log.drain()))
+    finally:
+        server.stop()
+        stats_queue.put((worker_id, server.heavy_hitters.summary(), server.endpoints.summary(),
+                         dict(server.categories.snapshot()["domains"]), server.event_log.drain()))
+
+class SinkholeServer:
+    def __init__(self, ports=None, max_connections=1024, read_timeout=1.0,
+                 backlog=socket.SOMAXCONN, accept_batch=64, workers=1, event_log=None,
+                 matcher=None, top_capacity=256, recent_capacity=1024, reject_mode="fast",
+                 tls_alert="handshake_failure", retry_after=3600, terminate_tls=False,
+                 prewarm=(), error_status=None, error_body=None, keepalive_timeout=5.0,
+                 addresses=("127.0.0.1", "::1"), redirect=None, metrics_port=None,
+                 dns_listen=None, dns_upstream=("1.1.1.1", 53)):
         self.running = False
-        self.stats = {
-            "total_blocked": 0,
-            "domains": {}
-        }
-        self.lock = threading.Lock()
-        self.threads = []
+        # Per-domain counts are a bounded top-K summary with per-thread shards:
+        # recording a hit takes no lock, and arbitrary hostnames can't grow
+        # memory (or metric series) without bound. The total stays exact.
+        self.top_capacity = top_capacity
+        self.heavy_hitters = ShardedHeavyHitters(top_capacity)
+        # Exact hits per ai_domains.json category (only filled with a matcher)
+        self.categories = ShardedCounter()
+        # Ring of the latest hits for the live feed
+        self.recent = RecentHits(recent_capacity)
+        # Optional core.eventlog.EventLog receiving every hit
+        self.event_log = event_log
+        # Optional core.matcher.DomainMatcher attributing hosts to categories
+        self.matcher = matcher
+        self._category_cache = {}
+        # Change notifications: subscribers are called at most once per notify_interval
+        self.notify_interval = 0.25
+        self._subscribers = []
+        self._notify_pending = False
+        # One long-lived thread delivers them, started by the first subscribe()
+        self._notify_wakeup = threading.Event()
+        self._notifier = None
+        # port -> protocol; every port is served on each listen address
+        self.ports = ports or {80: "HTTP", 443: "HTTPS"}
+        self.addresses = list(addresses)
+        # Optional core.redirect.PortRedirect sending loopback traffic for 80/443
+        # to the (unprivileged) ports above while the sinkhole runs
+        self.redirect = redirect
+        self.bind_failures = []
+        # Optional loopback Prometheus/OpenMetrics endpoint (core.metrics); when
+        # it is off, the hot path pays one `is None` check per hit
+        self.metrics_port = metrics_port
+        self.metrics = None
+        self.exporter = None
+        if metrics_port:
+            from core.metrics import SinkholeMetrics
+            self.metrics = SinkholeMetrics()
+        # Optional local resolver (core.dns) on dns_listen, e.g. ("127.0.0.1", 53):
+        # blocked names resolve to this sinkhole and count as DNS hits, the rest
+        # are forwarded to dns_upstream
+        self.dns_listen = dns_listen
+        self.dns_upstream = dns_upstream
+        self.resolver = None
+        # "fast" answers HTTPS with a fatal TLS alert right after the ClientHello
+        # and HTTP with a provider-shaped error telling SDKs not to retry, so
+        # clients fail at once instead of treating a dropped connection as transient
+        if reject_mode not in ("fast", "close"):
+            raise ValueError(f"Unknown reject mode: {reject_mode}")
+        self.reject_mode = reject_mode
+        self.tls_alert = tls_alert
+        self.retry_after = retry_after
+        self.tls_response = alert_record(ALERTS[tls_alert]) if reject_mode == "fast" else None
+        # Opt-in TLS termination with certificates from a local CA (core.certs),
+        # so the HTTP path of blocked HTTPS calls can be recorded
+        self.terminate_tls = terminate_tls
+        self.prewarm = list(prewarm)
+        self.ca = None
+        # host/path of terminated requests; the path is client-chosen, so this is
+        # a bounded top-K summary like heavy_hitters
+        self.endpoints = ShardedHeavyHitters(top_capacity)
+        self._worker_endpoints = {}
+        self._worker_categories = {}
+        # HTTP and terminated HTTPS requests get a prebuilt error shaped like the
+        # provider's own, unless error_status/error_body override it
+        self.error_status = error_status
+        self.error_body = error_body
+        self.responses = ResponseTable(matcher, error_status, error_body, retry_after)
+        self.max_connections = max_connections
+        self.read_timeout = read_timeout
+        # In "fast" mode HTTP connections stay open between requests (pipelined
+        # ones included) and are closed after keepalive_timeout of silence
+        self.keepalive_timeout = keepalive_timeout
+        # A deep accept queue lets retry storms wait in the kernel instead of
+        # having their SYNs dropped, and each wakeup drains up to accept_batch
+        self.backlog = backlog
+        self.accept_batch = accept_batch
+        self.workers = workers
+        self._reuse_port = False
+        self._is_worker = False
+        self._processes = []
+        self._worker_stats = {}
+        self._stats_queue = None
+        self._stop_event = None
+        self.selector = None
+        self.listeners = []
+        self.connections = {}
+        # Keep-alive connections waiting for their next request; like
+        # self.connections, ordered by deadline because the timeout is fixed
+        self.idle = {}
+        self.thread = None
+        self._wakeup_r = None
+        self._wakeup_w = None
 
     def start(self):
+        """Returns True once listening; failed binds are listed in bind_failures."""
         if self.running:
-            return
+            return True
+
+        if self.workers > 1:
+            if hasattr(socket, "SO_REUSEPORT") and sys.platform.startswith("linux"):
+                self._reuse_port = True
+            else:
+                print("SO_REUSEPORT not supported on this platform, running a single worker.")
+
+        if self.terminate_tls and self.ca is None:
+            try:
+                from core.certs import CertificateAuthority
+                self.ca = CertificateAuthority()
+                self.ca.prewarm(self.prewarm)
+            except Exception as e:
+                print(f"Error: {e}")
+                print("TLS termination disabled, HTTPS clients get a TLS alert instead.")
+
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+        # Start a listener for every port on every address (IPv4 and IPv6 loopback by default)
+        self.bind_failures = []
+        for port, protocol in self.ports.items():
+            for address in self.addresses:
+                self.start_listener(address, port, protocol)
+
+        if not self.listeners:
+            self._close_all()
+            return False
+
+        if self.redirect is not None:
+            mapping = {_STANDARD_PORTS[protocol]: port for port, protocol in self.ports.items()
+                       if protocol in _STANDARD_PORTS and _STANDARD_PORTS[protocol] != port}
+            if mapping and not self.redirect.install(mapping):
+                self.bind_failures.append(BindFailure(None, None, None, "redirect",
+                                                      f"Could not install {self.redirect.name} redirect rules"))
+
+        if self.metrics_port and self.exporter is None:
+            from core.metrics import MetricsExporter
+            exporter = MetricsExporter(self, self.metrics_port)
+            try:
+                exporter.start()
+                self.exporter = exporter
+            except OSError as e:
+                reason = _BIND_REASONS.get(e.errno, "error")
+                self.bind_failures.append(BindFailure("127.0.0.1", self.metrics_port, "METRICS", reason, str(e)))
+
+        if self.dns_listen and self.resolver is None:
+            from core.dns import DNSSinkhole
+            resolver = DNSSinkhole(self.matcher, upstream=self.dns_upstream, listen=self.dns_listen, sinkhole=self)
+            if resolver.start():
+                self.resolver = resolver
+            else:
+                error = resolver.bind_error
+                reason = _BIND_REASONS.get(getattr(error, "errno", None), "error")
+                self.bind_failures.append(BindFailure(self.dns_listen[0], self.dns_listen[1], "DNS", reason, str(error)))
+
+        # A single thread multiplexes every listener and client socket
+        if self._reuse_port and not self._is_worker:
+            self._start_workers()
+
         self.running = True
-        
-        # Start listeners for HTTP (80) and HTTPS (443) on both IPv4 and IPv6
-        for port in [80, 443]:
-            self.start_listener(port, "HTTP" if port == 80 else "HTTPS", socket.AF_INET)
-            self.start_listener(port, "HTTP" if port == 80 else "HTTPS", socket.AF_INET6)
+        self.thread = threading.Thread(target=self._event_loop, daemon=True)
+        self.thread.start()
+        return True
 
-    def stop(self):
-        self.running = False
-        # Connect to self to unblock accept() calls
-        for port in [80, 443]:
+    def _start_workers(self):
+        # spawn rather than fork: the GUI process has Qt threads running
+        ctx = multiprocessing.get_context("spawn")
+        self._stats_queue = ctx.Queue()
+        self._stop_event = ctx.Event()
+        options = {
+            "ports": self.ports,
+            "addresses": self.addresses,
+            "max_connections": self.max_connections,
+            "read_timeout": self.read_timeout,
+            "backlog": self.backlog,
+            "accept_batch": self.accept_batch,
+            "reject_mode": self.reject_mode,
+            "tls_alert": self.tls_alert,
+            "retry_after": self.retry_after,
+            "keepalive_timeout": self.keepalive_timeout,
+            "terminate_tls": self.ca is not None,
+            "prewarm": self.prewarm,
+            "error_status": self.error_status,
+            "error_body": self.error_body,
+            "top_capacity": self.top_capacity,
+            # Workers count categories themselves, so they stay exact
+            "matcher": self.matcher,
+        }
+        for worker_id in range(1, self.workers):
+            p = ctx.Process(target=_worker_main,
+                            args=(worker_id, options, self._stats_queue, self._stop_event, 0.5),
+                            daemon=True)
+            p.start()
+            self._processes.append(p)
+
+    def _stop_workers(self):
+        if not self._processes:
+            return
+        self._stop_event.set()
+        for p in self._processes:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        self._collect_worker_stats()
+        # Fold the retired workers' counters into our own so totals survive restarts
+        for summary in self._worker_stats.values():
+            self.heavy_hitters.absorb(summary)
+        for worker_categories in self._worker_categories.values():
+            self.categories.update(worker_categories)
+        for summary in self._worker_endpoints.values():
+            self.endpoints.absorb(summary)
+        self._worker_stats = {}
+        self._worker_endpoints = {}
+        self._worker_categories = {}
+        self._processes = []
+        self._stats_queue.close()
+        self._stats_queue = None
+        self._stop_event = None
+
+    def _collect_worker_stats(self):
+        # Each worker reports cumulative counters, so only the latest one matters.
+        # Only the event loop (or stop(), once it has exited) drains the queue,
+        # so recent/event_log get the workers' hits from a single thread, and
+        # readers on other threads only ever see whole, replaced dicts.
+        if self._stats_queue is None:
+            return
+        worker_stats = worker_endpoints = worker_categories = None
+        while True:
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.settimeout(0.1) # Short timeout to avoid hanging
-                    s.connect(('127.0.0.1', port))
-            except:
-                pass
+                worker_id, summary, endpoints, categories, events = self._stats_queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            if worker_stats is None:
+                worker_stats = dict(self._worker_stats)
+                worker_endpoints = dict(self._worker_endpoints)
+                worker_categories = dict(self._worker_categories)
+            worker_stats[worker_id] = summary
+            worker_endpoints[worker_id] = endpoints
+            worker_categories[worker_id] = categories
+            self._schedule_notify()
+            for event in events:
+                self.recent.add(event[0], event[1], event[2])
+                if self.event_log is not None:
+                    self.event_log.record(*event)
+        if worker_stats is not None:
+            self._worker_stats = worker_stats
+            self._worker_endpoints = worker_endpoints
+            self._worker_categories = worker_categories
+
+    def stop(self):
+        # Tear everything down even when the event loop already died on its
+        # own (running is False then), or the redirect rules, workers and
+        # exporter would outlive it
+        if self.running:
+            self.running = False
+            # Wake the selector so the loop notices the shutdown immediately
             try:
-                with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as s:
-                    s.settimeout(0.1) # Short timeout to avoid hanging
-                    s.connect(('::1', port))
-            except:
+                self._wakeup_w.send(b"\0")
+            except (OSError, AttributeError):
                 pass
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+        self.thread = None
+        self._stop_workers()
+        if self.redirect is not None:
+            self.redirect.remove()
+        if self.exporter is not None:
+            self.exporter.stop()
+            self.exporter = None
+        if self.resolver is not None:
+            self.resolver.stop()
+            self.resolver = None
 
-    def start_listener(self, port, protocol, family):
-        t = threading.Thread(target=self._listen_loop, args=(port, protocol, family), daemon=True)
-        t.start()
-        self.threads.append(t)
-
-    def _listen_loop(self, port, protocol, family):
+    def start_listener(self, address, port, protocol):
+        """Listen on address:port; returns False (and records a BindFailure) on error."""
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        sock = None
         try:
             sock = socket.socket(family, socket.SOCK_STREAM)
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
-            bind_addr = '127.0.0.1' if family == socket.AF_INET else '::1'
-            sock.bind((bind_addr, port))
-            sock.listen(5)
+            if self._reuse_port:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind((address, port))
+            sock.listen(self.backlog)
+            sock.setblocking(False)
+        except OSError as e:
+            if sock:
+                sock.close()
+            reason = _BIND_REASONS.get(e.errno, "error")
+            self.bind_failures.append(BindFailure(address, port, protocol, reason, str(e)))
+            return False
+
+        self.selector.register(sock, selectors.EVENT_READ, protocol)
+        self.listeners.append(sock)
+        print(f"Sinkhole listening on {address}:{port} ({protocol})")
+        return True
+
+    def _event_loop(self):
+        try:
+            while self.running:
+                events = self.selector.select(self._next_timeout())
+                for key, mask in events:
+                    if key.fileobj is self._wakeup_r:
+                        self._drain_wakeup()
+                    elif isinstance(key.data, _Connection):
+                        if mask & selectors.EVENT_WRITE:
+                            self._flush(key.data)
+                        else:
+                            self._handle_connection(key.data)
+                    else:
+                        self._accept(key.fileobj, key.data)
+                self._expire_connections()
+                if self._processes:
+                    self._collect_worker_stats()
         except Exception as e:
-            # IPv6 might not be available, just ignore
-            if family == socket.AF_INET6:
-                return
-            print(f"Error binding to port {port} ({family}): {e}")
-            return
+            print(f"Error in sinkhole event loop: {e}")
+        finally:
+            self.running = False
+            self._close_all()
 
-        print(f"Sinkhole listening on {bind_addr}:{port} ({protocol})")
+    def _next_timeout(self):
+        # Wake up regularly to pull counters and events from worker processes
+        limit = 0.5 if self._processes else None
+        # Connections are kept in deadline order, so the first one of each expires first
+        for table in (self.connections, self.idle):
+            for conn in table.values():
+                timeout = max(0.0, conn.deadline - time.monotonic())
+                limit = timeout if limit is None else min(timeout, limit)
+                break
+        return limit
 
-        while self.running:
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_r.recv(64):
+                pass
+        except OSError:
+            pass
+
+    def _accept(self, listener, protocol):
+        # Drain several pending connections per wakeup to keep the accept queue short
+        now = time.monotonic()
+        deadline = now + self.read_timeout
+        for _ in range(self.accept_batch):
             try:
-                client_sock, addr = sock.accept()
-                if not self.running:
-                    client_sock.close()
-                    break
-                
-                # Handle connection in a separate thread to not block the listener
-                threading.Thread(target=self._handle_connection, args=(client_sock, protocol), daemon=True).start()
+                client_sock, addr = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
             except Exception as e:
                 print(f"Error in accept loop: {e}")
-        
-        sock.close()
+                return
 
-    def _handle_connection(self, sock, protocol):
-        domain = "Unknown"
+            # Bounded concurrency: the oldest idle client makes room for the new one
+            if len(self.connections) + len(self.idle) >= self.max_connections:
+                oldest = next(iter((self.idle or self.connections).values()))
+                self._finish(oldest)
+
+            client_sock.setblocking(False)
+            family = "IPv6" if listener.family == socket.AF_INET6 else "IPv4"
+            conn = _Connection(client_sock, protocol, family, addr[1], deadline,
+                               keep_alive=self.reject_mode == "fast", accepted=now)
+            self.connections[client_sock] = conn
+            self.selector.register(client_sock, selectors.EVENT_READ, conn)
+
+    def _handle_connection(self, conn):
         try:
-            sock.settimeout(1.0)
-            data = sock.recv(4096)
-            
-            if protocol == "HTTPS":
-                domain = self._parse_sni(data) or "Encrypted AI Service"
-            elif protocol == "HTTP":
-                domain = self._parse_host_header(data) or "Unencrypted AI Service"
-            
-            self._record_hit(domain)
-            
-            # Send a polite refusal
-            if protocol == "HTTP":
-                response = b"HTTP/1.1 403 Forbidden\r\nContent-Type: text/plain\r\n\r\nAccess Denied by IfNoAI Protocol."
-                sock.sendall(response)
-            
-        except Exception:
-            pass
-        finally:
-            sock.close()
+            data = conn.sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+
+        if conn.http is not None:
+            if not data:
+                self._finish(conn)
+                return
+            self._serve_http(conn, data)
+            return
+        if conn.tls is not None:
+            if not data:
+                self._finish(conn)
+                return
+            conn.tls.incoming.write(data)
+            self._pump_tls(conn)
+            return
+        if conn.hello is not None:
+            # Keep reading until the full ClientHello arrived (or the client gave up)
+            state = conn.hello.feed(data) if data else None
+            if state == NEED_MORE:
+                return
+            if state == DONE and self.ca is not None and conn.hello.sni:
+                self._start_tls(conn)
+                return
+        else:
+            conn.buffer += data
+        self._finish(conn)
+
+    def _serve_http(self, conn, data):
+        """Answer every request completed by `data`, then wait for more or close."""
+        requests = conn.http.feed(data)
+        if requests:
+            responses = []
+            for request in requests:
+                domain = request.host
+                if domain is None:
+                    domain = "Unencrypted AI Service"
+                    if self.metrics is not None:
+                        self.metrics.parse_failure(conn.protocol, "host_not_found")
+                self._record_conn(conn, domain)
+                responses.append(self.responses.lookup(domain, request.keep_alive))
+            if not self._send(conn, b"".join(responses)):
+                self._finish(conn)
+                return
+
+        if conn.http.closed and not conn.outgoing:
+            self._close_http(conn)
+        elif requests:
+            # Served: the idle timeout restarts (a closed connection still
+            # writing its responses is finished by _flush)
+            self.connections.pop(conn.sock, None)
+            self.idle.pop(conn.sock, None)
+            conn.deadline = time.monotonic() + self.keepalive_timeout
+            self.idle[conn.sock] = conn
 
-    def _record_hit(self, domain):
-        with self.lock:
-            self.stats["total_blocked"] += 1
-            self.stats["domains"][domain] = self.stats["domains"].get(domain, 0) + 1
-            # print(f"Blocked request to: {domain}") # Debug log
+    def _close_http(self, conn):
+        # A rejected request (http.error) is still recorded and answered by _finish
+        if conn.http.count and not conn.http.error:
+            try:
+                conn.sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+        self._finish(conn)
 
-    def _parse_sni(self, data):
+    def _send(self, conn, data):
         """
-        Basic parser for TLS Client Hello to extract SNI (Server Name Indication).
+        Write `data` to a client without blocking; what the socket can't take
+        now is queued for _flush. Returns False if the connection failed.
         """
+        if conn.outgoing:
+            conn.outgoing += data
+            return True
         try:
-            # TLS Record Header (5 bytes)
-            # Content Type (1) | Version (2) | Length (2)
-            if len(data) < 5: return None
-            content_type, version, length = struct.unpack("!BHH", data[:5])
-            
-            if content_type != 22: # 22 is Handshake
-                return None
-            
-            # Handshake Header
-            # Msg Type (1) | Length (3)
-            if len(data) < 9: return None
-            msg_type = data[5]
-            if msg_type != 1: # 1 is Client Hello
-                return None
-            
-            # Skip fixed length fields to get to Extensions
-            # Session ID Length is at offset 43 (approx, depends on Random)
-            # Actually let's do dynamic parsing pointer
-            p = 5 + 4 # Skip Record+Handshake headers
-            p += 2 # Version
-            p += 32 # Random
-            
-            # Session ID
-            if p >= len(data): return None
-            sess_id_len = data[p]
-            p += 1 + sess_id_len
-            
-            # Cipher Suites
-            if p + 2 >= len(data): return None
-            cipher_len = struct.unpack("!H", data[p:p+2])[0]
-            p += 2 + cipher_len
-            
-            # Compression Methods
-            if p >= len(data): return None
-            comp_len = data[p]
-            p += 1 + comp_len
-            
-            # Extensions
-            if p + 2 >= len(data): return None
-            ext_len = struct.unpack("!H", data[p:p+2])[0]
-            p += 2
-            
-            end_ext = p + ext_len
-            while p < end_ext:
-                if p + 4 > len(data): break
-                ext_type, ext_data_len = struct.unpack("!HH", data[p:p+4])
-                p += 4
-                
-                if ext_type == 0: # 0 is Server Name
-                    # Server Name List Length (2)
-                    p += 2 
-                    # Server Name Type (1)
-                    sn_type = data[p]
-                    p += 1
-                    if sn_type == 0: # Hostname
-                        sn_len = struct.unpack("!H", data[p:p+2])[0]
-                        p += 2
-                        return data[p:p+sn_len].decode('utf-8')
+            sent = conn.sock.send(data)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            return False
+        if sent < len(data):
+            conn.outgoing = bytearray(data[sent:])
+            self.selector.modify(conn.sock, selectors.EVENT_WRITE, conn)
+        return True
+
+    def _flush(self, conn):
+        """The socket became writable: send queued responses, then resume reading."""
+        try:
+            sent = conn.sock.send(conn.outgoing)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._finish(conn)
+            return
+        del conn.outgoing[:sent]
+        if conn.outgoing:
+            return
+        conn.outgoing = None
+        if conn.http is not None and conn.http.closed:
+            self._close_http(conn)
+            return
+        self.selector.modify(conn.sock, selectors.EVENT_READ, conn)
+
+    def _start_tls(self, conn):
+        """Answer the ClientHello ourselves with a certificate minted for its SNI."""
+        host = conn.hello.sni
+        context = self.ca.ready_context(host)
+        if context is None:
+            # Being minted off the loop: this client gets the TLS alert, later ones the certificate
+            self._finish(conn)
+            return
+        hello = bytes(conn.hello.buffer)
+        conn.hello = None # Attributed here, so _finish must not record it again
+        self._record_conn(conn, host)
+        conn.tls = _TLSSession(context, host)
+        conn.tls.incoming.write(hello)
+        self._pump_tls(conn)
+
+    def _pump_tls(self, conn):
+        tls = conn.tls
+        try:
+            if not tls.established:
+                tls.obj.do_handshake()
+                tls.established = True
+            while b"\r\n\r\n" not in tls.request and len(tls.request) < 65536:
+                chunk = tls.obj.read(4096)
+                if not chunk:
+                    break
+                tls.request += chunk
+        except ssl.SSLWantReadError:
+            self._send_tls(conn)
+            return
+        except (ssl.SSLError, OSError):
+            # Usually the client refusing our certificate (local CA not trusted)
+            self._send_tls(conn)
+            self._finish(conn)
+            return
+
+        if tls.request:
+            self.endpoints.add(tls.host + _request_path(tls.request))
+            try:
+                tls.obj.write(self.responses.lookup(tls.host))
+            except ssl.SSLError:
+                pass
+        if self._send_tls(conn):
+            try:
+                conn.sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+        self._finish(conn)
+
+    def _send_tls(self, conn):
+        data = conn.tls.outgoing.read()
+        try:
+            if data:
+                conn.sock.sendall(data)
+            return True
+        except OSError:
+            return False
+
+    def _finish(self, conn):
+        """Attribute whatever the client sent, answer it, and close the socket."""
+        self.connections.pop(conn.sock, None)
+        self.idle.pop(conn.sock, None)
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+
+        try:
+            if conn.hello is not None and conn.hello.buffer:
+                conn.buffer = conn.hello.buffer
+            if conn.http is not None and (not conn.http.count or conn.http.error):
+                # Never got a complete request (slow client), or the last one was
+                # rejected (garbage, even after valid ones): attribute what arrived
+                conn.buffer = bytes(conn.http.buffer)
+            if conn.buffer:
+                data = conn.buffer
+                if conn.protocol == "HTTPS":
+                    domain = conn.hello.sni
+                    failure = "sni_not_found"
+                elif conn.protocol == "HTTP":
+                    domain = self._parse_host_header(data)
+                    failure = "host_not_found"
                 else:
-                    p += ext_data_len
-                    
+                    domain = failure = None
+                if not domain:
+                    domain = _UNATTRIBUTED.get(conn.protocol, "Unknown")
+                    if failure and self.metrics is not None:
+                        self.metrics.parse_failure(conn.protocol, failure)
+
+                self._record_conn(conn, domain)
+
+                # Send a polite refusal
+                if conn.protocol == "HTTPS":
+                    response = self.tls_response
+                elif self.reject_mode == "fast":
+                    response = self.responses.lookup(domain)
+                else:
+                    response = _LEGACY_HTTP_RESPONSE
+                if response and not conn.outgoing: # Never interleave with queued responses
+                    conn.sock.sendall(response)
+                    if self.reject_mode == "fast":
+                        # FIN rather than RST, so the response is not discarded
+                        conn.sock.shutdown(socket.SHUT_WR)
         except Exception:
-            return None
-        return None
+            pass
+        finally:
+            conn.sock.close()
+            if self.metrics is not None:
+                self.metrics.closed(conn)
+
+    def _expire_connections(self):
+        now = time.monotonic()
+        for table in (self.connections, self.idle):
+            while table:
+                conn = next(iter(table.values()))
+                if conn.deadline > now:
+                    break
+                self._finish(conn)
+
+    def _close_all(self):
+        for conn in list(self.connections.values()) + list(self.idle.values()):
+            self._finish(conn)
+        for sock in self.listeners:
+            sock.close()
+        self.listeners = []
+        for sock in (self._wakeup_r, self._wakeup_w):
+            if sock:
+                sock.close()
+        self._wakeup_r = self._wakeup_w = None
+        if self.selector:
+            self.selector.close()
+            self.selector = None
+
+    def _record_conn(self, conn, domain):
+        self._record_hit(domain, conn.protocol, conn.family, conn.port)
+        if self.metrics is not None:
+            conn.recorded = self.metrics.recorded(conn)
+
+    def _record_hit(self, domain, protocol="HTTP", family="IPv4", port=0):
+        now = time.time()
+        self.heavy_hitters.add(domain)
+        if self.matcher is not None:
+            self.categories.add(self.category_of(domain))
+        self.recent.add(now, domain, protocol)
+        if self.event_log is not None:
+            self.event_log.record(now, domain, protocol, family, port)
+        if not self._notify_pending:
+            self._schedule_notify()
+        # print(f"Blocked request to: {domain}") # Debug log
 
     def _parse_host_header(self, data):
         try:
@@ -186,6 +766,110 @@ class SinkholeServer:
             pass
         return None
 
+    def subscribe(self, callback):
+        """Call `callback()` (from a background thread) shortly after stats change."""
+        self._subscribers.append(callback)
+        if self._notifier is None:
+            self._notifier = threading.Thread(target=self._notify_loop, daemon=True)
+            self._notifier.start()
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _schedule_notify(self):
+        # Coalesce bursts: one notification per interval, however many hits arrive
+        if not self._subscribers or self._notify_pending:
+            return
+        self._notify_pending = True
+        self._notify_wakeup.set()
+
+    def _notify_loop(self):
+        while True:
+            self._notify_wakeup.wait()
+            self._notify_wakeup.clear()
+            time.sleep(self.notify_interval) # Let the burst gather
+            self._notify_pending = False
+            for callback in list(self._subscribers):
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Error in stats subscriber: {e}")
+
     def get_stats(self):
-        with self.lock:
-            return self.stats.copy()
+        """
+        Returns a read-only snapshot: {"total_blocked": int, "domains": {domain: count}}
+        plus "categories": {category: count} when a matcher is configured.
+        "domains" holds the top_capacity most blocked domains (Space-Saving
+        estimates, exact unless more distinct domains were seen).
+        """
+        workers = list(self._worker_stats.values())
+        domains, _, _, total = self.heavy_hitters.summary(workers)
+        snapshot = {
+            "total_blocked": total,
+            "domains": MappingProxyType(domains),
+        }
+        if self.matcher is not None:
+            categories = dict(self.categories.snapshot()["domains"])
+            for worker_categories in list(self._worker_categories.values()):
+                for category, count in worker_categories.items():
+                    categories[category] = categories.get(category, 0) + count
+            snapshot["categories"] = MappingProxyType(categories)
+        return MappingProxyType(snapshot)
+
+    def top_domains(self, k=10):
+        """
+        Returns [(domain, count)] for the k most blocked domains, read from the
+        bounded heavy-hitter summary instead of sorting every domain seen.
+        """
+        top = self.heavy_hitters.top(k, list(self._worker_stats.values()))
+        return [(domain, count) for domain, count, _ in top]
+
+    def recent_hits(self, cursor=0):
+        """Returns ([(timestamp, domain, protocol)], cursor) for hits newer than `cursor`."""
+        return self.recent.since(cursor)
+
+    def get_endpoints(self):
+        """
+        Returns {"host/path": count} for the top_capacity most frequent requests
+        seen through TLS termination.
+        """
+        endpoints = self.endpoints.summary(list(self._worker_endpoints.values()))[0]
+        return MappingProxyType(endpoints)
+
+    def merge_counts(self, domains, total=None):
+        """
+        Add a mapping of domain -> count (restored history); `total` counts
+        hits of domains that are not in the mapping too.
+        """
+        self.heavy_hitters.update(domains, total)
+        if self.matcher is not None:
+            self.categories.update(self._categorize(domains))
+
+    def reset(self):
+        """Zero the counters before a new experiment; only valid while stopped."""
+        self.heavy_hitters = ShardedHeavyHitters(self.top_capacity)
+        self.categories = ShardedCounter()
+        self.endpoints = ShardedHeavyHitters(self.top_capacity)
+        self._worker_stats = {}
+        self._worker_endpoints = {}
+        self._worker_categories = {}
+
+    def _categorize(self, domains):
+        """Attribute captured hosts to ai_domains.json categories via the matcher."""
+        categories = {}
+        for domain, count in domains.items():
+            category = self.category_of(domain)
+            categories[category] = categories.get(category, 0) + count
+        return categories
+
+    def category_of(self, domain):
+        """The ai_domains.json category of a captured host ("uncategorized" if none)."""
+        category = self._category_cache.get(domain)
+        if category is None:
+            if len(self._category_cache) >= 4096:
+                self._category_cache.clear() # Arbitrary hostnames must not grow it forever
+            found = self.matcher.match(domain) if self.matcher is not None else None
+            category = found.category if found and found.category else "uncategorized"
+            self._category_cache[domain] = category
+        return category
@@ -0,0 +1,296 @@
+import heapq
+import itertools
+import threading
+from types import MappingProxyType
+
+class ShardedCounter:
+    """
+    Per-domain hit counters split into one shard per writer thread.
+
+    The capture path only ever touches the shard owned by the calling thread,
+    so incrementing needs no lock. Readers copy each shard (a single atomic
+    dict copy under the GIL) and merge them into a read-only snapshot that is
+    never mutated afterwards.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock() # Only taken when a thread records its first hit
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def add(self, domain, count=1):
+        shard = self._shard()
+        shard[domain] = shard.get(domain, 0) + count
+
+    def update(self, domains):
+        """Add a mapping of domain -> count (e.g. merged from another worker)."""
+        shard = self._shard()
+        for domain, count in domains.items():
+            shard[domain] = shard.get(domain, 0) + count
+
+    def snapshot(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+
+        domains = {}
+        for shard in shards:
+            for domain, count in shard.copy().items():
+                domains[domain] = domains.get(domain, 0) + count
+
+        # The total is derived from the same copies, so it always matches the domains
+        return MappingProxyType({
+            "total_blocked": sum(domains.values()),
+            "domains": MappingProxyType(domains),
+        })
+
+class HeavyHitters:
+    """
+    Space-Saving summary of the most frequent domains in bounded memory.
+
+    At most `capacity` domains are tracked. A new domain arriving when the
+    summary is full takes over the slot of the least frequent one and
+    inherits its count as `error`, so each reported count overestimates the
+    true one by at most `error`, and any domain with more than
+    total / capacity hits is guaranteed to be tracked. Counts of domains that
+    never left the summary are exact (error 0).
+
+    There must be a single writer (see ShardedHeavyHitters); readers copy the
+    tables and never block it.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.total = 0
+        self._counts = {}
+        self._errors = {}
+        # Min-heap of (count, domain); entries go stale as counts grow and are
+        # refreshed lazily when an eviction looks at them
+        self._heap = []
+
+    def add(self, domain, count=1):
+        self.total += count
+        counts = self._counts
+        if domain in counts:
+            counts[domain] += count
+            return
+        if len(counts) < self.capacity:
+            counts[domain] = count
+            self._errors[domain] = 0
+            heapq.heappush(self._heap, (count, domain))
+            return
+        floor, victim = self._evict()
+        counts[domain] = floor + count
+        self._errors[domain] = floor
+        heapq.heappush(self._heap, (floor + count, domain))
+
+    def _evict(self):
+        heap = self._heap
+        while True:
+            count, domain = heapq.heappop(heap)
+            current = self._counts.get(domain)
+            if current is None:
+                continue
+            if current != count:
+                heapq.heappush(heap, (current, domain))
+                continue
+            del self._counts[domain]
+            del self._errors[domain]
+            return count, domain
+
+    def update(self, domains):
+        """Add a mapping of domain -> count (e.g. merged from another worker)."""
+        for domain, count in domains.items():
+            self.add(domain, count)
+
+    def summary(self):
+        """
+        Returns a (counts, errors, floor, total) copy, where floor bounds the
+        hits of any domain that is not tracked.
+        """
+        total = self.total
+        counts = self._counts.copy()
+        errors = self._errors.copy()
+        floor = min(counts.values()) if counts and len(counts) >= self.capacity else 0
+        return counts, errors, floor, total
+
+    def top(self, k=10):
+        """Returns [(domain, count, error)] for the k most frequent domains, highest first."""
+        return _top(self.summary(), k)
+
+    def estimate(self, domain):
+        """Returns (count, error) for a tracked domain, (0, floor) otherwise."""
+        counts, errors, floor, _ = self.summary()
+        if domain in counts:
+            return counts[domain], errors.get(domain, 0)
+        return 0, floor
+
+def merge_summaries(summaries, capacity):
+    """
+    Merge (counts, errors, floor, total) summaries into one of at most
+    `capacity` domains. A domain missing from a summary may have had up to
+    that summary's floor hits there, which is added to its count and error.
+    """
+    summaries = list(summaries)
+    domains = set()
+    for counts, _, _, _ in summaries:
+        domains.update(counts)
+    merged = {}
+    for domain in domains:
+        count = error = 0
+        for counts, errors, floor, _ in summaries:
+            if domain in counts:
+                count += counts[domain]
+                error += errors.get(domain, 0)
+            else:
+                count += floor
+                error += floor
+        merged[domain] = (count, error)
+    kept = heapq.nlargest(capacity, merged.items(), key=lambda item: item[1][0])
+    # Untracked domains: missing everywhere, or cut off by the capacity
+    floor = sum(summary[2] for summary in summaries)
+    if len(kept) < len(merged):
+        floor = max(floor, kept[-1][1][0])
+    return ({domain: count for domain, (count, _) in kept},
+            {domain: error for domain, (_, error) in kept},
+            floor, sum(summary[3] for summary in summaries))
+
+def _top(summary, k):
+    counts, errors, _, _ = summary
+    items = heapq.nlargest(k, counts.items(), key=lambda item: item[1])
+    return [(domain, count, errors.get(domain, 0)) for domain, count in items]
+
+class ShardedHeavyHitters:
+    """
+    HeavyHitters split into one shard per writer thread, merged on read.
+
+    Like ShardedCounter, the capture path only touches the shard owned by
+    the calling thread, so recording a hit takes no lock. Shards of threads
+    that have exited, and counts merged in from elsewhere (restored history,
+    worker processes), are folded into a single retired summary, so memory
+    is bounded by capacity times the number of live writers. The total is
+    always exact.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self._local = threading.local()
+        self._shards = [] # (thread, HeavyHitters)
+        self._retired = ({}, {}, 0, 0)
+        self._shards_lock = threading.Lock() # Only taken off the capture path
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = HeavyHitters(self.capacity)
+            with self._shards_lock:
+                live = []
+                for thread, old in self._shards:
+                    if thread.is_alive():
+                        live.append((thread, old))
+                    else:
+                        self._fold(old.summary())
+                live.append((threading.current_thread(), shard))
+                self._shards = live
+            self._local.shard = shard
+            return shard
+
+    def _fold(self, summary):
+        self._retired = merge_summaries([self._retired, summary], self.capacity)
+
+    def add(self, domain, count=1):
+        self._shard().add(domain, count)
+
+    def update(self, domains, total=None):
+        """Merge exact counts of domain -> count; `total` covers domains left out of the mapping."""
+        summary = (dict(domains), {}, 0, sum(domains.values()) if total is None else total)
+        with self._shards_lock:
+            self._fold(summary)
+
+    def absorb(self, summary):
+        """Merge a (counts, errors, floor, total) summary, e.g. from a retired worker."""
+        with self._shards_lock:
+            self._fold(summary)
+
+    def summary(self, extra=()):
+        """The merged (counts, errors, floor, total) of every shard plus `extra` summaries."""
+        with self._shards_lock:
+            shards = [shard for _, shard in self._shards]
+            retired = self._retired
+        return merge_summaries([retired] + [shard.summary() for shard in shards] + list(extra),
+                               self.capacity)
+
+    def top(self, k=10, extra=()):
+        """Returns [(domain, count, error)] for the k most frequent domains, highest first."""
+        return _top(self.summary(extra), k)
+
+class RecentHits:
+    """
+    Fixed-size ring of the most recent hits, read incrementally by cursor.
+
+    Every slot is preallocated. A writer claims a sequence number from an
+    itertools.count (atomic under the GIL), fills the slot and publishes the
+    sequence number last, so writers never take a lock and a reader can tell
+    a slot that is still being written (or already overwritten) from a
+    complete one.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._seq = itertools.count(1)
+        self._published = [0] * capacity
+        self._timestamps = [0.0] * capacity
+        self._domains = [None] * capacity
+        self._protocols = [None] * capacity
+        self._head = 0 # Highest sequence number claimed so far
+
+    def add(self, timestamp, domain, protocol):
+        seq = next(self._seq)
+        slot = seq % self.capacity
+        self._published[slot] = 0 # Invalidate before overwriting
+        self._timestamps[slot] = timestamp
+        self._domains[slot] = domain
+        self._protocols[slot] = protocol
+        self._published[slot] = seq
+        # Racing writers may briefly publish an older head; readers then pick
+        # up the newer hit on their next call
+        if seq > self._head:
+            self._head = seq
+
+    def since(self, cursor=0):
+        """
+        Returns ([(timestamp, domain, protocol)], cursor) for the hits recorded
+        after `cursor`, oldest first. Pass the returned cursor to the next
+        call; hits that were overwritten in between are skipped.
+        """
+        head = self._head
+        start = max(cursor + 1, head - self.capacity + 1, 1)
+        hits = []
+        seq = start - 1
+        for seq in range(start, head + 1):
+            slot = seq % self.capacity
+            if self._published[slot] != seq:
+                seq -= 1
+                break
+            hits.append((self._timestamps[slot], self._domains[slot], self._protocols[slot]))
+            # A writer lapped us while copying: drop the torn entry
+            if self._published[slot] != seq:
+                hits.pop()
+                seq -= 1
+                break
+        return hits, max(seq, cursor)
+
+    def latest(self):
+        """The most recent (timestamp, domain, protocol), or None."""
+        hits, _ = self.since(max(self._head - 1, 0))
+        return hits[-1] if hits else None
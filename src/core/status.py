@@ -0,0 +1,51 @@
+import os
+
+from core.paths import runtime_path, runtime_paths
+
+# A few bytes in the runtime directory caching whether the hosts file holds
+# our block, keyed on the hosts file's stat signature. `main.py status`
+# answers from it with one stat() and one small read, without importing the
+# blocker or parsing hosts; any change to hosts (ours or anyone's)
+# invalidates it. Root writes it system-wide, so unprivileged status calls
+# read the same marker.
+
+def _marker_path():
+    return os.path.join(runtime_path(), "status")
+
+def file_signature(path):
+    """Cheap change detector: one stat() call."""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+def read_marker(hosts_path, signature=None):
+    """Returns (active, active_since ISO string or None), or None if the marker is missing or stale."""
+    try:
+        if signature is None:
+            signature = file_signature(hosts_path)
+    except OSError:
+        return None
+    for directory in runtime_paths():
+        try:
+            with open(os.path.join(directory, "status"), "r", encoding="utf-8") as f:
+                path, fields = f.read().split("\n")[:2]
+        except (OSError, ValueError):
+            continue
+        fields = fields.split(" ")
+        if path == hosts_path and len(fields) == 5 and fields[:3] == [str(n) for n in signature]:
+            return fields[3] == "1", None if fields[4] == "-" else fields[4]
+    return None
+
+def write_marker(hosts_path, signature, active, since=None):
+    """Record the state parsed from hosts for the given signature. Failures are ignored."""
+    path = _marker_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{hosts_path}\n{signature[0]} {signature[1]} {signature[2]} "
+                    f"{1 if active else 0} {since or '-'}\n")
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
@@ -0,0 +1,141 @@
+import struct
+
+NEED_MORE = 0
+DONE = 1
+INVALID = 2
+
+_RECORD_HEADER = struct.Struct("!BHH")
+_U16 = struct.Struct("!H")
+
+# Alert descriptions (RFC 8446, section 6)
+ALERT_HANDSHAKE_FAILURE = 40
+ALERT_UNRECOGNIZED_NAME = 112
+ALERTS = {
+    "handshake_failure": ALERT_HANDSHAKE_FAILURE,
+    "unrecognized_name": ALERT_UNRECOGNIZED_NAME,
+}
+
+def alert_record(description):
+    """A plaintext fatal alert record, valid before any ServerHello in TLS 1.0-1.3."""
+    return _RECORD_HEADER.pack(21, 0x0303, 2) + bytes((2, description))
+
+class ClientHelloParser:
+    """
+    Incremental TLS ClientHello parser.
+
+    Bytes are fed as they arrive from the socket; the parser waits until the
+    whole handshake message has been received (reassembling it across partial
+    reads and, if needed, across several TLS records) and then extracts the
+    SNI hostname and ALPN protocols by walking a memoryview of the buffer.
+    """
+
+    def __init__(self, max_size=65536):
+        self.max_size = max_size
+        self.buffer = bytearray()
+        self.state = NEED_MORE
+        self.sni = None
+        self.alpn = []
+
+    def feed(self, data):
+        if self.state != NEED_MORE:
+            return self.state
+        self.buffer += data
+        if len(self.buffer) > self.max_size:
+            self.state = INVALID
+            return self.state
+
+        message = self._handshake_message()
+        if message is None:
+            return self.state
+
+        try:
+            self._parse_client_hello(message)
+            self.state = DONE
+        except (IndexError, struct.error, UnicodeDecodeError, ValueError):
+            self.state = INVALID
+        finally:
+            message.release()
+        return self.state
+
+    def _handshake_message(self):
+        """Return a view of the complete ClientHello body, or None if incomplete."""
+        buf = self.buffer
+        if len(buf) < 5:
+            return None
+        content_type, _, record_len = _RECORD_HEADER.unpack_from(buf, 0)
+        if content_type != 22: # 22 is Handshake
+            self.state = INVALID
+            return None
+        if len(buf) < 5 + record_len:
+            return None
+        if record_len < 4 or buf[5] != 1: # 1 is Client Hello
+            self.state = INVALID
+            return None
+
+        hello_len = int.from_bytes(buf[6:9], "big")
+        if hello_len <= record_len - 4:
+            # Common case: the whole message sits in the first record
+            return memoryview(buf)[9:9 + hello_len]
+
+        # The ClientHello spans several records: gather the fragments
+        fragments = bytearray(buf[9:5 + record_len])
+        p = 5 + record_len
+        while len(fragments) < hello_len:
+            if len(buf) < p + 5:
+                return None
+            content_type, _, record_len = _RECORD_HEADER.unpack_from(buf, p)
+            if content_type != 22:
+                self.state = INVALID
+                return None
+            if len(buf) < p + 5 + record_len:
+                return None
+            fragments += buf[p + 5:p + 5 + record_len]
+            p += 5 + record_len
+        return memoryview(fragments)[:hello_len]
+
+    def _parse_client_hello(self, m):
+        p = 2 + 32 # Version + Random
+        p += 1 + m[p] # Session ID
+        p += 2 + _U16.unpack_from(m, p)[0] # Cipher Suites
+        p += 1 + m[p] # Compression Methods
+        if p + 2 > len(m):
+            return # No extensions at all
+
+        end_ext = p + 2 + _U16.unpack_from(m, p)[0]
+        p += 2
+        if end_ext > len(m):
+            raise ValueError("extensions overrun ClientHello")
+
+        while p + 4 <= end_ext:
+            ext_type, ext_len = struct.unpack_from("!HH", m, p)
+            p += 4
+            if ext_type == 0: # Server Name
+                self._parse_server_name(m, p, p + ext_len)
+            elif ext_type == 16: # ALPN
+                self._parse_alpn(m, p, p + ext_len)
+            p += ext_len
+
+    def _parse_server_name(self, m, p, end):
+        p += 2 # Server Name List Length
+        while p + 3 <= end:
+            sn_type = m[p]
+            sn_len = _U16.unpack_from(m, p + 1)[0]
+            p += 3
+            if sn_type == 0: # Hostname
+                self.sni = str(m[p:p + sn_len], "ascii")
+                return
+            p += sn_len
+
+    def _parse_alpn(self, m, p, end):
+        p += 2 # Protocol Name List Length
+        while p < end:
+            n = m[p]
+            self.alpn.append(str(m[p + 1:p + 1 + n], "ascii"))
+            p += 1 + n
+
+def parse_client_hello(data):
+    """One-shot helper: returns (sni, alpn) or None if data is not a complete ClientHello."""
+    parser = ClientHelloParser()
+    if parser.feed(data) != DONE:
+        return None
+    return parser.sni, parser.alpn
@@ -1,18 +1,22 @@
 import sys
+import time
 import ctypes
 from pathlib import Path
 from datetime import datetime
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QPushButton, QLabel, QComboBox, QFrame, QMessageBox, QHBoxLayout)
-from PySide6.QtCore import Qt, QTimer, QThread, Signal
+                             QPushButton, QLabel, QComboBox, QFrame, QMessageBox, QHBoxLayout,
+                             QPlainTextEdit)
+from PySide6.QtCore import Qt, QTimer, QThread, Signal, QObject, QFileSystemWatcher, QEvent
 from PySide6.QtGui import QColor, QPalette
 
 # Add src to path to import core
 sys.path.append(str(Path(__file__).parents[1]))
 from core.blocker import AIBlocker
-from core.sinkhole import SinkholeServer
-from gui.report_window import ReportWindow
-from gui.loading_dialog import LoadingDialog
+from core.backends import get_backend
+from core.daemon import DaemonClient, RemoteSinkhole, RemoteEventLog, RemoteHistory, sinkhole_options
+from core.eventlog import EventLog, MINUTE, HOUR
+from core.journal import ExperimentJournal, recover_experiment
+from core.schedule import Deadline
 
 class WorkerThread(QThread):
     finished = Signal()
@@ -28,6 +32,14 @@ class WorkerThread(QThread):
             pass
         self.finished.emit()
 
+class StatsNotifier(QObject):
+    """Carries sinkhole change callbacks (fired on a background thread) to the GUI thread."""
+    changed = Signal()
+
+class DeadlineNotifier(QObject):
+    """Carries the experiment's expiry (fired on a background thread) to the GUI thread."""
+    expired = Signal()
+
 class ModernButton(QPushButton):
     def __init__(self, text, parent=None, is_danger=False):
         super().__init__(text, parent)
@@ -66,25 +78,125 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.blocker = AIBlocker()
-        self.sinkhole = SinkholeServer()
-        self.timer_count = 0
+        client = DaemonClient()
+        self.remote = client.ping()
+        if self.remote:
+            # A running daemon owns the block, the sinkhole and the experiment's
+            # end: the window is only a view of it
+            self.event_log = RemoteEventLog(client)
+            self.history = RemoteHistory(client)
+            self.sinkhole = RemoteSinkhole(client)
+            self.journal = None # The daemon keeps its own
+        else:
+            from core.sinkhole import SinkholeServer
+            from core.history import HistoryStore
+            # Columnar store of every hit: restores counts after a restart and feeds the report
+            self.history = HistoryStore()
+            self.event_log = EventLog(history=self.history)
+            self.sinkhole = SinkholeServer(event_log=self.event_log, matcher=self.blocker.load_matcher(),
+                                           **sinkhole_options(self.blocker))
+            # Crash-safe record of the running experiment, replayed on the next launch
+            self.journal = ExperimentJournal()
+        self.ends_at = None # Wall-clock end of the running experiment
+        self.deadline = None
         self.experiment_start_time = None  # Track when experiment started
+        self.feed_cursor = 0 # Position in the sinkhole's ring of recent hits
         self.original_timer_count = 0  # Track original duration for settlement
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_timer)
+        # Expiry is a wall-clock deadline, so sleep or a stalled event loop can't
+        # delay it; this timer only repaints the countdown while it is visible
+        self.deadline_notifier = DeadlineNotifier(self)
+        self.deadline_notifier.expired.connect(self.on_expired)
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.update_timer_display)
         
-        # Stats update timer
-        self.stats_timer = QTimer(self)
-        self.stats_timer.timeout.connect(self.update_stats)
-        self.stats_timer.start(1000) # Update stats every second
+        # Stats are pushed by the sinkhole instead of polled
+        self.stats_notifier = StatsNotifier(self)
+        self.stats_notifier.changed.connect(self.update_stats)
+        self.sinkhole.subscribe(self.stats_notifier.changed.emit)
+
+        # Hosts file changes (ours or anyone else's) refresh the status display
+        self.hosts_watcher = QFileSystemWatcher(self)
+        if Path(self.blocker.hosts_path).exists():
+            self.hosts_watcher.addPath(self.blocker.hosts_path)
+        self.hosts_watcher.fileChanged.connect(self.on_hosts_changed)
 
         self.apply_global_styles()
         self.init_ui()
-        self.update_status_display()
         
-        # If already blocked on startup, start sinkhole
+        # An experiment interrupted by a crash is resumed, or rolled back if it is over
+        experiment = recover_experiment(self.blocker, self.journal) if self.journal else None
         if self.blocker.status():
-             self.sinkhole.start()
+             self.resume_capture(experiment)
+        self.update_status_display()
+        self.update_stats() # Restored counts show before the next hit
+
+    def resume_capture(self, experiment=None):
+        """Restart capture after a restart mid-experiment, restoring its hits and countdown."""
+        if self.remote:
+            self.follow_daemon()
+            return
+        since = self.blocker.active_since()
+        if experiment is not None:
+            self.sinkhole.merge_counts(experiment.domains, experiment.total)
+            self.sinkhole.endpoints.update(experiment.endpoints)
+        elif since:
+            # No journal (blocked from the CLI): fall back to the history store
+            self.experiment_start_time = since
+            self.sinkhole.merge_counts(self.history.domain_counts(since.timestamp()))
+        self.event_log.start()
+        self.sinkhole.start()
+        self.check_sinkhole()
+        if experiment is None:
+            self.begin_journal()
+            return
+        if experiment.ends_at:
+            self.start_timer(max(1, int(experiment.ends_at - time.time())))
+            self.original_timer_count = int(experiment.ends_at - experiment.started_at)
+        self.experiment_start_time = datetime.fromtimestamp(experiment.started_at)
+        self.journal.start_checkpoints(self.journal_snapshot)
+
+    def follow_daemon(self):
+        """Mirror the daemon's running experiment: its start, its end and its bind failures."""
+        self.sinkhole.refresh()
+        started_at = self.sinkhole.started_at or time.time()
+        self.experiment_start_time = datetime.fromtimestamp(started_at)
+        self.ends_at = self.sinkhole.ends_at
+        if self.ends_at is not None:
+            self.original_timer_count = int(self.ends_at - started_at)
+            self.timer_display.setStyleSheet("font-family: 'Consolas'; font-size: 48px; color: #ff4444;")
+        self.check_sinkhole()
+        self.sync_display_timer()
+
+    def begin_journal(self):
+        if self.journal is None:
+            return
+        started = self.experiment_start_time.timestamp() if self.experiment_start_time else time.time()
+        self.journal.begin(started, self.ends_at, self.blocker.block_checksum())
+        self.journal.checkpoint(*self.journal_snapshot())
+        self.journal.start_checkpoints(self.journal_snapshot)
+
+    def journal_snapshot(self):
+        stats = self.sinkhole.get_stats()
+        return stats["domains"], self.sinkhole.get_endpoints(), stats["total_blocked"]
+
+    def check_sinkhole(self):
+        """Surface listeners that failed to bind (IPv6 loopback missing is expected)."""
+        failures = [f for f in self.sinkhole.bind_failures if f.reason != "unavailable"]
+        if failures:
+            failure = failures[0]
+            where = f"PORT {failure.port}" if failure.port else "REDIRECT"
+            self.stats_detail_label.setText(f"SINKHOLE: {where} {failure.reason.replace('_', ' ').upper()}")
+            for failure in failures:
+                print(f"Sinkhole bind failure: {failure.message}")
+
+    def stop_capture(self, end_experiment=True):
+        if self.journal is not None:
+            if end_experiment:
+                self.journal.end()
+            else:
+                self.journal.stop_checkpoints() # Still blocked: the next launch resumes it
+        self.sinkhole.stop()
+        self.event_log.close()
 
     def apply_global_styles(self):
         style = """
@@ -151,7 +263,7 @@ class MainWindow(QMainWindow):
 
     def init_ui(self):
         self.setWindowTitle("IfNoAI - Protocol Console")
-        self.setFixedSize(500, 650)
+        self.setFixedSize(500, 760)
         
         # Setup Dark Theme
         palette = QPalette()
@@ -207,6 +319,14 @@ class MainWindow(QMainWindow):
         self.stats_detail_label.setAlignment(Qt.AlignCenter)
         stats_layout.addWidget(self.stats_detail_label)
 
+        # Live feed of the latest interceptions
+        self.feed_view = QPlainTextEdit()
+        self.feed_view.setReadOnly(True)
+        self.feed_view.setMaximumBlockCount(100)
+        self.feed_view.setFixedHeight(90)
+        self.feed_view.setStyleSheet("background-color: #101015; border: none; color: #888; font-family: 'Consolas'; font-size: 10px;")
+        stats_layout.addWidget(self.feed_view)
+
         layout.addWidget(self.stats_frame)
 
         # Timer Selection
@@ -273,19 +393,13 @@ class MainWindow(QMainWindow):
                                        "Are you sure you want to reconnect to the AI cloud?\nThe experiment is not finished.",
                                        QMessageBox.Yes | QMessageBox.No)
             if reply == QMessageBox.Yes:
-                self.timer.stop()
+                self.stop_timer()
                 
                 # Show loading dialog
-                self.loading_dialog = LoadingDialog(self, "RECONNECTING TO NEURAL NET...")
-                self.loading_dialog.setModal(True)
-                self.loading_dialog.show()
+                self.show_loading("RECONNECTING TO NEURAL NET...")
                 
                 # Run disable in background
-                def stop_tasks():
-                    self.blocker.disable_block()
-                    self.sinkhole.stop()
-                
-                self.worker = WorkerThread(stop_tasks)
+                self.worker = WorkerThread(self.end_blackout)
                 self.worker.finished.connect(self.on_stop_finished)
                 self.worker.start()
             else:
@@ -297,11 +411,11 @@ class MainWindow(QMainWindow):
             hours = [24, 8, 4, 1][duration_idx]
             
             # Show loading dialog for start too (can take a moment)
-            self.loading_dialog = LoadingDialog(self, "SEVERING NEURAL LINKS...")
-            self.loading_dialog.setModal(True)
-            self.loading_dialog.show()
+            self.show_loading("SEVERING NEURAL LINKS...")
             
             def start_tasks():
+                if self.remote:
+                    return self.sinkhole.start(hours * 3600) # The daemon blocks and keeps the deadline
                 return self.blocker.enable_block()
 
             # Create a custom worker that can return value
@@ -310,12 +424,21 @@ class MainWindow(QMainWindow):
             self.worker.finished.connect(lambda: self.on_start_finished(getattr(self.worker, 'result', False), hours))
             self.worker.start()
 
+    def end_blackout(self):
+        if not self.remote:
+            self.blocker.disable_block()
+        self.stop_capture() # Attached to a daemon, this asks it to lift the block
+
     def on_stop_finished(self):
         self.loading_dialog.close()
+        self.show_report()
+
+    def show_report(self):
         # Check if report is already open or we are already done
         if not hasattr(self, '_report_shown') or not self._report_shown:
             self._report_shown = True
             self.finish_experiment()
+            self.experiment_start_time = None
             self._report_shown = False # Reset after close
         
         self.timer_display.setText("00:00:00")
@@ -326,37 +449,76 @@ class MainWindow(QMainWindow):
         self.loading_dialog.close()
         if success:
             self._report_shown = False # Reset flag on start
-            self.sinkhole.start()
-            self.start_timer(hours * 3600)
+            if self.remote:
+                self.follow_daemon()
+            else:
+                self.sinkhole.reset() # A new experiment counts from zero
+                self.event_log.start()
+                self.sinkhole.start()
+                self.check_sinkhole()
+                self.start_timer(hours * 3600)
+                self.begin_journal()
             self.update_status_display()
+            self.update_stats() # The new experiment starts from zero, not the last total
+
+    def show_loading(self, text):
+        # Dialogs are imported on first use, keeping them off the startup path
+        from gui.loading_dialog import LoadingDialog
+        self.loading_dialog = LoadingDialog(self, text)
+        self.loading_dialog.setModal(True)
+        self.loading_dialog.show()
 
     def start_timer(self, seconds):
-        self.timer_count = seconds
+        self.stop_timer()
+        self.ends_at = time.time() + seconds
         self.original_timer_count = seconds  # Store original duration
         self.experiment_start_time = datetime.now()  # Record start time
+        self.deadline = Deadline(self.ends_at, self.deadline_notifier.expired.emit).start()
         self.update_timer_display()
         self.timer_display.setStyleSheet("font-family: 'Consolas'; font-size: 48px; color: #ff4444;")
-        self.timer.start(1000)
+        self.sync_display_timer()
+
+    def stop_timer(self):
+        if self.deadline is not None:
+            self.deadline.cancel()
+            self.deadline = None
+        self.ends_at = None
+        self.sync_display_timer()
+
+    def sync_display_timer(self):
+        """Repaint the countdown every second only while the window can be seen."""
+        if self.ends_at is not None and self.isVisible() and not self.isMinimized():
+            self.update_timer_display()
+            if not self.display_timer.isActive():
+                self.display_timer.start(1000)
+        else:
+            self.display_timer.stop()
 
-    def update_timer(self):
-        self.timer_count -= 1
-        self.update_timer_display()
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.sync_display_timer()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.sync_display_timer()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.sync_display_timer()
+
+    def on_expired(self):
+        if self.ends_at is None:
+            return # Aborted meanwhile
+        self.stop_timer()
+        self.timer_display.setText("00:00:00")
+        self.toggle_btn.setEnabled(False) # Disable button during auto-stop
+        # Async finish for timer expiry
+        self.show_loading("PROTOCOL COMPLETE. DISENGAGING...")
         
-        if self.timer_count <= 0:
-            self.timer.stop()
-            self.toggle_btn.setEnabled(False) # Disable button during auto-stop
-            # Async finish for timer expiry
-            self.loading_dialog = LoadingDialog(self, "PROTOCOL COMPLETE. DISENGAGING...")
-            self.loading_dialog.setModal(True)
-            self.loading_dialog.show()
-            
-            def stop_tasks():
-                self.blocker.disable_block()
-                self.sinkhole.stop()
-            
-            self.worker = WorkerThread(stop_tasks)
-            self.worker.finished.connect(self.on_stop_finished)
-            self.worker.start()
+        self.worker = WorkerThread(self.end_blackout)
+        self.worker.finished.connect(self.on_stop_finished)
+        self.worker.start()
 
     def finish_experiment(self):
         # This method is now called AFTER blocking is disabled by worker (if manually stopped)
@@ -369,17 +531,26 @@ class MainWindow(QMainWindow):
         # Let's check if blocking is still active.
         if self.blocker.status():
              self.blocker.disable_block()
-             self.sinkhole.stop()
+             self.stop_capture()
         
         self.update_status_display()
         
         # Prepare Stats
         stats = self.sinkhole.get_stats()
         count = stats['total_blocked']
+        top_domains = None
         
         # Calculate actual duration
+        timeline = None
         if self.experiment_start_time:
             duration = datetime.now() - self.experiment_start_time
+            resolution = MINUTE if duration.total_seconds() <= 2 * 3600 else HOUR
+            # The history store holds every hit of the experiment, across restarts
+            try:
+                report = self.history.report(self.experiment_start_time.timestamp(), resolution)
+                count, top_domains, timeline = report["total_blocked"], report["top_domains"], report["timeline"]
+            except Exception as e:
+                print(f"Failed to read the experiment history: {e}")
             # Format duration nicely
             total_seconds = int(duration.total_seconds())
             hours = total_seconds // 3600
@@ -399,34 +570,71 @@ class MainWindow(QMainWindow):
             duration_str = ["24 Hours", "8 Hours", "4 Hours", "1 Hour"][duration_idx]
         
         # Show Report Window
-        report = ReportWindow(duration_str, count, stats['domains'], self)
+        from gui.report_window import ReportWindow
+        if top_domains is None:
+            top_domains = self.sinkhole.top_domains(10)
+        report = ReportWindow(duration_str, count, top_domains, self, timeline=timeline,
+                              endpoints=self.sinkhole.get_endpoints())
         report.exec()
 
     def update_timer_display(self):
-        h = self.timer_count // 3600
-        m = (self.timer_count % 3600) // 60
-        s = self.timer_count % 60
+        remaining = round(max(0.0, self.ends_at - time.time())) if self.ends_at is not None else 0
+        h = remaining // 3600
+        m = (remaining % 3600) // 60
+        s = remaining % 60
         self.timer_display.setText(f"{h:02d}:{m:02d}:{s:02d}")
 
+    def on_hosts_changed(self, path):
+        # Atomic replacement drops the file from the watcher: follow the new one
+        if path not in self.hosts_watcher.files() and Path(path).exists():
+            self.hosts_watcher.addPath(path)
+        if self.toggle_btn.isEnabled():
+            if self.remote:
+                self.sync_with_daemon()
+            self.update_status_display()
+        self.update_stats()
+
+    def sync_with_daemon(self):
+        """Follow blackouts the daemon started or ended on its own (deadline, CLI, windows)."""
+        blocking = self.blocker.status()
+        if blocking and self.experiment_start_time is None:
+            self.follow_daemon()
+        elif not blocking and self.experiment_start_time is not None:
+            self.stop_timer()
+            self.show_report()
+
     def update_stats(self):
         if self.blocker.status():
             stats = self.sinkhole.get_stats()
             total = stats['total_blocked']
             self.stats_count_label.setText(str(total))
             
-            # Optional: Show top domain in detail label if active
-            if total > 0:
-                top_domain = max(stats['domains'], key=stats['domains'].get)
-                self.stats_detail_label.setText(f"LATEST: {top_domain}")
+            # Only the hits since the last refresh are read and rendered
+            hits, self.feed_cursor = self.sinkhole.recent_hits(self.feed_cursor)
+            if hits:
+                lines = [f"{datetime.fromtimestamp(ts).strftime('%H:%M:%S')}  {protocol:<5}  {domain}"
+                         for ts, domain, protocol in hits[-self.feed_view.maximumBlockCount():]]
+                self.feed_view.appendPlainText("\n".join(lines))
+                self.stats_detail_label.setText(f"LATEST: {hits[-1][1]}")
 
     def closeEvent(self, event):
-        self.sinkhole.stop()
+        self.sinkhole.unsubscribe(self.stats_notifier.changed.emit)
+        if self.deadline is not None:
+            self.deadline.cancel()
+        if self.remote:
+            self.sinkhole.detach() # The daemon carries on with the blackout
+        else:
+            self.stop_capture(end_experiment=not self.blocker.status())
         super().closeEvent(event)
 
 def run_as_admin():
     """Relaunch the current script as administrator."""
-    if ctypes.windll.shell32.IsUserAnAdmin():
+    if get_backend().is_admin():
         return True
+
+    if sys.platform != "win32":
+        print("Administrator privileges are required. Please re-run with sudo.")
+        return False
     
     # Re-run the program with admin rights
     try:
@@ -4,7 +4,7 @@ from PySide6.QtCore import Qt
 from PySide6.QtGui import QPalette, QColor
 
 class ReportWindow(QDialog):
-    def __init__(self, duration_str, total_blocked, top_domains, parent=None):
+    def __init__(self, duration_str, total_blocked, top_domains, parent=None, timeline=None, endpoints=None):
         super().__init__(parent)
         self.setWindowTitle("IfNoAI - Experiment Report")
         self.setFixedSize(500, 700)
@@ -55,6 +55,18 @@ class ReportWindow(QDialog):
 
         layout.addWidget(stats_frame)
 
+        # Interception Timeline
+        if timeline:
+            timeline_label = QLabel("INTERCEPTION TIMELINE")
+            timeline_label.setStyleSheet("color: #666; font-family: 'Consolas'; font-size: 12px;")
+            timeline_label.setAlignment(Qt.AlignCenter)
+            layout.addWidget(timeline_label)
+
+            spark = QLabel(self._sparkline(timeline))
+            spark.setStyleSheet("color: #ff4444; font-family: 'Consolas'; font-size: 18px;")
+            spark.setAlignment(Qt.AlignCenter)
+            layout.addWidget(spark)
+
         # Top Domains List
         if top_domains:
             domains_label = QLabel("TOP INTERCEPTED TARGETS")
@@ -70,10 +82,8 @@ class ReportWindow(QDialog):
             domain_layout = QVBoxLayout(domain_container)
             domain_layout.setSpacing(5)
             
-            # Sort domains by count descending
-            sorted_domains = sorted(top_domains.items(), key=lambda x: x[1], reverse=True)
-            
-            for domain, count in sorted_domains[:10]: # Show top 10
+            # Already ordered by count, highest first
+            for domain, count in top_domains[:10]: # Show top 10
                 row = QFrame()
                 row.setStyleSheet("background-color: #1a1a20; border-radius: 5px;")
                 row_layout = QVBoxLayout(row)
@@ -89,6 +99,17 @@ class ReportWindow(QDialog):
                 row_layout.addWidget(c_label)
                 domain_layout.addWidget(row)
 
+            # API paths seen through TLS termination, when it was enabled
+            if endpoints:
+                endpoints_label = QLabel("INTERCEPTED ENDPOINTS")
+                endpoints_label.setStyleSheet("color: #666; font-family: 'Consolas'; font-size: 12px; margin-top: 10px;")
+                endpoints_label.setAlignment(Qt.AlignCenter)
+                domain_layout.addWidget(endpoints_label)
+                for endpoint, count in sorted(endpoints.items(), key=lambda x: x[1], reverse=True)[:10]:
+                    e_label = QLabel(f"{endpoint}  ({count})")
+                    e_label.setStyleSheet("color: #999; font-family: 'Consolas'; font-size: 10px;")
+                    domain_layout.addWidget(e_label)
+
             domain_layout.addStretch()
             scroll.setWidget(domain_container)
             layout.addWidget(scroll)
@@ -133,3 +154,20 @@ class ReportWindow(QDialog):
         l.addWidget(val)
         l.addWidget(lbl)
         layout.addWidget(container)
+
+    def _sparkline(self, timeline, width=40):
+        """Renders [(bucket_start, count)] as a row of block characters."""
+        step = timeline[1][0] - timeline[0][0] if len(timeline) > 1 else 1
+        for (a, _), (b, _) in zip(timeline, timeline[1:]):
+            step = min(step, b - a)
+        start = timeline[0][0]
+        counts = [0] * (int((timeline[-1][0] - start) // step) + 1)
+        for bucket, count in timeline:
+            counts[int((bucket - start) // step)] += count
+
+        # Squash long experiments into at most `width` columns
+        per_col = -(-len(counts) // width)
+        columns = [sum(counts[i:i + per_col]) for i in range(0, len(counts), per_col)]
+        peak = max(columns) or 1
+        bars = " ▁▂▃▄▅▆▇█"
+        return "".join(bars[-(-c * 8 // peak)] if c else bars[0] for c in columns)
@@ -1,21 +1,25 @@
 import sys
-import argparse
-import ctypes
 import os
-from pathlib import Path
 
 # Add src to path so we can import core
-sys.path.append(str(Path(__file__).parent))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from core.blocker import AIBlocker
+# Everything else is imported by the action that needs it, so `status`
+# starts without loading argparse, the blocker or the sinkhole
 
 def run_as_admin():
     """Relaunch the current script as administrator."""
-    if ctypes.windll.shell32.IsUserAnAdmin():
+    from core.backends import get_backend
+    if get_backend().is_admin():
         return True
+
+    if sys.platform != "win32":
+        print("Administrator privileges are required. Please re-run with sudo.")
+        return False
     
     # Re-run the program with admin rights
     try:
+        import ctypes
         if sys.argv[0].endswith('.exe'):
             ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.argv[0], " ".join(sys.argv[1:]), None, 1)
         else:
@@ -25,17 +29,114 @@ def run_as_admin():
         print(f"Failed to elevate privileges: {e}")
         return False
 
+def spawn_daemon(timeout=10.0):
+    """Start `main.py daemon` in the background and wait for its control socket."""
+    import time
+    import subprocess
+    from core.paths import state_path
+    from core.daemon import DaemonClient
+
+    log = open(os.path.join(state_path(), "daemon.log"), "ab")
+    cmd = [sys.executable, os.path.abspath(__file__), "daemon"]
+    if sys.platform == "win32":
+        subprocess.Popen(cmd, stdout=log, stderr=log, stdin=subprocess.DEVNULL,
+                         creationflags=subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        subprocess.Popen(cmd, stdout=log, stderr=log, stdin=subprocess.DEVNULL, start_new_session=True)
+    log.close()
+    client = DaemonClient()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.ping():
+            return client
+        time.sleep(0.1)
+    return None
+
+def run_daemon(windows=()):
+    import signal
+    from core.daemon import SinkholeDaemon
+
+    daemon = SinkholeDaemon(windows=windows)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.shutdown())
+    signal.signal(signal.SIGINT, lambda *_: daemon.shutdown())
+    print(f"[IfNoAI] Daemon running (pid {os.getpid()})")
+    if not daemon.run():
+        sys.exit(1)
+
+def print_status():
+    """Answers from the cached status marker; hosts is only parsed when the marker is stale."""
+    from core.backends import get_backend
+    from core.status import read_marker
+    from core.paths import find_control_path
+
+    marker = read_marker(get_backend().hosts_path)
+    if marker is None:
+        from core.blocker import AIBlocker
+        is_active = AIBlocker().status()
+    else:
+        is_active = marker[0]
+    print(f"\n[IfNoAI] Status: {'🔴 DISCONNECTED (AI Blocked)' if is_active else '🟢 CONNECTED (AI Available)'}")
+    if find_control_path() is not None:
+        print_daemon_status()
+    else:
+        print("[IfNoAI] Daemon: not running (nothing is being recorded)")
+
+def print_daemon_status():
+    import time
+    from core.daemon import DaemonClient, DaemonError
+
+    client = DaemonClient()
+    try:
+        status = client.request("status")
+        stats = client.request("stats", k=5)
+    except DaemonError:
+        print("[IfNoAI] Daemon: not running (nothing is being recorded)")
+        return
+    state = "capturing" if status["capturing"] else "idle"
+    print(f"[IfNoAI] Daemon: pid {status['pid']}, {state}")
+    if status["ends_at"]:
+        remaining = max(0, int(status["ends_at"] - time.time()))
+        print(f"[IfNoAI] Ends in: {remaining // 3600:02d}:{remaining % 3600 // 60:02d}:{remaining % 60:02d}")
+    if status.get("next_window"):
+        start, end = (time.strftime("%a %H:%M", time.localtime(t)) for t in status["next_window"])
+        print(f"[IfNoAI] Scheduled blackout: {start} - {end}")
+    for failure in status["bind_failures"]:
+        print(f"[IfNoAI] Sinkhole: {failure['message']}")
+    print(f"[IfNoAI] Blocked requests: {stats['total_blocked']}")
+    for domain, count in stats["top_domains"]:
+        print(f"    {count:>6}  {domain}")
+
 def main():
+    if sys.argv[1:] == ["status"]:
+        print_status()
+        return
+
+    import argparse
     parser = argparse.ArgumentParser(description="IfNoAI - The AI Blackout Experiment")
-    parser.add_argument("action", choices=["on", "off", "status", "gui"], nargs="?", default="gui", help="Action to perform (default: gui)")
+    parser.add_argument("action", choices=["on", "off", "status", "gui", "daemon"], nargs="?", default="gui",
+                        help="Action to perform (default: gui); 'daemon' runs the sinkhole headless")
     parser.add_argument("--force", action="store_true", help="Force action without confirmation")
+    parser.add_argument("--hours", type=float, help="With 'on': end the blackout after this many hours")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="With 'on': only edit the hosts file, without starting the sinkhole daemon")
+    parser.add_argument("--window", action="append", default=[], metavar="'DAYS HH:MM-HH:MM'",
+                        help="With 'daemon': recurring blackout, e.g. 'mon-fri 09:00-12:00' (repeatable)")
     
     args = parser.parse_args()
+
+    windows = []
+    if args.window:
+        from core.schedule import BlackoutWindow
+        try:
+            windows = [BlackoutWindow.parse(text) for text in args.window]
+        except ValueError as e:
+            parser.error(str(e))
     
     # If GUI requested (default)
     if args.action == "gui":
+        from core.backends import get_backend
         # Check admin rights immediately for GUI
-        if not ctypes.windll.shell32.IsUserAnAdmin():
+        if not get_backend().is_admin():
             if not run_as_admin():
                 return # Exit if elevation failed or new process started
             return # Exit the non-admin process
@@ -53,13 +154,14 @@ def main():
             sys.exit(1)
         return
 
-    blocker = AIBlocker()
-
     if args.action == "status":
-        is_active = blocker.status()
-        print(f"\n[IfNoAI] Status: {'🔴 DISCONNECTED (AI Blocked)' if is_active else '🟢 CONNECTED (AI Available)'}")
+        print_status()
         return
 
+    from core.blocker import AIBlocker
+    from core.daemon import DaemonClient, DaemonError
+    blocker = AIBlocker()
+
     # For modifying actions, check admin
     if not blocker.is_admin():
         print("Requesting administrator privileges...")
@@ -67,6 +169,10 @@ def main():
             return # Exit, the new process will handle it or it failed
         return # Exit the non-admin process
 
+    if args.action == "daemon":
+        run_daemon(windows)
+        return
+
     if args.action == "on":
         print("\n=== INITIATING AI BLACKOUT ===")
         if not args.force:
@@ -74,14 +180,33 @@ def main():
             if confirm.lower() != 'y':
                 print("Aborted.")
                 return
-        
-        if blocker.enable_block():
+
+        if args.no_daemon:
+            started = blocker.enable_block()
+        else:
+            # The daemon enables the block itself and records what it catches
+            client = DaemonClient()
+            if not client.ping():
+                client = spawn_daemon()
+            if client is None:
+                print("Failed to start the sinkhole daemon; see daemon.log in the IfNoAI state directory.")
+                return
+            duration = args.hours * 3600 if args.hours else None
+            reply = client.request("start", duration=duration)
+            started = reply["ok"]
+            if not started:
+                print(f"Failed to start the blackout: {reply.get('error')}")
+        if started:
             print("\n[SUCCESS] The cloud is silent. Welcome to the quiet zone.")
             print("Try accessing ChatGPT or Copilot to verify.")
 
     elif args.action == "off":
         print("\n=== RESTORING CONNECTIVITY ===")
-        if blocker.disable_block():
+        try:
+            stopped = DaemonClient().request("stop")["ok"]
+        except DaemonError:
+            stopped = blocker.disable_block()
+        if stopped:
             print("\n[SUCCESS] Connection re-established. The noise returns.")
 
 if __name__ == "__main__":